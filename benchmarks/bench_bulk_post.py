@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+    benchmarks.bench_bulk_post
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Creates 1000 order items with single POST requests and with one bulk
+    POST sending them as a list, using a file SQLite database so commits
+    are not free.
+"""
+import json
+import os
+import tempfile
+import time
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from flask_resteasy.manager import APIManager
+
+ROWS = 1000
+
+app = Flask(__name__)
+db_file = os.path.join(tempfile.mkdtemp(), 'bench.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///%s' % db_file
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+db = SQLAlchemy(app)
+
+
+class Order(db.Model):
+    __tablename__ = 'order'
+    id = db.Column('id', db.Integer, primary_key=True)
+    order_no = db.Column('order_no', db.String)
+
+
+class OrderItem(db.Model):
+    __tablename__ = 'order_item'
+    id = db.Column('id', db.Integer, primary_key=True)
+    order_id = db.Column('order_id', db.Integer, db.ForeignKey('order.id'))
+    amount = db.Column('amount', db.Integer)
+    order = db.relationship('Order', foreign_keys=order_id)
+
+
+def rows_per_sec(post, rows):
+    start = time.time()
+    post(rows)
+    return len(rows) / (time.time() - start)
+
+
+def main():
+    headers = {'Content-Type': 'application/json'}
+    rows = [{'amount': i, 'links': {'order': 1 + i % 10}}
+            for i in range(ROWS)]
+
+    with app.app_context():
+        api_manager = APIManager(app, db, methods=['GET', 'POST'])
+        api_manager.register_api(Order)
+        api_manager.register_api(OrderItem)
+        db.create_all()
+        db.session.add_all([Order(order_no=str(i)) for i in range(10)])
+        db.session.commit()
+
+    client = app.test_client()
+
+    def single(rows):
+        for row in rows:
+            rv = client.post('/order_items', headers=headers,
+                             data=json.dumps({'order_item': row}))
+            assert rv.status_code == 201
+
+    def bulk(rows):
+        rv = client.post('/order_items', headers=headers,
+                         data=json.dumps({'order_items': rows}))
+        assert rv.status_code == 201
+
+    before = rows_per_sec(single, rows)
+    after = rows_per_sec(bulk, rows)
+    print('single POST %10.0f rows/sec   bulk POST %10.0f rows/sec   %.1fx'
+          % (before, after, after / before))
+    os.remove(db_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+    benchmarks.bench_clone
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Copies the 50k items of an order template into a new order with
+    :meth:`flask_resteasy.processors.RequestProcessor._copy_objs`, which
+    loads the items and adds their copies through the session, and with
+    :meth:`flask_resteasy.processors.RequestProcessor._clone`, which emits
+    one ``INSERT INTO ... SELECT ... RETURNING`` where the database supports
+    it and otherwise inserts the selected values one row at a time without
+    loading the items. Uses a file SQLite database.
+"""
+import json
+import os
+import tempfile
+import time
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from flask_resteasy.manager import APIManager
+from flask_resteasy.processors import RequestProcessor
+
+ROWS = 50000
+
+app = Flask(__name__)
+db_file = os.path.join(tempfile.mkdtemp(), 'bench.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///%s' % db_file
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+db = SQLAlchemy(app)
+
+
+class Order(db.Model):
+    __tablename__ = 'order'
+    id = db.Column('id', db.Integer, primary_key=True)
+    order_no = db.Column('order_no', db.String)
+
+
+class OrderItem(db.Model):
+    __tablename__ = 'order_item'
+    id = db.Column('id', db.Integer, primary_key=True)
+    order_id = db.Column('order_id', db.Integer, db.ForeignKey('order.id'))
+    product = db.Column('product', db.String)
+    amount = db.Column('amount', db.Integer)
+
+
+class CopyProcess(RequestProcessor):
+    def _process(self):
+        order = Order(order_no='copy')
+        db.session.add(order)
+        db.session.flush()
+        items = OrderItem.query.filter(OrderItem.order_id == 1)
+        db.session.add_all(self._copy_objs(
+            items, ['product', 'amount', 'order_id'],
+            {'order_id': order.id}, OrderItem))
+        self._commit()
+        self._resources.append(order)
+
+
+class CloneProcess(RequestProcessor):
+    def _process(self):
+        order_id = self._clone(idents=[1], fld_defaults={'order_no': 'copy'})
+        self._clone(model_class=OrderItem, filter_by={'order_id': 1},
+                    fld_defaults={'order_id': order_id[0]})
+        self._commit()
+        self._resources.append(db.session.get(Order, order_id[0]))
+
+
+def rows_per_sec(action):
+    start = time.time()
+    rv = client.post('/orders', headers={'Content-Type': 'application/json'},
+                     data=json.dumps({'action': action}))
+    assert rv.status_code == 201
+    return ROWS / (time.time() - start)
+
+
+client = app.test_client()
+
+
+def main():
+    with app.app_context():
+        api_manager = APIManager(app, db, methods=['GET', 'POST'])
+        api_manager.register_api(Order, post_process=('action', CopyProcess))
+        db.create_all()
+        db.session.add(Order(order_no='template'))
+        db.session.execute(OrderItem.__table__.insert(), [
+            {'order_id': 1, 'product': 'P%s' % i, 'amount': i}
+            for i in range(ROWS)])
+        db.session.commit()
+
+    before = rows_per_sec('CopyProcess')
+    api_manager._register_post_process('order', ('action', CloneProcess))
+    after = rows_per_sec('CloneProcess')
+    with app.app_context():
+        assert OrderItem.query.filter(OrderItem.order_id == 3).count() == ROWS
+    print('_copy_objs %10.0f rows/sec   _clone %10.0f rows/sec   %.1fx'
+          % (before, after, after / before))
+    os.remove(db_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+    benchmarks.bench_codec
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Serializes and encodes a 10k row list response with each of the
+    installed :mod:`flask_resteasy.codecs`. Codecs encoding datetime
+    values natively skip the type converters of the serializer.
+"""
+import datetime
+import timeit
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from flask_resteasy.codecs import CODECS
+from flask_resteasy.manager import APIManager
+from flask_resteasy.configs import APIConfig
+
+ROWS = 10000
+REPEAT = 5
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+db = SQLAlchemy(app)
+
+
+class Product(db.Model):
+    __tablename__ = 'product'
+    id = db.Column('id', db.Integer, primary_key=True)
+    sku = db.Column('sku', db.String)
+    name = db.Column('name', db.String)
+    description = db.Column('description', db.String)
+    price = db.Column('price', db.BigInteger)
+    unit_of_measure = db.Column('unit_of_measure', db.String)
+    created_at = db.Column('created_at', db.DateTime)
+    updated_at = db.Column('updated_at', db.DateTime)
+
+
+def rows_per_sec(codec, cfg, rows):
+    def encode():
+        serialize = cfg.serializer
+        codec.dumpb({'products': [serialize(r) for r in rows]})
+    seconds = min(timeit.repeat(encode, number=1, repeat=REPEAT))
+    return len(rows) / seconds
+
+
+def main():
+    now = datetime.datetime(2014, 1, 1, 12, 30)
+    rows = [Product(id=i, sku='SKU%s' % i, name='Product %s' % i,
+                    description='Description for product %s' % i,
+                    price=i * 100, unit_of_measure='EA',
+                    created_at=now, updated_at=now)
+            for i in range(ROWS)]
+
+    with app.app_context():
+        baseline = None
+        for codec_class in reversed(CODECS):
+            try:
+                codec = codec_class()
+            except ImportError:
+                print('%-10s not installed' % codec_class.name)
+                continue
+            APIManager(app, db, json_codec=codec)
+            cfg = APIConfig(Product, None, 20, {'GET'}, None)
+            rate = rows_per_sec(codec, cfg, rows)
+            baseline = baseline or rate
+            print('%-10s %10.0f rows/sec   %.1fx'
+                  % (codec.name, rate, rate / baseline))
+
+
+if __name__ == '__main__':
+    main()
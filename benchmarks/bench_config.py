@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+    benchmarks.bench_config
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Reads the configuration settings a GET request for a page of orders
+    with links reads, from an :class:`flask_resteasy.configs.APIConfig`
+    and from its :class:`flask_resteasy.configs.ConfigSnapshot`, and times
+    full GET requests.
+"""
+import timeit
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from flask_resteasy.configs import APIConfig, EmberConfig
+from flask_resteasy.manager import APIManager
+from flask_resteasy.views import APIView
+
+REPEAT = 5
+NUMBER = 2000
+
+# settings read handling a GET request of a page of 20 orders with links,
+# roughly in the proportions of the parser, processor and builder
+ACCESSES = (
+    ('model_class', 8), ('db', 4), ('api_manager', 4), ('resource_name', 6),
+    ('resource_name_plural', 2), ('resource_name_case', 4), ('id_field', 25),
+    ('json_case', 45), ('model_case', 4), ('allowed_relationships', 22),
+    ('allowed_from_model', 2), ('relationship_keys', 22), ('links_node', 40),
+    ('use_link_nodes', 40), ('max_per_page', 2), ('count_mode', 1),
+    ('window_count', 1), ('field_types', 1), ('json_codec', 2),
+    ('stream_chunk_size', 1), ('response_cache', 1), ('version_column', 1),
+    ('serializer', 20), ('parser_factory', 1), ('processor_factory', 2),
+    ('builder_factory', 1), ('id_route_param', 1), ('link_route_param', 1),
+)
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+db = SQLAlchemy(app)
+
+
+class Client(db.Model):
+    __tablename__ = 'client'
+    id = db.Column('id', db.Integer, primary_key=True)
+    full_name = db.Column('full_name', db.String)
+
+
+class Order(db.Model):
+    __tablename__ = 'order'
+    id = db.Column('id', db.Integer, primary_key=True)
+    order_no = db.Column('order_no', db.String)
+    client_id = db.Column('client_id', db.Integer, db.ForeignKey('client.id'))
+    client = db.relationship('Client', foreign_keys=client_id,
+                             backref=db.backref('orders'))
+
+
+def read_settings(cfg):
+    for name, count in ACCESSES:
+        for _ in range(count):
+            getattr(cfg, name)
+
+
+def usec_per_request(func):
+    return min(timeit.repeat(func, number=NUMBER, repeat=REPEAT)) \
+        / NUMBER * 1e6
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Order(order_no=str(i), client=Client())
+                            for i in range(20)])
+        db.session.commit()
+        api_manager = APIManager(app, db)
+        for cfg_class in (APIConfig, EmberConfig):
+            cfg = cfg_class(Order, None, 20, {'GET'}, None)
+            snapshot = cfg.finalize()
+            before = usec_per_request(lambda: read_settings(cfg))
+            after = usec_per_request(lambda: read_settings(snapshot))
+            print('%-11s settings per request: config %8.1f usec   '
+                  'snapshot %8.1f usec   %.1fx'
+                  % (cfg_class.__name__, before, after, before / after))
+
+        api_manager.register_api(Order)
+        api_manager.register_api(Client)
+
+    client = app.test_client()
+
+    def get():
+        client.get('/orders')
+
+    after = usec_per_request(get)
+    # serve the same requests with the configurations instead of snapshots
+    view_init = APIView.__init__
+    configs = list(api_manager.configs.values())
+    APIView.__init__ = lambda self, cfg: setattr(self, '_cfg', cfg)
+    for cfg in configs:
+        cfg.finalize = lambda cfg=cfg: cfg
+    try:
+        before = usec_per_request(get)
+    finally:
+        APIView.__init__ = view_init
+        for cfg in configs:
+            del cfg.finalize
+    print('GET /orders          request:   config %8.1f usec   '
+          'snapshot %8.1f usec   %.2fx' % (before, after, before / after))
+
+
+if __name__ == '__main__':
+    main()
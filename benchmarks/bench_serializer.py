@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+    benchmarks.bench_serializer
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Serializes a 10k row page with the per field loop ResponseBuilder
+    used before serializers were compiled and with the compiled
+    :attr:`flask_resteasy.configs.APIConfig.serializer`.
+"""
+import datetime
+import timeit
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from flask_resteasy.codecs import JSONCodec
+from flask_resteasy.manager import APIManager
+from flask_resteasy.configs import APIConfig, EmberConfig
+
+ROWS = 10000
+REPEAT = 5
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+db = SQLAlchemy(app)
+
+
+class Product(db.Model):
+    __tablename__ = 'product'
+    id = db.Column('id', db.Integer, primary_key=True)
+    sku = db.Column('sku', db.String)
+    name = db.Column('name', db.String)
+    description = db.Column('description', db.String)
+    price = db.Column('price', db.BigInteger)
+    unit_of_measure = db.Column('unit_of_measure', db.String)
+    created_at = db.Column('created_at', db.DateTime)
+    updated_at = db.Column('updated_at', db.DateTime)
+
+
+def per_field_loop(cfg, resource):
+    """ResponseBuilder._resource_fields_to_jdic before serializers
+    were compiled
+    """
+    rv = {}
+    convert = cfg.model_to_json_type_converters
+    for field_name in cfg.allowed_from_model:
+        fld_jkey = cfg.json_case(field_name)
+        v = getattr(resource, field_name)
+        current_type = cfg.field_types[field_name]
+        if current_type in convert and v is not None:
+            rv[fld_jkey] = convert[current_type](v)
+        else:
+            rv[fld_jkey] = v
+    return rv
+
+
+def rows_per_sec(serialize, rows):
+    seconds = min(timeit.repeat(lambda: [serialize(r) for r in rows],
+                                number=1, repeat=REPEAT))
+    return len(rows) / seconds
+
+
+def main():
+    now = datetime.datetime(2014, 1, 1, 12, 30)
+    rows = [Product(id=i, sku='SKU%s' % i, name='Product %s' % i,
+                    description='Description for product %s' % i,
+                    price=i * 100, unit_of_measure='EA',
+                    created_at=now, updated_at=now)
+            for i in range(ROWS)]
+
+    with app.app_context():
+        APIManager(app, db, json_codec=JSONCodec())
+        for cfg_class in (APIConfig, EmberConfig):
+            cfg = cfg_class(Product, None, 20, {'GET'}, None)
+            assert per_field_loop(cfg, rows[0]) == cfg.serializer(rows[0])
+            before = rows_per_sec(lambda r: per_field_loop(cfg, r), rows)
+            after = rows_per_sec(cfg.serializer, rows)
+            print('%-10s per field loop %10.0f rows/sec   '
+                  'compiled %10.0f rows/sec   %.1fx'
+                  % (cfg_class.__name__, before, after, after / before))
+
+
+if __name__ == '__main__':
+    main()
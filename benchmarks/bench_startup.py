@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+    benchmarks.bench_startup
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Times registering and finalizing 500 synthetic models in new processes,
+    without an :class:`flask_resteasy.caches.IntrospectionCache`, with a
+    cache file that is rebuilt and with a cache file that is loaded.
+
+    The time is reported in phases, registering the resources, configuring
+    the SQLAlchemy mappers, which SQLAlchemy does before the first query if
+    it wasn't done before, and finalizing the configurations, which
+    includes reading the cache file. Only finalizing depends on the cache,
+    the other phases are reported to show its share of the startup.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import configure_mappers
+
+from flask_resteasy.caches import IntrospectionCache
+from flask_resteasy.manager import APIManager
+
+MODELS = 500
+REPEAT = 5
+
+
+def define_models(db):
+    """MODELS models, parents with a to-many relationship to children
+    """
+    models = []
+    for i in range(MODELS // 2):
+        parent = type('Parent%s' % i, (db.Model,), {
+            '__tablename__': 'parent%s' % i,
+            'id': db.Column('id', db.Integer, primary_key=True),
+            'name': db.Column('name', db.String),
+            'description': db.Column('description', db.String),
+            'created_at': db.Column('created_at', db.DateTime),
+            'updated_at': db.Column('updated_at', db.DateTime)})
+        child = type('Child%s' % i, (db.Model,), {
+            '__tablename__': 'child%s' % i,
+            'id': db.Column('id', db.Integer, primary_key=True),
+            'amount': db.Column('amount', db.Integer),
+            'price': db.Column('price', db.BigInteger),
+            'parent_id': db.Column('parent_id', db.Integer,
+                                   db.ForeignKey('parent%s.id' % i)),
+            'parent': db.relationship('Parent%s' % i,
+                                      backref=db.backref('children'))})
+        models.extend([parent, child])
+    return models
+
+
+def start(path):
+    """Starts the application like a new process would and returns the
+    seconds taken to register the resources, to configure the mappers and
+    to finalize the configurations
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db = SQLAlchemy(app)
+    models = define_models(db)
+
+    begin = default_timer()
+    cache = IntrospectionCache(path, '1') if path else None
+    api_manager = APIManager(app, db, introspection_cache=cache)
+    for model_class in models:
+        api_manager.register_api(model_class)
+    registered = default_timer()
+    configure_mappers()
+    configured = default_timer()
+    with app.app_context():
+        for name in api_manager.configs:
+            api_manager.get_cfg(name)
+        if cache is not None:
+            cache.save()
+    return (registered - begin, configured - registered,
+            default_timer() - configured)
+
+
+def run(path):
+    output = subprocess.check_output(
+        [sys.executable, __file__, 'start', path or ''])
+    return [float(t) for t in output.decode('ascii').split()]
+
+
+def best(runs):
+    """Fastest time of each phase, registering the resources varies
+    between processes much more than the phases the cache changes
+    """
+    return [min(times) for times in zip(*runs)]
+
+
+def report(label, times):
+    print('%-9s register %7.1f msec   configure mappers %7.1f msec   '
+          'finalize %7.1f msec   total %7.1f msec'
+          % ((label,) + tuple(t * 1e3 for t in times) +
+             (sum(times) * 1e3,)))
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, 'introspection.json')
+    try:
+        no_cache = best([run(None) for _ in range(REPEAT)])
+        rebuilt = run(path)
+        loaded = best([run(path) for _ in range(REPEAT)])
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rmdir(tmp_dir)
+    print('%s models' % MODELS)
+    report('no cache', no_cache)
+    report('rebuilt', rebuilt)
+    report('loaded', loaded)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'start':
+        print(' '.join(str(t) for t in
+                       start(sys.argv[2] if len(sys.argv) > 2 else None)))
+    else:
+        main()
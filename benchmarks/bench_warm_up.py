@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+    benchmarks.bench_warm_up
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Times the first GET request to each of 200 resources with links, once
+    without and once after :meth:`flask_resteasy.manager.APIManager.warm_up`,
+    and the per-resource time of the warm-up itself.
+"""
+from timeit import default_timer
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from flask_resteasy.manager import APIManager
+
+MODELS = 100
+
+
+def make_app():
+    """Application with MODELS parent and child models, a new SQLAlchemy
+    instance each time so the mappers are not configured yet.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db = SQLAlchemy(app)
+    models = []
+    for i in range(MODELS):
+        parent = type('Parent%s' % i, (db.Model,), {
+            '__tablename__': 'parent%s' % i,
+            'id': db.Column('id', db.Integer, primary_key=True),
+            'name': db.Column('name', db.String),
+            'created_at': db.Column('created_at', db.DateTime)})
+        child = type('Child%s' % i, (db.Model,), {
+            '__tablename__': 'child%s' % i,
+            'id': db.Column('id', db.Integer, primary_key=True),
+            'amount': db.Column('amount', db.Integer),
+            'parent_id': db.Column('parent_id', db.Integer,
+                                   db.ForeignKey('parent%s.id' % i)),
+            'parent': db.relationship('Parent%s' % i,
+                                      backref=db.backref('children'))})
+        models.extend([parent, child])
+    with app.app_context():
+        db.create_all()
+    api_manager = APIManager(app, db)
+    for model_class in models:
+        api_manager.register_api(model_class)
+    return app, api_manager
+
+
+def first_requests(app, api_manager):
+    client = app.test_client()
+    start = default_timer()
+    for cfg in api_manager.configs.values():
+        assert client.get('/%s' % cfg.resource_name_plural).status_code == 200
+    return (default_timer() - start) / len(api_manager.configs) * 1e6
+
+
+def main():
+    app, api_manager = make_app()
+    cold = first_requests(app, api_manager)
+
+    app, api_manager = make_app()
+    times = api_manager.warm_up()
+    warm = first_requests(app, api_manager)
+
+    total = sum(times.values())
+    slowest = max(times, key=times.get)
+    print('warm-up of %s resources %8.1f msec   per resource %8.1f usec   '
+          'slowest %s %.1f usec' % (len(times), total * 1e3,
+                                    total / len(times) * 1e6, slowest,
+                                    times[slowest] * 1e6))
+    print('first GET per resource: cold %8.1f usec   warmed up %8.1f usec   '
+          '%.2fx' % (cold, warm, cold / warm))
+
+
+if __name__ == '__main__':
+    main()
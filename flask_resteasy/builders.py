@@ -4,6 +4,20 @@
     ~~~~~~~~~~~~~~~~~~~~~~~
 
 """
+from itertools import islice
+
+from sqlalchemy import select
+from sqlalchemy.inspection import inspect
+
+
+def _chunks(iterable, size):
+    """Splits an iterable into lists of size items
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
 
 
 class ResponseBuilder(object):
@@ -14,7 +28,9 @@ class ResponseBuilder(object):
         self._cfg = cfg
         self._processor = request_processor
         self._json_dic = None
-        self._build()
+        self._link_ids = {}
+        if not self._processor.streaming:
+            self._build()
 
     @property
     def json_dic(self):
@@ -22,6 +38,32 @@ class ResponseBuilder(object):
         """
         return self._json_dic
 
+    def iter_json(self):
+        """Yields the JSON response for a streamed request in pieces, the
+        opening of the response, the resources a chunk at a time and then
+        the meta node. Only one chunk of resources is held in memory at a
+        time, requests with includes are not streamed.
+        """
+        dumpb = self._cfg.json_codec.dumpb
+
+        yield b'{' + dumpb(self._processor.resource_name) + b':['
+        num_resc = 0
+        for chunk in _chunks(self._processor.iter_resources(),
+                             self._processor.pager.stream_chunk_size):
+            self._link_ids = {}
+            self._load_link_ids(chunk)
+            yield (b',' if num_resc else b'') + b','.join(
+                dumpb(self._resource_to_jdic(r)) for r in chunk)
+            num_resc += len(chunk)
+        yield b']'
+
+        if num_resc > 0:
+            json_dic = {}
+            self._build_pagination(json_dic)
+            for key, value in json_dic.items():
+                yield b',' + dumpb(key) + b':' + dumpb(value)
+        yield b'}'
+
     @property
     def urls(self):
         """Request URL for resource.
@@ -35,6 +77,7 @@ class ResponseBuilder(object):
         json_dic = {self._processor.resource_name: []}
         num_resc = len(self._processor.resources)
         if num_resc > 0:
+            self._load_link_ids(self._processor.resources)
             if self._processor.render_as_list:
                 # What with the render_as_list property?
                 # Why don't we just render as a list if there is more than
@@ -51,6 +94,7 @@ class ResponseBuilder(object):
 
             self._build_includes(json_dic)
             self._build_pagination(json_dic)
+            self._build_urls(json_dic)
 
         self._json_dic = json_dic
 
@@ -65,26 +109,35 @@ class ResponseBuilder(object):
     def _resource_fields_to_jdic(self, resource):
         """Copy allowed resource fields to the dictionary
         """
-        rv = {}
-        convert = self._cfg.model_to_json_type_converters
-        for field_name in self._cfg.allowed_from_model:
-            fld_jkey = self._cfg.json_case(field_name)
-            v = getattr(resource, field_name)
-            current_type = self._cfg.field_types[field_name]
-            if current_type in convert and v is not None:
-                rv[fld_jkey] = convert[current_type](v)
-            else:
-                rv[fld_jkey] = v
-        return rv
+        fields = self._processor.fields
+        if fields and self._cfg.resource_name in fields:
+            return self._cfg.get_serializer(
+                fields[self._cfg.resource_name])(resource)
+        return self._cfg.serializer(resource)
 
     def _links_to_jdic(self, resource):
         """Copy allowed links (relationships) for the resource object
         to the dictionary
         """
         rv = {}
+        keys = self._cfg.relationship_keys
+        unloaded = inspect(resource).unloaded
         link_names = self._cfg.allowed_relationships
         for link_name in link_names:
             link_jkey = self._cfg.json_case(link_name)
+            key = keys.get(link_name)
+            if key is not None and link_name in unloaded:
+                # read the ids without loading the related objects
+                if key[0] == 'MANYTOONE':
+                    self._set_link_jnode(rv, link_jkey,
+                                         getattr(resource, key[1]))
+                    continue
+                ids = self._link_ids.get(
+                    (self._cfg.resource_name, link_name), {}).get(
+                    getattr(resource, key[1]))
+                if ids is not None:
+                    self._set_link_jnode(rv, link_jkey, ids)
+                    continue
             link_obj = getattr(resource, link_name)
             if isinstance(link_obj, list):
                 ids = []
@@ -100,6 +153,35 @@ class ResponseBuilder(object):
                     self._set_link_jnode(rv, link_jkey, None)
         return rv
 
+    def _load_link_ids(self, resources):
+        """Load the ids of unloaded to-many links for all resources with
+        one grouped query per relationship
+        """
+        keys = self._cfg.relationship_keys
+        tables = self._cfg.model_class.metadata.tables
+        for link_name in self._cfg.allowed_relationships:
+            key = keys.get(link_name)
+            if key is None or key[0] == 'MANYTOONE':
+                continue
+            parents = set()
+            for resource in resources:
+                if link_name in inspect(resource).unloaded:
+                    parents.add(getattr(resource, key[1]))
+            parents.discard(None)
+            if not parents:
+                continue
+
+            table = tables[key[2]]
+            parent_col, child_col = table.c[key[3]], table.c[key[4]]
+            rows = self._cfg.db.session.execute(
+                select(parent_col, child_col).where(
+                    parent_col.in_(parents)).order_by(parent_col, child_col))
+            link_ids = dict((parent, []) for parent in parents)
+            for parent, child in rows:
+                link_ids[parent].append(child)
+            self._link_ids.setdefault(
+                (self._cfg.resource_name, link_name), {}).update(link_ids)
+
     def _set_link_jnode(self, dic, link_jkey, link):
         """Helper method for setting a link node
         """
@@ -128,15 +210,17 @@ class ResponseBuilder(object):
             try:
                 self._cfg = self._cfg.api_manager.get_cfg(
                     self._cfg.resource_name_case(link))
-                ids_processed = set()
+                link_objs = []
                 for link_obj in self._processor.links[link]:
                     if isinstance(link_obj, list):
-                        for obj in link_obj:
-                            self._build_linked_obj(obj, link_key,
-                                                   ids_processed, json_dic)
-                    else:
-                        self._build_linked_obj(link_obj, link_key,
-                                               ids_processed, json_dic)
+                        link_objs.extend(link_obj)
+                    elif link_obj is not None:
+                        link_objs.append(link_obj)
+                self._load_link_ids(link_objs)
+                ids_processed = set()
+                for obj in link_objs:
+                    self._build_linked_obj(obj, link_key, ids_processed,
+                                           json_dic)
             finally:
                 self._cfg = parent_cfg
 
@@ -157,9 +241,25 @@ class ResponseBuilder(object):
         """
         rp = self._processor
         if rp.pager and rp.pager.should_return_meta:
-            json_dic['meta'] = {rp.pager.page_no_param: rp.pager.page,
-                                rp.pager.no_pages_param: rp.pager.no_pages,
-                                rp.pager.per_page_param: rp.pager.per_page}
+            pager = rp.pager
+            if pager.is_keyset:
+                json_dic['meta'] = {pager.per_page_param: pager.per_page,
+                                    pager.next_param: pager.next,
+                                    pager.prev_param: pager.prev}
+            else:
+                meta = {pager.page_no_param: pager.page,
+                        pager.per_page_param: pager.per_page}
+                if pager.is_estimate:
+                    meta[pager.total_estimate_param] = pager.total_items
+                elif pager.no_pages is not None:
+                    meta[pager.no_pages_param] = pager.no_pages
+                json_dic['meta'] = meta
+
+    def _build_urls(self, json_dic):
+        """Set meta node with the URLs of resources written in bulk
+        """
+        if self._processor.bulk:
+            json_dic.setdefault('meta', {})['urls'] = self.urls
 
     def _get_urls_for(self, resources):
         """For a resource return its urls for each id
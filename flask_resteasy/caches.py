@@ -0,0 +1,290 @@
+# coding=utf-8
+"""
+    flask_resteasy.caches
+    ~~~~~~~~~~~~~~~~~~~~~
+
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class CountCache(object):
+    """Caches the total number of items for paginated queries so a page
+    can be served without counting the whole filtered collection.
+
+    Entries are keyed by the tables a query reads from and the normalized
+    filter for the query.  They expire after a time to live and, unless
+    they were stored as estimates, are removed when one of their tables
+    is written to.
+
+    :param max_size: maximum number of entries kept, the oldest entries
+                     are removed first
+
+    :param timer: function returning the current time in seconds
+    """
+    def __init__(self, max_size=10000, timer=time.time):
+        self._max_size = max_size
+        self._timer = timer
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tables, key):
+        """Returns the cached count or None if there isn't one or it
+        has expired.
+
+        :param tables: tuple of table names the query reads from
+
+        :param key: hashable normalized filter for the query
+        """
+        with self._lock:
+            entry = self._entries.get((tables, key))
+            if entry is None:
+                return None
+            total, expires, _ = entry
+            if expires < self._timer():
+                del self._entries[(tables, key)]
+                return None
+            return total
+
+    def set(self, tables, key, total, ttl, estimate=False):
+        """Stores a count.
+
+        :param tables: tuple of table names the query reads from
+
+        :param key: hashable normalized filter for the query
+
+        :param total: total number of items
+
+        :param ttl: time to live in seconds
+
+        :param estimate: estimates are kept when the tables are written to
+                         and only expire
+        """
+        with self._lock:
+            self._entries.pop((tables, key), None)
+            self._entries[(tables, key)] = (total, self._timer() + ttl,
+                                            estimate)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tables):
+        """Removes all exact counts for queries reading from any of the
+        tables.
+
+        :param tables: iterable of table names written to
+        """
+        tables = set(tables)
+        with self._lock:
+            for cache_key in list(self._entries):
+                if not self._entries[cache_key][2] and \
+                        tables.intersection(cache_key[0]):
+                    del self._entries[cache_key]
+
+    def clear(self):
+        """Removes all entries
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class ResponseCache(object):
+    """In-process cache for encoded GET responses.
+
+    Entries are tagged with the tables the response was read from and are
+    removed when one of the tables is written to, see
+    :meth:`flask_resteasy.manager.APIManager.invalidate`, or when their time
+    to live expires. Any object with the methods of this class can be used
+    as a backend shared by several processes instead.
+
+    :param max_size: maximum number of entries kept, the least recently
+                     used entries are removed first
+
+    :param ttl: time to live of entries in seconds
+
+    :param timer: function returning the current time in seconds
+    """
+    def __init__(self, max_size=1024, ttl=300, timer=time.time):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._timer = timer
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._invalidated = {}
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self):
+        """Counter increased by every invalidation. Read it before loading
+        a response and pass it to :meth:`set`, so a response loaded while
+        one of its tables was written to isn't stored.
+        """
+        return self._generation
+
+    def get(self, key):
+        """Returns the cached response or None if there isn't one or it
+        has expired.
+
+        :param key: string identifying the request
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires, _ = entry
+            if expires < self._timer():
+                del self._entries[key]
+                return None
+            # keep recently used entries the longest
+            self._entries.pop(key)
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value, tables, generation):
+        """Stores a response.
+
+        :param key: string identifying the request
+
+        :param value: response to cache
+
+        :param tables: iterable of table names the response was read from
+
+        :param generation: :attr:`generation` read before the response was
+                           loaded
+        """
+        tables = frozenset(tables)
+        with self._lock:
+            for table in tables:
+                if self._invalidated.get(table, -1) >= generation:
+                    return
+            self._entries.pop(key, None)
+            self._entries[key] = (value, self._timer() + self._ttl, tables)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tables):
+        """Removes all responses read from any of the tables.
+
+        :param tables: iterable of table names written to
+        """
+        tables = set(tables)
+        with self._lock:
+            for table in tables:
+                self._invalidated[table] = self._generation
+            self._generation += 1
+            for key in list(self._entries):
+                if tables.intersection(self._entries[key][2]):
+                    del self._entries[key]
+
+    def clear(self):
+        """Removes all entries
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class IntrospectionCache(object):
+    """Persists the settings of configurations resolved by inspecting
+    their models, see :meth:`flask_resteasy.configs.APIConfig.introspected`,
+    in a JSON file. Processes started later finalize the configurations
+    from the file without inspecting the models again.
+
+    The file is keyed by a schema version supplied by the application, for
+    example the revision of its database migrations or its release. The
+    version has to change whenever the models, their relationships or the
+    configuration classes change. Files of other versions are ignored, the
+    models are inspected as usual and the file is rewritten by
+    :meth:`save`.
+
+    :param path: path of the cache file
+
+    :param schema_version: string identifying the models and
+                           configuration classes the entries are resolved
+                           for
+    """
+    #: format of the cache file, files of other versions are ignored
+    VERSION = 2
+
+    def __init__(self, path, schema_version):
+        self._path = path
+        self._schema_version = schema_version
+        self._entries = None
+        self._cfgs = {}
+        self._added = False
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        """Path of the cache file
+        """
+        return self._path
+
+    @property
+    def schema_version(self):
+        """Version of the schema the entries are resolved for
+        """
+        return self._schema_version
+
+    def load(self, cfg):
+        """Sets the settings of a configuration resolved by inspecting its
+        model from the cache, see
+        :meth:`flask_resteasy.configs.APIConfig.load_introspected`.
+        Configurations missing from the cache are added to it when it is
+        saved. The first call reads the cache file.
+
+        Returns True if the configuration was found.
+
+        :param cfg: :class:`flask_resteasy.configs.APIConfig` to load
+        """
+        key = cfg.introspection_key()
+        with self._lock:
+            if self._entries is None:
+                self._open()
+            self._cfgs[key] = cfg
+            entry = self._entries.get(key)
+            if entry is None:
+                self._added = True
+                return False
+        cfg.load_introspected(entry)
+        return True
+
+    def _open(self):
+        self._entries = {}
+        try:
+            with open(self._path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if isinstance(data, dict) and \
+                data.get('version') == self.VERSION and \
+                data.get('schema_version') == self._schema_version:
+            self._entries = data.get('resources', {})
+
+    def save(self):
+        """Writes the cache file if configurations were added, with the
+        entries of all configurations loaded in this process. Call it in
+        an application context after the configurations are finalized.
+        :meth:`flask_resteasy.manager.APIManager.warm_up` calls it when it
+        warms up all resources, resources warmed up as they are registered
+        are only written by calling it.
+
+        Returns True if the file was written.
+        """
+        with self._lock:
+            if not self._added:
+                return False
+            resources = dict((key, cfg.introspected())
+                             for key, cfg in self._cfgs.items())
+            data = {'version': self.VERSION,
+                    'schema_version': self._schema_version,
+                    'resources': resources}
+            # other processes read either the old or the new file
+            tmp_path = '%s.%s.tmp' % (self._path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, sort_keys=True)
+            getattr(os, 'replace', os.rename)(tmp_path, self._path)
+            self._entries = resources
+            self._added = False
+            return True
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""
+    flask_resteasy.codecs
+    ~~~~~~~~~~~~~~~~~~~~~
+
+"""
+import decimal
+
+from flask import json
+
+
+class JSONCodec(object):
+    """Encodes responses and decodes request bodies with the JSON support
+    of Flask, which is based on the standard library :mod:`json` module.
+
+    Responses are always encoded with compact separators, even in debug
+    mode.
+    """
+    #: name of the codec
+    name = 'json'
+
+    #: field types, as used by
+    #: :attr:`flask_resteasy.configs.APIConfig.field_types`, the codec
+    #: encodes without the converters of
+    #: :attr:`flask_resteasy.configs.APIConfig.model_to_json_type_converters`
+    native_types = frozenset()
+
+    def dumps(self, obj):
+        """Encodes obj and returns the JSON document as a string
+        """
+        return json.dumps(obj, separators=(',', ':'))
+
+    def dumpb(self, obj):
+        """Encodes obj and returns the JSON document as UTF-8 bytes
+        """
+        return self.dumps(obj).encode('utf-8')
+
+    def loads(self, data):
+        """Decodes a JSON document, raises ValueError if the document
+        is not valid.
+
+        :param data: string or UTF-8 bytes
+        """
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """Encodes and decodes with `orjson <https://github.com/ijl/orjson>`_,
+    which also encodes datetime values natively.
+    """
+    name = 'orjson'
+    native_types = frozenset(['DATETIME'])
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, decimal.Decimal):
+            return str(obj)
+        raise TypeError('Object of type %s is not JSON serializable' %
+                        type(obj).__name__)
+
+    def dumps(self, obj):
+        return self.dumpb(obj).decode('utf-8')
+
+    def dumpb(self, obj):
+        return self._orjson.dumps(obj, default=self._default)
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+
+class UjsonCodec(JSONCodec):
+    """Encodes and decodes with
+    `ujson <https://github.com/ultrajson/ultrajson>`_.
+    """
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def dumps(self, obj):
+        return self._ujson.dumps(obj, ensure_ascii=False,
+                                 escape_forward_slashes=False)
+
+    def loads(self, data):
+        return self._ujson.loads(data)
+
+
+#: codecs tried by :func:`default_codec`, fastest first
+CODECS = (OrjsonCodec, UjsonCodec, JSONCodec)
+
+
+def default_codec():
+    """Returns the fastest codec that is installed, falling back to
+    :class:`JSONCodec`.
+    """
+    for codec_class in CODECS:
+        try:
+            return codec_class()
+        except ImportError:
+            pass
@@ -6,14 +6,18 @@
 """
 import datetime
 import json
+import threading
+import weakref
+from operator import attrgetter
 
 from flask import current_app
 from flask import url_for
 
 from sqlalchemy.inspection import inspect
 
-from inflection import underscore, camelize, singularize, pluralize
-
+from flask_resteasy import inflect
+from flask_resteasy.inflect import underscore, camelize, singularize, \
+    pluralize
 from flask_resteasy.factories import ParserFactory
 from flask_resteasy.factories import ProcessorFactory
 from flask_resteasy.factories import BuilderFactory
@@ -26,6 +30,80 @@ EXCLUDES = {'to_model',
             'include',
             'all'}
 
+# maximum number of serializers compiled for sparse fieldsets per config
+MAX_SERIALIZERS = 64
+
+# settings resolved by inspecting the model, they are persisted by
+# flask_resteasy.caches.IntrospectionCache, the allowed fields are derived
+# from them so the excludes are still validated
+INTROSPECTED_ATTRS = ('fields', 'field_types', 'relationships',
+                      'relationship_types', 'relationship_fields',
+                      'relationship_keys', 'related_tables', 'orm_delete',
+                      'private_fields')
+
+
+def is_fk_join(rel):
+    """Returns True if the join of a relationship is exactly the equality
+    of its foreign key and the key it references, False if the join has
+    other conditions, e.g. a relationship to the active children only.
+
+    :param rel: SQLAlchemy relationship property
+    """
+    if rel.secondary is not None:
+        if len(rel.synchronize_pairs) != 1 or \
+                len(rel.secondary_synchronize_pairs) != 1:
+            return False
+        local, parent_col = rel.synchronize_pairs[0]
+        remote, child_col = rel.secondary_synchronize_pairs[0]
+        return bool(rel.primaryjoin.compare(local == parent_col) and
+                    rel.secondaryjoin.compare(remote == child_col))
+    if len(rel.local_remote_pairs) != 1:
+        return False
+    local, remote = rel.local_remote_pairs[0]
+    return bool(rel.primaryjoin.compare(local == remote))
+
+
+def compile_serializer(field_names, json_case, field_types, converters):
+    """Compiles a function that copies fields of a model object to a
+    dictionary keyed by the JSON names of the fields.
+
+    JSON names and type converters are resolved once, so serializing a row
+    is a single attribute fetch for all fields and converting the few fields
+    that need it.
+
+    :param field_names: fields to serialize
+
+    :param json_case: function converting field names to JSON names
+
+    :param field_types: dictionary of field names and types
+
+    :param converters: dictionary of types and functions converting
+                       values of the type to JSON
+    """
+    field_names = sorted(field_names)
+    keys = tuple(json_case(f) for f in field_names)
+    convert = tuple((json_case(f), converters[field_types[f]])
+                    for f in field_names if field_types.get(f) in converters)
+    if not field_names:
+        return lambda resource: {}
+    elif len(field_names) == 1:
+        # attrgetter returns a single value for one field
+        getter = attrgetter(field_names[0])
+
+        def get_values(resource):
+            return getter(resource),
+    else:
+        get_values = attrgetter(*field_names)
+
+    def serialize(resource):
+        rv = dict(zip(keys, get_values(resource)))
+        for key, converter in convert:
+            v = rv[key]
+            if v is not None:
+                rv[key] = converter(v)
+        return rv
+    return serialize
+
 
 class APIConfig(object):
     """The default configuration class used when registering API endpoints.
@@ -100,6 +178,13 @@ class APIConfig(object):
         self._private_fields = None
         self._endpoint_name = None
         self._relationships = None
+        self._related_tables = None
+        self._orm_delete = None
+        self._relationship_keys = None
+        self._serializer = None
+        self._serializers = {}
+        self._snapshots = weakref.WeakKeyDictionary()
+        self._finalize_lock = threading.Lock()
 
     @property
     def model_class(self):
@@ -125,6 +210,52 @@ class APIConfig(object):
         """
         return self._max_per_page
 
+    @property
+    def window_count(self):
+        """Count the total items of a paginated response in the same
+        statement as the page using ``COUNT(*) OVER ()``. The default is
+        the setting of the :class:`flask_resteasy.manager.APIManager`.
+        """
+        return self._get_window_count()
+
+    @property
+    def count_mode(self):
+        """How the total items of a paginated response are counted.
+
+         * `exact` - count on every request
+         * `cached` - cache counts for :attr:`count_ttl` seconds, cached
+           counts are removed when the resource is written to. Counts are
+           cached per worker process, writes handled by another process
+           leave them stale for up to :attr:`count_ttl` seconds.
+         * `estimate` - cache counts for :attr:`count_ttl` seconds even
+           if the resource is written to. The meta node returns
+           `total_estimate` instead of `no_pages`.
+
+        The default is the setting of the
+        :class:`flask_resteasy.manager.APIManager`.
+        """
+        return self._get_count_mode()
+
+    @property
+    def count_ttl(self):
+        """Number of seconds cached counts are kept. The default is
+        the setting of the :class:`flask_resteasy.manager.APIManager`.
+        """
+        return self._get_count_ttl()
+
+    @property
+    def stream_chunk_size(self):
+        """If set, list responses are streamed to the client reading this
+        many rows from the database at a time, so memory is bound by the
+        chunk size instead of the page size. Responses with includes are
+        not streamed, the included resources would be held until the end
+        of the response. Neither are responses read from MySQL or SQL
+        Server, their drivers can't read the links of a chunk while the
+        rows of the page are still being read. The default is the setting
+        of the :class:`flask_resteasy.manager.APIManager`.
+        """
+        return self._get_stream_chunk_size()
+
     @property
     def http_methods(self):
         """ HTTP methods that are available for this model's configuration
@@ -170,6 +301,29 @@ class APIConfig(object):
         """
         return self._get_relationship_types()
 
+    @property
+    def relationship_keys(self):
+        """Columns holding the ids of the links for each relationship of
+        the :attr:`model_class`, used to render links without loading the
+        related objects. Relationships with composite keys or joins with
+        conditions besides the foreign key are not included.
+
+         * to-one - ('MANYTOONE', foreign key field)
+         * to-many - ('ONETOMANY', field, table, foreign key column,
+           id column)
+         * many-to-many - ('MANYTOMANY', field, association table,
+           column for this model, column for the related model)
+        """
+        return self._get_relationship_keys()
+
+    @property
+    def related_tables(self):
+        """Names of the tables for the :attr:`model_class` and the models
+        it has relationships with. Writing to the resource can change the
+        data of any of these tables.
+        """
+        return self._get_related_tables()
+
     @property
     def allowed_from_model(self):
         """Fields that are marshaled from the :attr:`model_class`
@@ -235,6 +389,71 @@ class APIConfig(object):
         """
         return self._get_model_to_json_type_converters()
 
+    @property
+    def version_column(self):
+        """Name of the field changed on every write of a resource, like
+        a version counter or an updated timestamp. If set, the ETag of
+        conditional GET requests is computed with an aggregate query over
+        this field and they are answered without loading the resources,
+        see :class:`flask_resteasy.processors.ETagRequestProcessor`. Only
+        set it if every write of the resource, including writes of its
+        foreign keys, changes the field. The default is None.
+        """
+        return self._get_version_column()
+
+    @property
+    def response_cache(self):
+        """Cache for GET responses, see
+        :class:`flask_resteasy.caches.ResponseCache`, or None to not cache
+        responses. The default is the setting of the
+        :class:`flask_resteasy.manager.APIManager`.
+        """
+        return self._get_response_cache()
+
+    @property
+    def return_minimal(self):
+        """Should POST and PUT requests respond without a body by default?
+        Created resources are then only returned by the Location header.
+        Clients override this with a ``Prefer: return=minimal`` or
+        ``Prefer: return=representation`` header. The default is False.
+        """
+        return self._get_return_minimal()
+
+    @property
+    def orm_delete(self):
+        """Delete resources through the session, loading them first, instead
+        of with DELETE statements. This is needed if the ORM has to apply
+        cascades or update related rows, which is the case for models with
+        one to many or many to many relationships without
+        ``passive_deletes``, version counters or inheritance.
+        """
+        return self._get_orm_delete()
+
+    @property
+    def bulk_update_mappings(self):
+        """Apply PUT requests with a list of resources that don't change
+        links with :meth:`sqlalchemy.orm.Session.bulk_update_mappings`
+        instead of loading the resources first. This skips ORM events and
+        version counters of the model. The default is False.
+        """
+        return self._get_bulk_update_mappings()
+
+    @property
+    def json_codec(self):
+        """Codec encoding responses and decoding request bodies, see
+        :mod:`flask_resteasy.codecs`. The default is the setting of the
+        :class:`flask_resteasy.manager.APIManager`.
+        """
+        return self._get_json_codec()
+
+    @property
+    def serializer(self):
+        """Function that copies the :attr:`allowed_from_model` fields of a
+        model object to a dictionary for the JSON response. It's compiled
+        once, see :func:`compile_serializer`.
+        """
+        return self._get_serializer()
+
     @property
     def private_field_prefix(self):
         """Prefix for fields handled as private fields. The
@@ -303,6 +522,14 @@ class APIConfig(object):
         """
         return self._get_link_route_param()
 
+    @property
+    def link_ids_route_param(self):
+        """Keyword argument registered for the ids of linked resources in
+        routes removing links, i.e. `/orders/1/links/order_items/2,3`. The
+        default is `link_ids`.
+        """
+        return self._get_link_ids_route_param()
+
     @property
     def links_node(self):
         """Literal string name for a link node.
@@ -342,6 +569,98 @@ class APIConfig(object):
             [self._bp_name, self._endpoint_name])
         return url_for(endpoint)
 
+    def finalize(self):
+        """Resolves every setting of the configuration once and returns them
+        as an immutable :class:`ConfigSnapshot`, which parsers, processors
+        and builders use while handling requests. A snapshot is created
+        for each application on the first call in its context, usually by
+        the first request for the resource, and returned by later calls.
+
+        Call it after all models are registered, SQLAlchemy relationships
+        and back refs have to be configured. Settings resolved by inspecting
+        the model are read from the
+        :attr:`flask_resteasy.manager.APIManager.introspection_cache` if
+        there is one.
+        """
+        app = current_app._get_current_object()
+        rv = self._snapshots.get(app)
+        if rv is None:
+            with self._finalize_lock:
+                rv = self._snapshots.get(app)
+                if rv is None:
+                    cache = self.api_manager.introspection_cache
+                    if cache is not None and not self._snapshots:
+                        cache.load(self)
+                    rv = ConfigSnapshot(self)
+                    inflect.seed(rv.fields | rv.relationships |
+                                 {rv.resource_name, rv.resource_name_plural})
+                    if rv.response_cache is not None:
+                        rv.api_manager._add_response_cache(rv.response_cache)
+                    self._snapshots[app] = rv
+        return rv
+
+    def introspected(self):
+        """Returns the settings resolved by inspecting the model, see
+        :data:`INTROSPECTED_ATTRS`, as a dictionary of JSON types.
+        """
+        rv = {}
+        for name in INTROSPECTED_ATTRS:
+            value = getattr(self, name)
+            if isinstance(value, (set, frozenset)):
+                value = sorted(value)
+            rv[name] = value
+        return rv
+
+    def introspection_key(self):
+        """Returns a string identifying what the settings resolved by
+        inspecting the model depend on besides the schema version, see
+        :class:`flask_resteasy.caches.IntrospectionCache`, the class of
+        the configuration, the table, the excludes and the settings naming
+        the id, relationship id and private fields.
+        """
+        api_manager = self.api_manager
+        excludes = dict((key, sorted(api_manager.get_excludes_for(key)))
+                        for key in EXCLUDES)
+        if self._excludes:
+            excludes['model'] = dict((k, sorted(v))
+                                     for k, v in self._excludes.items())
+        return json.dumps(['%s.%s' % (type(self).__module__,
+                                      type(self).__name__),
+                           self.model_class.__table__.name, excludes,
+                           self.id_field, self.relationship_field_id_postfix,
+                           self.private_field_prefix],
+                          sort_keys=True)
+
+    def load_introspected(self, introspected):
+        """Sets the settings resolved by inspecting the model from a
+        dictionary returned by :meth:`introspected`, so the model is not
+        inspected again. Settings of subclasses overriding their ``_get_``
+        method are still resolved by the override.
+
+        :param introspected: dictionary returned by :meth:`introspected`
+        """
+        for name in INTROSPECTED_ATTRS:
+            value = introspected[name]
+            if isinstance(value, list):
+                value = set(value)
+            elif name == 'relationship_keys':
+                value = dict((k, tuple(v)) for k, v in value.items())
+            setattr(self, '_' + name, value)
+
+    def get_serializer(self, fields):
+        """Returns the serializer for a subset of the allowed fields,
+        for example for sparse fieldsets.
+
+        :param fields: frozenset of field names
+        """
+        rv = self._serializers.get(fields)
+        if rv is None:
+            rv = compile_serializer(fields, self.json_case, self.field_types,
+                                    self._serializer_converters())
+            if len(self._serializers) < MAX_SERIALIZERS:
+                self._serializers[fields] = rv
+        return rv
+
     def allowed_to_as_json(self):
         """Returns allowed fields and relationships that are sent to the client
         for this model's configuration as JSON
@@ -399,8 +718,7 @@ class APIConfig(object):
         if self._relationship_types is None:
             relations = inspect(self.model_class).relationships._data
             self._relationship_types = {
-                n: relations[n]._dependency_processor.direction.name
-                for n in relations}
+                n: relations[n].direction.name for n in relations}
         return self._relationship_types
 
     def _get_relationship_fields(self):
@@ -516,10 +834,113 @@ class APIConfig(object):
             self._relationships = set(
                 [c for c in inspect(self.model_class).relationships._data])
         return self._relationships
-    
+
     def _get_use_link_nodes(self):
         return True
 
+    def _get_window_count(self):
+        return self.api_manager.window_count
+
+    def _get_count_mode(self):
+        return self.api_manager.count_mode
+
+    def _get_count_ttl(self):
+        return self.api_manager.count_ttl
+
+    def _get_stream_chunk_size(self):
+        return self.api_manager.stream_chunk_size
+
+    def _get_relationship_keys(self):
+        if self._relationship_keys is None:
+            mapper = inspect(self.model_class)
+            rv = {}
+            for rel in mapper.relationships:
+                # links of filtered relationships are read through the ORM
+                if not is_fk_join(rel):
+                    continue
+                direction = rel.direction.name
+                target_id = rel.mapper.columns[self.id_field]
+                if rel.secondary is not None:
+                    local, parent_col = rel.synchronize_pairs[0]
+                    remote, child_col = rel.secondary_synchronize_pairs[0]
+                    if remote is not target_id:
+                        continue
+                    rv[rel.key] = (direction,
+                                   mapper.get_property_by_column(local).key,
+                                   rel.secondary.key, parent_col.name,
+                                   child_col.name)
+                else:
+                    local, remote = rel.local_remote_pairs[0]
+                    if direction == 'MANYTOONE':
+                        if remote is target_id:
+                            rv[rel.key] = (
+                                direction,
+                                mapper.get_property_by_column(local).key)
+                    elif direction == 'ONETOMANY':
+                        rv[rel.key] = (
+                            direction,
+                            mapper.get_property_by_column(local).key,
+                            remote.table.key, remote.name, target_id.name)
+            self._relationship_keys = rv
+        return self._relationship_keys
+
+    def _get_serializer(self):
+        if self._serializer is None:
+            self._serializer = compile_serializer(
+                self.allowed_from_model, self.json_case, self.field_types,
+                self._serializer_converters())
+        return self._serializer
+
+    def _serializer_converters(self):
+        # types the codec encodes natively are handed to it unconverted
+        native_types = self.json_codec.native_types
+        return dict((t, c) for t, c in
+                    self.model_to_json_type_converters.items()
+                    if t not in native_types)
+
+    @staticmethod
+    def _get_version_column():
+        return None
+
+    def _get_response_cache(self):
+        return self.api_manager.response_cache
+
+    def _get_json_codec(self):
+        return self.api_manager.json_codec
+
+    def _get_related_tables(self):
+        if self._related_tables is None:
+            rv = {self.model_class.__table__.name}
+            for rel in inspect(self.model_class).relationships:
+                rv.add(rel.mapper.local_table.name)
+                if rel.secondary is not None:
+                    rv.add(rel.secondary.name)
+            self._related_tables = rv
+        return self._related_tables
+
+    @staticmethod
+    def _get_return_minimal():
+        return False
+
+    def _get_orm_delete(self):
+        if self._orm_delete is None:
+            mapper = inspect(self.model_class)
+            rv = (mapper.version_id_col is not None or
+                  mapper.inherits is not None or
+                  mapper.polymorphic_on is not None)
+            for rel in mapper.relationships:
+                if rel.direction.name != 'MANYTOONE' and \
+                        not rel.passive_deletes:
+                    rv = True
+                elif rel.cascade.delete:
+                    rv = True
+            self._orm_delete = rv
+        return self._orm_delete
+
+    @staticmethod
+    def _get_bulk_update_mappings():
+        return False
+
     @staticmethod
     def _get_id_field():
         return 'id'
@@ -540,6 +961,10 @@ class APIConfig(object):
     def _get_link_route_param():
         return 'link'
 
+    @staticmethod
+    def _get_link_ids_route_param():
+        return 'link_ids'
+
     @staticmethod
     def _get_links_node():
         return 'links'
@@ -561,6 +986,12 @@ class APIConfig(object):
         return BuilderFactory
 
 
+#: properties of :class:`APIConfig` copied to a :class:`ConfigSnapshot`
+SNAPSHOT_ATTRS = tuple(sorted(
+    name for name, value in vars(APIConfig).items()
+    if isinstance(value, property) and name != 'url_for'))
+
+
 class EmberConfig(APIConfig):
     """Provides the settings to be compatible with the Ember.js
     `REST Adapter <http://emberjs.com/api/data/classes/DS.RESTAdapter.html>`_.
@@ -580,3 +1011,58 @@ class EmberConfig(APIConfig):
     @staticmethod
     def _get_resource_name_case():
         return lambda s: camelize(s, False)
+
+
+class ConfigSnapshot(object):
+    """Immutable copy of the settings of an :class:`APIConfig`, created by
+    :meth:`APIConfig.finalize`.
+
+    Every property of the configuration is read once, so reading a setting
+    is a slot access. Sets are frozen, dictionaries must not be changed.
+    The database, the :class:`flask_resteasy.manager.APIManager` and the
+    case functions are resolved once instead of through
+    :data:`flask.current_app` on every access, so a snapshot belongs to the
+    application it was created for. Other attributes, like the
+    methods of a custom configuration class, are looked up on the
+    configuration.
+
+    :param cfg: :class:`APIConfig` instance
+    """
+    __slots__ = SNAPSHOT_ATTRS + ('_cfg', '_endpoint')
+
+    def __init__(self, cfg):
+        set_attr = super(ConfigSnapshot, self).__setattr__
+        for name in SNAPSHOT_ATTRS:
+            value = getattr(cfg, name)
+            if isinstance(value, set):
+                value = frozenset(value)
+            set_attr(name, value)
+        set_attr('_cfg', cfg)
+        set_attr('_endpoint', cfg.endpoint_name if not cfg._bp_name else
+                 '.'.join([cfg._bp_name, cfg.endpoint_name]))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Configuration snapshots are immutable')
+
+    def __getattr__(self, name):
+        # only called for attributes that are not in the snapshot
+        if name == '_cfg':
+            raise AttributeError(name)
+        return getattr(self._cfg, name)
+
+    @property
+    def url_for(self):
+        """Returns the url for the endpoint taking into account if it was
+        registered with a Blueprint
+        """
+        return url_for(self._endpoint)
+
+    def finalize(self):
+        """Returns the snapshot itself
+        """
+        return self
+
+    def get_serializer(self, fields):
+        """See :meth:`APIConfig.get_serializer`
+        """
+        return self._cfg.get_serializer(fields)
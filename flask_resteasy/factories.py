@@ -5,14 +5,19 @@
 
 """
 from flask import request
+from flask_resteasy.errors import UnableToProcess
 from flask_resteasy.parsers import GetRequestParser
 from flask_resteasy.parsers import PutRequestParser
 from flask_resteasy.parsers import PostRequestParser
 from flask_resteasy.parsers import DeleteRequestParser
+from flask_resteasy.parsers import PatchRequestParser
 from flask_resteasy.processors import GetRequestProcessor
+from flask_resteasy.processors import ETagRequestProcessor
 from flask_resteasy.processors import PutRequestProcessor
 from flask_resteasy.processors import PostRequestProcessor
 from flask_resteasy.processors import DeleteRequestProcessor
+from flask_resteasy.processors import PatchRequestProcessor
+from flask_resteasy.processors import LinkRequestProcessor
 from flask_resteasy.builders import ResponseBuilder
 
 
@@ -37,6 +42,8 @@ class ParserFactory(object):
             return DeleteRequestParser(cfg, **kwargs)
         elif request.method == 'PUT':
             return PutRequestParser(cfg, **kwargs)
+        elif request.method == 'PATCH':
+            return PatchRequestParser(cfg, **kwargs)
 
 
 class ProcessorFactory(object):
@@ -53,6 +60,8 @@ class ProcessorFactory(object):
         """
         if request.method == 'GET':
             return GetRequestProcessor(cfg, req_par)
+        elif req_par.link and request.method in ('POST', 'PUT', 'DELETE'):
+            return LinkRequestProcessor(cfg, req_par)
         elif request.method == 'POST':
             post_process = cfg.api_manager.get_post_process(cfg.resource_name)
             return ProcessorFactory._create_process(
@@ -63,14 +72,32 @@ class ProcessorFactory(object):
             put_process = cfg.api_manager.get_put_process(cfg.resource_name)
             return ProcessorFactory._create_process(
                 PutRequestProcessor, cfg, req_par, put_process)
+        elif request.method == 'PATCH':
+            return PatchRequestProcessor(cfg, req_par)
+
+    @staticmethod
+    def create_etag(cfg, req_par):
+        """Factory method for creating the RequestProcessor computing the
+        ETag of a GET request.
+
+        :param cfg: :class:`flask_resteasy.configs.APIConfig` instance
+
+        :param req_par: :class:`flask_resteasy.parsers.RequestParser`
+                        for the current HTTP request
+        """
+        return ETagRequestProcessor(cfg, req_par)
 
     @staticmethod
     def _create_process(process, cfg, req_par, custom_process):
-        if custom_process and custom_process[0] in request.json and \
-                request.json[custom_process[0]] == custom_process[1].__name__:
-            return custom_process[1](cfg, req_par)
-        else:
-            return process(cfg, req_par)
+        if custom_process:
+            try:
+                json = req_par.request_json
+            except UnableToProcess:
+                json = None
+            if isinstance(json, dict) and \
+                    json.get(custom_process[0]) == custom_process[1].__name__:
+                return custom_process[1](cfg, req_par)
+        return process(cfg, req_par)
 
 
 class BuilderFactory(object):
@@ -0,0 +1,102 @@
+# coding=utf-8
+"""
+    flask_resteasy.inflect
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Memoized versions of the `inflection` functions used to convert the
+    case and number of field, relationship and resource names. The
+    conversions are regular expression cascades, memoizing them means a
+    name is only converted once.
+
+    The names of registered resources are seeded with :func:`seed`, so
+    requests for them don't convert names at all. Names seen first in a
+    request are memoized up to :data:`MAX_WORDS` per function, so request
+    input can't grow the memos without limit.
+"""
+import inflection
+
+#: maximum number of names memoized per function while handling requests,
+#: seeded names are always memoized
+MAX_WORDS = 4096
+
+_underscore = {}
+_camelize = {}
+_singularize = {}
+_pluralize = {}
+
+
+def _store(memo, key, value, force=False):
+    if force or len(memo) < MAX_WORDS:
+        memo[key] = value
+    return value
+
+
+def underscore(word):
+    """Memoized :func:`inflection.underscore`
+    """
+    try:
+        return _underscore[word]
+    except KeyError:
+        return _store(_underscore, word, inflection.underscore(word))
+
+
+def camelize(word, uppercase_first_letter=True):
+    """Memoized :func:`inflection.camelize`
+    """
+    key = (word, uppercase_first_letter)
+    try:
+        return _camelize[key]
+    except KeyError:
+        return _store(_camelize, key,
+                      inflection.camelize(word, uppercase_first_letter))
+
+
+def singularize(word):
+    """Memoized :func:`inflection.singularize`
+    """
+    try:
+        return _singularize[word]
+    except KeyError:
+        return _store(_singularize, word, inflection.singularize(word))
+
+
+def pluralize(word):
+    """Memoized :func:`inflection.pluralize`
+    """
+    try:
+        return _pluralize[word]
+    except KeyError:
+        return _store(_pluralize, word, inflection.pluralize(word))
+
+
+def _seed_word(word):
+    if word in _underscore and word in _pluralize:
+        return
+    _store(_underscore, word, inflection.underscore(word), True)
+    for flag in (True, False):
+        _store(_camelize, (word, flag), inflection.camelize(word, flag), True)
+    _store(_singularize, word, inflection.singularize(word), True)
+    _store(_pluralize, word, inflection.pluralize(word), True)
+
+
+def seed(words):
+    """Memoizes the conversions of words in every case used for JSON nodes,
+    model fields and URLs, singular and plural.
+
+    :param words: iterable of field, relationship or resource names
+    """
+    for word in words:
+        for form in set([word, inflection.underscore(word),
+                         inflection.camelize(word, False)]):
+            _seed_word(form)
+            _seed_word(_singularize[form])
+            _seed_word(_pluralize[form])
+            _seed_word(_camelize[(_singularize[form], False)])
+            _seed_word(_camelize[(_pluralize[form], False)])
+
+
+def clear():
+    """Removes every memoized name
+    """
+    for memo in (_underscore, _camelize, _singularize, _pluralize):
+        memo.clear()
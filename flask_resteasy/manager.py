@@ -4,11 +4,23 @@
     ~~~~~~~~~~~~~~~~~~~~~~
 
 """
+import gc
+from collections import OrderedDict
+from timeit import default_timer
+
 from flask import render_template
 from flask import Blueprint
+from flask import current_app
+from flask import has_app_context
 
-from inflection import singularize
+from sqlalchemy import select
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import configure_mappers
 
+from flask_resteasy import inflect
+from flask_resteasy.inflect import camelize, singularize, underscore
+from flask_resteasy.caches import CountCache
+from flask_resteasy.codecs import default_codec
 from flask_resteasy.configs import APIConfig
 from flask_resteasy.views import APIView
 from flask_resteasy.errors import UnableToProcess
@@ -41,29 +53,77 @@ class APIManager(object):
                          per page for a paginated response
 
     :param error_handler: error_handler for UnableToProcess exceptions
+
+    :param window_count: count the total items of a paginated response in
+                         the same statement as the page with
+                         ``COUNT(*) OVER ()`` instead of a separate
+                         COUNT query
+
+    :param count_mode: default for how total items of paginated responses
+                       are counted, see
+                       :attr:`flask_resteasy.configs.APIConfig.count_mode`
+
+    :param count_ttl: default number of seconds cached counts are kept
+
+    :param stream_chunk_size: default number of rows read at a time when
+                              streaming list responses, None to not stream
+
+    :param json_codec: codec encoding responses and decoding request bodies,
+                       see :mod:`flask_resteasy.codecs`, the default is the
+                       fastest codec installed
+
+    :param response_cache: default cache for GET responses, for example a
+                           :class:`flask_resteasy.caches.ResponseCache`,
+                           None to not cache responses
+
+    :param warm_up: warm up each resource when it is registered,
+                    see :meth:`warm_up`
+
+    :param introspection_cache: a
+                                :class:`flask_resteasy.caches.IntrospectionCache`
+                                to finalize configurations from, None to
+                                inspect the models in every process
     """
 
     def __init__(self, app=None, db=None, cfg_class=APIConfig, decorators=None,
                  bp=None, excludes=None, methods=None, max_per_page=20,
-                 error_handler=None):
+                 error_handler=None, window_count=False, count_mode='exact',
+                 count_ttl=60, stream_chunk_size=None, json_codec=None,
+                 response_cache=None, warm_up=False,
+                 introspection_cache=None):
         self._app = app
         self._db = db
         self._cfg_class = cfg_class
         self._bp = bp
         self._excludes = excludes
         self._methods = methods
-        self._model_for_resources = {}
         self._cfg_for_resources = {}
-        self._post_processes = {}
-        self._put_processes = {}
+        self._resources = {}
         self._max_per_page = max_per_page
+        self._window_count = window_count
+        self._count_mode = count_mode
+        self._count_ttl = count_ttl
+        self._count_cache = CountCache()
+        self._stream_chunk_size = stream_chunk_size
+        self._json_codec = json_codec or default_codec()
+        self._response_cache = response_cache
+        self._response_caches = set()
+        self._warm_up = warm_up
+        self._warm_up_times = OrderedDict()
+        self._introspection_cache = introspection_cache
         if app is not None:
             self.init_app(app, db, cfg_class, decorators,
-                          bp, excludes, methods, max_per_page, error_handler)
+                          bp, excludes, methods, max_per_page, error_handler,
+                          window_count, count_mode, count_ttl,
+                          stream_chunk_size, json_codec, response_cache,
+                          warm_up, introspection_cache)
 
     def init_app(self, app, db, cfg_class=APIConfig, decorators=None,
                  bp=None, excludes=None, methods=None, max_per_page=20,
-                 error_handler=None):
+                 error_handler=None, window_count=False, count_mode='exact',
+                 count_ttl=60, stream_chunk_size=None, json_codec=None,
+                 response_cache=None, warm_up=False,
+                 introspection_cache=None):
         """Stores the :class:`flask.Flask` application object,
         :class:`flask.ext.sqlalchemy.SQLAlchemy` object and any global
         default settings.
@@ -93,6 +153,44 @@ class APIManager(object):
                              per page for a paginated response
 
         :param error_handler: error_handler for UnableToProcess exceptions
+
+        :param window_count: count the total items of a paginated response
+                             in the same statement as the page with
+                             ``COUNT(*) OVER ()``. Backends without window
+                             functions fall back to a separate COUNT query.
+
+        :param count_mode: default for how total items of paginated
+                           responses are counted, see
+                           :attr:`flask_resteasy.configs.APIConfig.count_mode`
+
+        :param count_ttl: default number of seconds cached counts are kept
+
+        :param stream_chunk_size: default number of rows read at a time when
+                                  streaming list responses, None to not
+                                  stream
+
+        :param json_codec: codec encoding responses and decoding request
+                           bodies, see :mod:`flask_resteasy.codecs`, the
+                           default is the fastest codec installed
+
+        :param response_cache: default cache for GET responses, for example
+                               a :class:`flask_resteasy.caches.ResponseCache`,
+                               None to not cache responses
+
+        :param warm_up: warm up each resource when it is registered instead
+                        of on its first request, see :meth:`warm_up`. All
+                        models have to be defined before the first resource
+                        is registered.
+
+        :param introspection_cache: a
+                                    :class:`flask_resteasy.caches.IntrospectionCache`
+                                    to finalize configurations from, None to
+                                    inspect the models in every process.
+                                    Added configurations are written to it
+                                    when :meth:`warm_up` warms up all
+                                    resources. With `warm_up` set, call
+                                    :meth:`flask_resteasy.caches.IntrospectionCache.save`
+                                    after registering the resources.
         """
         self._app = app
         self._app.api_manager = self
@@ -106,6 +204,14 @@ class APIManager(object):
         else:
             self._methods = {'GET'}
         self._max_per_page = max_per_page
+        self._window_count = window_count
+        self._count_mode = count_mode
+        self._count_ttl = count_ttl
+        self._stream_chunk_size = stream_chunk_size
+        self._json_codec = json_codec or default_codec()
+        self._response_cache = response_cache
+        self._warm_up = warm_up
+        self._introspection_cache = introspection_cache
 
         if decorators:
             APIView.decorators = decorators
@@ -144,6 +250,178 @@ class APIManager(object):
         """
         return self._db
 
+    @property
+    def window_count(self):
+        """Default for counting paginated items with a window function,
+        see :attr:`flask_resteasy.configs.APIConfig.window_count`
+        """
+        return self._window_count
+
+    @property
+    def count_mode(self):
+        """Default count mode for paginated responses, see
+        :attr:`flask_resteasy.configs.APIConfig.count_mode`
+        """
+        return self._count_mode
+
+    @property
+    def count_ttl(self):
+        """Default number of seconds cached counts are kept
+        """
+        return self._count_ttl
+
+    @property
+    def stream_chunk_size(self):
+        """Default number of rows read at a time for streamed responses,
+        see :attr:`flask_resteasy.configs.APIConfig.stream_chunk_size`
+        """
+        return self._stream_chunk_size
+
+    @property
+    def json_codec(self):
+        """Default codec for responses and request bodies, see
+        :attr:`flask_resteasy.configs.APIConfig.json_codec`
+        """
+        return self._json_codec
+
+    @property
+    def response_cache(self):
+        """Default cache for GET responses, see
+        :attr:`flask_resteasy.configs.APIConfig.response_cache`
+        """
+        return self._response_cache
+
+    @property
+    def count_cache(self):
+        """:class:`flask_resteasy.caches.CountCache` for paginated
+        responses
+        """
+        return self._count_cache
+
+    @property
+    def introspection_cache(self):
+        """:class:`flask_resteasy.caches.IntrospectionCache` configurations
+        are finalized from, or None
+        """
+        return self._introspection_cache
+
+    @property
+    def warm_up_times(self):
+        """Ordered dictionary of the seconds taken to warm up each resource
+        by resource name, see :meth:`warm_up`
+        """
+        return self._warm_up_times
+
+    def warm_up(self, resource_names=None, prepare_fork=False):
+        """Does the work of the first request to a resource ahead of time.
+        The SQLAlchemy mappers are configured, the configuration of each
+        resource is finalized, see
+        :meth:`flask_resteasy.configs.APIConfig.finalize`, and the
+        statements reading pages, resources by id and the ids of to-many
+        links are compiled by running them for no rows.
+
+        Call it after all resources are registered, for example before a
+        server like gunicorn with ``--preload`` forks its workers, so
+        workers share the warmed up objects copy-on-write.
+
+        When all resources are warmed up, configurations missing from the
+        :attr:`introspection_cache` are written to it.
+
+        Returns an ordered dictionary of the seconds taken for each resource
+        by resource name, which is also kept in :attr:`warm_up_times`.
+
+        :param resource_names: names of the resources to warm up, all
+                               registered resources if None
+
+        :param prepare_fork: dispose the connection pools of the engines
+                             used, connections must not be shared with
+                             forked processes, and move all objects to the
+                             permanent generation of the garbage collector
+                             with :func:`gc.freeze`, so collections in
+                             forked processes don't copy their pages. Don't
+                             use it with in-memory SQLite databases, which
+                             are lost when their connection is closed.
+        """
+        all_resources = resource_names is None
+        if all_resources:
+            resource_names = list(self._cfg_for_resources)
+        configure_mappers()
+
+        ctx = None
+        if not has_app_context() or \
+                current_app._get_current_object() is not self._app:
+            ctx = self._app.app_context()
+            ctx.push()
+        # a session of its own, the application's session is left as it is
+        session = self._db.create_scoped_session()
+        rv = OrderedDict()
+        engines = set()
+        try:
+            for resource_name in resource_names:
+                start = default_timer()
+                cfg = self.get_cfg(resource_name)
+                engines.add(self._warm_up_statements(session, cfg))
+                rv[cfg.resource_name] = default_timer() - start
+            if self._introspection_cache is not None and all_resources:
+                self._introspection_cache.save()
+        finally:
+            session.remove()
+            if ctx is not None:
+                ctx.pop()
+        self._warm_up_times.update(rv)
+
+        if prepare_fork:
+            for engine in engines:
+                engine.dispose()
+            gc.collect()
+            # Python 3.7 and later
+            if hasattr(gc, 'freeze'):
+                gc.freeze()
+        return rv
+
+    @staticmethod
+    def _warm_up_statements(session, cfg):
+        """Runs the statements of common requests for no rows, so they are
+        compiled and cached by SQLAlchemy. Returns the engine used.
+        """
+        model_class = cfg.model_class
+        id_col = getattr(model_class, cfg.id_field)
+        # a page of resources
+        session.query(model_class).order_by(id_col).limit(0).offset(0).all()
+        # resources by id
+        session.query(model_class).filter(id_col.in_([])).order_by(
+            id_col).all()
+        # ids of to-many links, see ResponseBuilder._load_link_ids
+        tables = model_class.metadata.tables
+        for key in cfg.relationship_keys.values():
+            if key[0] == 'MANYTOONE':
+                continue
+            table = tables[key[2]]
+            parent_col, child_col = table.c[key[3]], table.c[key[4]]
+            session.execute(select(parent_col, child_col).where(
+                parent_col.in_([])).order_by(parent_col, child_col)).fetchall()
+        return session().get_bind(inspect(model_class))
+
+    def invalidate(self, cfg):
+        """Invalidates cached data after a resource has been written to.
+        Request processors call this after committing their changes.
+
+        :param cfg: :class:`flask_resteasy.configs.APIConfig` for the
+                    resource written to
+        """
+        self._count_cache.invalidate(cfg.related_tables)
+        # writes change the links rendered for related resources too,
+        # so responses read from any related table are removed
+        for cache in list(self._response_caches):
+            cache.invalidate(cfg.related_tables)
+
+    def _add_response_cache(self, cache):
+        """Adds the response cache of a finalized configuration to the
+        caches invalidated by :meth:`invalidate`. Responses are only cached
+        for finalized configurations.
+        """
+        self._response_caches.add(cache)
+
     @property
     def configs(self):
         """Dictionary of configurations objects by resource name
@@ -151,16 +429,12 @@ class APIManager(object):
         return self._cfg_for_resources
 
     def get_cfg(self, resource_name):
-        """Returns the :class:`flask_resteasy.configs.APIConfig` for
-        a resource.
+        """Returns the finalized configuration for a resource, see
+        :meth:`flask_resteasy.configs.APIConfig.finalize`.
 
         :param resource_name: name of resource
         """
-        resource_name = singularize(resource_name)
-        if resource_name not in self._cfg_for_resources:
-            raise UnableToProcess('Resource Error',
-                                  'Resource [%s] not found' % resource_name)
-        return self._cfg_for_resources[resource_name]
+        return self._get_resource(resource_name).cfg.finalize()
 
     def get_model(self, resource_name):
         """Returns the model :class:`flask.ext.sqlalchemy.Model`
@@ -168,27 +442,51 @@ class APIManager(object):
 
         :param resource_name: name of resource
         """
-        resource_name = singularize(resource_name)
-        if resource_name not in self._model_for_resources:
-            raise UnableToProcess('Resource Error',
-                                  'Resource [%s] not found' % resource_name)
-        return self._model_for_resources[resource_name]
-
-    def _register_cfg(self, cfg, resource_name):
-        resource_name = singularize(resource_name)
-        self._cfg_for_resources[resource_name] = cfg
-
-    def _register_model(self, model_class, resource_name):
-        resource_name = singularize(resource_name)
-        self._model_for_resources[resource_name] = model_class
+        return self._get_resource(resource_name).model_class
+
+    def _get_resource(self, resource_name):
+        rv = self._resources.get(resource_name)
+        if rv is None:
+            # spellings that are not indexed, like other plural forms
+            rv = self._resources.get(singularize(resource_name))
+            if rv is None:
+                raise UnableToProcess('Resource Error',
+                                      'Resource [%s] not found'
+                                      % singularize(resource_name))
+        return rv
+
+    def _register_resource(self, cfg, model_class):
+        """Indexes the registered resource by its singular and plural name,
+        underscored and camel cased, and by its table name, so looking up
+        a resource by any of them is a single dictionary lookup.
+
+        Raises a ValueError if a spelling already names another resource.
+        """
+        resource = _Resource(cfg, model_class)
+        name = singularize(cfg.resource_name)
+        spellings = [name, cfg.resource_name, cfg.resource_name_plural,
+                     model_class.__table__.name]
+        for spelling in list(spellings):
+            spellings.append(underscore(spelling))
+            spellings.append(camelize(underscore(spelling), False))
+            spellings.append(camelize(underscore(spelling)))
+        for spelling in spellings:
+            other = self._resources.get(spelling)
+            if other is not None and \
+                    singularize(other.cfg.resource_name) != name:
+                raise ValueError('Resource [%s] can not be registered, [%s] '
+                                 'names resource [%s]'
+                                 % (name, spelling,
+                                    singularize(other.cfg.resource_name)))
+        self._cfg_for_resources[name] = cfg
+        for spelling in spellings:
+            self._resources[spelling] = resource
 
     def _register_post_process(self, resource_name, post_process):
-        resource_name = singularize(resource_name)
-        self._post_processes[resource_name] = post_process
+        self._get_resource(resource_name).post_process = post_process
 
     def _register_put_process(self, resource_name, put_process):
-        resource_name = singularize(resource_name)
-        self._put_processes[resource_name] = put_process
+        self._get_resource(resource_name).put_process = put_process
 
     def get_excludes_for(self, key):
         """Returns an exclude list for a specific key.
@@ -212,12 +510,16 @@ class APIManager(object):
             return set([])
 
     def get_post_process(self, resource_name):
-        resource_name = singularize(resource_name)
-        return self._post_processes.get(resource_name, None)
+        try:
+            return self._get_resource(resource_name).post_process
+        except UnableToProcess:
+            return None
 
     def get_put_process(self, resource_name):
-        resource_name = singularize(resource_name)
-        return self._put_processes.get(resource_name, None)
+        try:
+            return self._get_resource(resource_name).put_process
+        except UnableToProcess:
+            return None
 
     def register_api(self, model_class, cfg_class=None, methods=None,
                      bp=None, excludes=None, max_per_page=None,
@@ -295,11 +597,15 @@ class APIManager(object):
         cfg = cfg_class(model_class, excludes, max_per_page, methods,
                         None if not has_blueprint else reg_with.name)
 
-        # register API configuration object by resource name
-        self._register_cfg(cfg, cfg.resource_name)
+        # memoize the case and plural conversions of the resource and field
+        # names, relationships are seeded when the configuration is
+        # finalized because back refs may not be set yet
+        inflect.seed([model_class.__table__.name, cfg.resource_name] +
+                     [c.key for c in model_class.__table__.columns])
 
-        # register model class by resource name
-        self._register_model(model_class, cfg.resource_name)
+        # register API configuration object and model class by every
+        # spelling of the resource name
+        self._register_resource(cfg, model_class)
 
         # register custom post
         if post_process:
@@ -316,34 +622,55 @@ class APIManager(object):
         view_func = APIView.as_view(cfg.endpoint_name, cfg)
 
         # register routes
-        reg_methods = list({'GET', 'POST'} & methods)
+        reg_methods = list({'GET', 'POST', 'PUT', 'DELETE'} & methods)
         if len(reg_methods) > 0:
             reg_with.add_url_rule(url,
                                   view_func=view_func,
                                   methods=reg_methods)
 
-        reg_methods = list({'GET', 'PUT', 'DELETE'} & methods)
+        reg_methods = list({'GET', 'PUT', 'PATCH', 'DELETE'} & methods)
         if len(reg_methods) > 0:
             reg_with.add_url_rule('%s/<%s>' % (url, cfg.id_route_param),
                                   view_func=view_func,
                                   methods=reg_methods)
 
-        reg_methods = list({'GET'} & methods)
+        if cfg.use_link_nodes:
+            link_url = '%s/<%s>/%s/<%s>' % (url, cfg.id_route_param,
+                                            cfg.links_node,
+                                            cfg.link_route_param)
+        else:
+            link_url = '%s/<%s>/<%s>' % (url, cfg.id_route_param,
+                                         cfg.link_route_param)
+        reg_methods = list({'GET', 'POST', 'PUT', 'DELETE'} & methods)
+        if len(reg_methods) > 0:
+            reg_with.add_url_rule(link_url,
+                                  view_func=view_func,
+                                  methods=reg_methods)
+
+        # removes some of the links of a resource
+        reg_methods = list({'DELETE'} & methods)
         if len(reg_methods) > 0:
-            if cfg.use_link_nodes:
-                reg_with.add_url_rule('%s/<%s>/%s/<%s>' %
-                                      (url, cfg.id_route_param,
-                                       cfg.links_node,
-                                       cfg.link_route_param),
-                                      view_func=view_func,
-                                      methods=reg_methods)
-            else:
-                reg_with.add_url_rule('%s/<%s>/<%s>' %
-                                      (url, cfg.id_route_param,
-                                       cfg.link_route_param),
-                                      view_func=view_func,
-                                      methods=reg_methods)
+            reg_with.add_url_rule('%s/<%s>' % (link_url,
+                                               cfg.link_ids_route_param),
+                                  view_func=view_func,
+                                  methods=reg_methods)
 
         # register blueprint with app
         if has_blueprint:
             self._app.register_blueprint(reg_with)
+
+        if self._warm_up:
+            self.warm_up([cfg.resource_name])
+
+
+class _Resource(object):
+    """Configuration, model class and custom processes registered for a
+    resource, indexed by every spelling of its name.
+    """
+    __slots__ = ('cfg', 'model_class', 'post_process', 'put_process')
+
+    def __init__(self, cfg, model_class):
+        self.cfg = cfg
+        self.model_class = model_class
+        self.post_process = None
+        self.put_process = None
@@ -4,11 +4,59 @@
     ~~~~~~~~~~~~~~~~~~~~~~
 
 """
+import base64
+import datetime
+import decimal
+import json
 from abc import abstractmethod
+
 from flask import request, current_app
 from flask_resteasy.errors import UnableToProcess
 
 
+def encode_cursor(keys, values):
+    """Encodes the sort key names and the key values of a row into an
+    opaque cursor token used for keyset pagination.
+
+    :param keys: list of sort field names, ending with the id field
+    :param values: list of values for the sort fields of a row
+    """
+    def _default(v):
+        if isinstance(v, (datetime.datetime, datetime.date, datetime.time)):
+            return v.isoformat()
+        if isinstance(v, decimal.Decimal):
+            # as a string so no digits are lost
+            return str(v)
+        raise TypeError('Value [%r] can not be used in a cursor' % v)
+
+    token = json.dumps({'k': keys, 'v': values}, separators=(',', ':'),
+                       default=_default)
+    return base64.urlsafe_b64encode(
+        token.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decodes a cursor token created by :func:`encode_cursor`.
+    Returns a tuple of the sort key names and the values.
+
+    :param token: cursor token sent by the client
+    """
+    try:
+        token = str(token)
+        token += '=' * (-len(token) % 4)
+        rv = json.loads(base64.urlsafe_b64decode(
+            token.encode('ascii')).decode('utf-8'))
+        keys, values = rv['k'], rv['v']
+    except (ValueError, TypeError, KeyError, UnicodeError):
+        raise UnableToProcess('Pagination Error',
+                              'Cursor [%s] is invalid' % token)
+    if not isinstance(keys, list) or not isinstance(values, list) or \
+            len(keys) != len(values):
+        raise UnableToProcess('Pagination Error',
+                              'Cursor [%s] is invalid' % token)
+    return keys, values
+
+
 class RequestParser(object):
     """Parses Route and Query parameters for an HTTP request.
 
@@ -22,13 +70,37 @@ class RequestParser(object):
         self._cfg = cfg
         self._idents = []
         self._link = None
+        self._link_idents = []
         self._filter = None
         self._sort = None
         self._include = None
         self._page = None
         self._per_page = None
+        self._after = None
+        self._before = None
+        self._count = None
+        self._fields = None
+        self._return_minimal = False
+        self._request_json = None
         self._parse(**kwargs)
 
+    @property
+    def request_json(self):
+        """Request body decoded with the configured
+        :attr:`flask_resteasy.configs.APIConfig.json_codec`. The body is
+        decoded on the first access and shared by the factories and the
+        processors of the request.
+        """
+        if self._request_json is None:
+            try:
+                self._request_json = self._cfg.json_codec.loads(
+                    request.get_data(cache=True))
+            except ValueError:
+                raise UnableToProcess('Bad Request',
+                                      'Unable to decode JSON request body',
+                                      400)
+        return self._request_json
+
     @property
     def idents(self):
         """List of identifiers set in the `ident` route parameter.
@@ -57,6 +129,18 @@ class RequestParser(object):
         """
         return self._link
 
+    @property
+    def link_idents(self):
+        """List of identifiers of linked resources set in the `link_ids`
+        route parameter when removing links.
+
+        For example::
+
+            orders/1/links/order_items/2,3
+            link_idents = [2,3]
+        """
+        return self._link_idents
+
     @property
     def filter(self):
         """Dictionary of field name and value filter pairs.
@@ -94,6 +178,18 @@ class RequestParser(object):
         """
         return self._include
 
+    @property
+    def fields(self):
+        """Dictionary of resource names and the set of fields returned for
+        the resource (sparse fieldsets). The id field is always returned.
+
+        For example::
+
+            products?fields[products]=name,sku
+            fields = {'product': {'id', 'name', 'sku'}}
+        """
+        return self._fields
+
     @property
     def page(self):
         """Page number requested for a paginated request.
@@ -106,6 +202,67 @@ class RequestParser(object):
         """
         return self._per_page
 
+    @property
+    def after(self):
+        """Decoded cursor set in the `page[after]` query parameter for a
+        keyset paginated request. The cursor is a tuple of the sort key names
+        and their values, an empty tuple is used for the first page.
+
+        For example::
+
+            products?page[after]=
+            after = ()
+        """
+        return self._after
+
+    @property
+    def before(self):
+        """Decoded cursor set in the `page[before]` query parameter for a
+        keyset paginated request. See :attr:`after`.
+        """
+        return self._before
+
+    @property
+    def count(self):
+        """How the total items for a paginated request are counted, set in
+        the `count` query parameter. Use `none` to skip counting and `exact`
+        to count even if the resource caches its counts.
+
+        For example::
+
+            products?count=none
+            count = 'none'
+        """
+        return self._count
+
+    @property
+    def return_minimal(self):
+        """Should a write respond without a body? Set by the client with
+        the `Prefer` header, otherwise the default of the resource, see
+        :attr:`flask_resteasy.configs.APIConfig.return_minimal`.
+
+        For example::
+
+            Prefer: return=minimal
+            return_minimal = True
+        """
+        return self._return_minimal
+
+    @property
+    def cache_key(self):
+        """String identifying the request by its resource, route parameters
+        and normalized query parameters, used as key for cached responses.
+        """
+        return repr((
+            self._cfg.resource_name, tuple(self._idents), self._link,
+            sorted(self._filter.items()) if self._filter else None,
+            tuple(self._sort.items()) if self._sort else None,
+            sorted(self._include) if self._include else None,
+            self._page, self._per_page, self._after, self._before,
+            self._count,
+            sorted((k, sorted(v)) for k, v in self._fields.items())
+            if self._fields else None))
+
     @property
     def qp_key_pairs_del(self):
         """Delimiter for separating multiple key value pairs.
@@ -136,6 +293,12 @@ class RequestParser(object):
         """
         return 'include'
 
+    @property
+    def fields_qp(self):
+        """Fields query parameter keyword, used as `fields[resource]`.
+        """
+        return 'fields'
+
     @property
     def page_qp(self):
         """Query parameter for current per page requested for a paginated
@@ -151,6 +314,27 @@ class RequestParser(object):
         """
         return 'per_page'
 
+    @property
+    def after_qp(self):
+        """Query parameter for the cursor of a keyset paginated request.
+        Items after the cursor are returned.
+        """
+        return 'page[after]'
+
+    @property
+    def before_qp(self):
+        """Query parameter for the cursor of a keyset paginated request.
+        Items before the cursor are returned.
+        """
+        return 'page[before]'
+
+    @property
+    def count_qp(self):
+        """Query parameter for how the total items of a paginated request
+        are counted.
+        """
+        return 'count'
+
     @property
     def no_pages_param(self):
         """Not al query parameter but it's used when building
@@ -158,6 +342,27 @@ class RequestParser(object):
         """
         return 'no_pages'
 
+    @property
+    def total_estimate_param(self):
+        """Not a query parameter but it's used when building the meta
+        pagination response for resources with estimated counts
+        """
+        return 'total_estimate'
+
+    @property
+    def next_param(self):
+        """Not a query parameter but it's used when building the meta
+        pagination response for the next page cursor
+        """
+        return 'next'
+
+    @property
+    def prev_param(self):
+        """Not a query parameter but it's used when building the meta
+        pagination response for the previous page cursor
+        """
+        return 'prev'
+
     @abstractmethod
     def _parse(self, **kwargs):
         """Initiates the parsing process.
@@ -165,6 +370,15 @@ class RequestParser(object):
         """
         pass
 
+    def _parse_prefer(self):
+        self._return_minimal = self._cfg.return_minimal
+        for pref in request.headers.get('Prefer', '').split(','):
+            pref = pref.split(';')[0].strip().replace(' ', '')
+            if pref == 'return=minimal':
+                self._return_minimal = True
+            elif pref == 'return=representation':
+                self._return_minimal = False
+
     def _parse_idents(self, kwargs):
         idents = kwargs.get(self._cfg.id_route_param, None)
         if idents is None:
@@ -196,6 +410,19 @@ class RequestParser(object):
                                   'Link route [%s] not allowed' % self._link,
                                   403)
 
+    def _parse_link_idents(self, kwargs):
+        idents = kwargs.get(self._cfg.link_ids_route_param, None)
+        if idents is None:
+            return
+
+        self._link_idents = idents.split(',')
+        for i in self._link_idents:
+            try:
+                int(i)
+            except ValueError:
+                raise UnableToProcess('Route ID Error',
+                                      'Link IDs [%s] are invalid' % idents)
+
     def _parse_filter(self):
         filter_str = request.args.get(self.filter_qp, None)
         if filter_str is None:
@@ -306,11 +533,56 @@ class RequestParser(object):
                                               'Include name [%s] not allowed'
                                               % i, 403)
 
+    def _parse_fields(self):
+        prefix = '%s[' % self.fields_qp
+        for qp in request.args:
+            if not qp.startswith(prefix) or not qp.endswith(']'):
+                continue
+
+            cfg = current_app.api_manager.get_cfg(
+                self._cfg.resource_name_case(qp[len(prefix):-1]))
+            fields_str = request.args[qp]
+            if len(fields_str) == 0:
+                raise UnableToProcess('Fields Error', 'Fields are blank')
+
+            if self._fields is None:
+                self._fields = {}
+            fields = {cfg.id_field} & cfg.allowed_from_model
+            for f in fields_str.split(self.qp_key_pairs_del):
+                f = cfg.model_case(f)
+                if f in cfg.allowed_from_model:
+                    fields.add(f)
+                else:
+                    if f not in cfg.fields:
+                        # Unknown field for resource
+                        raise UnableToProcess('Fields Error',
+                                              'Field [%s] unknown' % f)
+                    else:
+                        # Field not allowed for resource
+                        raise UnableToProcess('Fields Error',
+                                              'Field [%s] not allowed' % f,
+                                              403)
+            self._fields[cfg.resource_name] = frozenset(fields)
+
+    def _parse_count(self):
+        count = request.args.get(self.count_qp, None)
+        if count is None:
+            return
+
+        if count not in ('none', 'exact'):
+            raise UnableToProcess('Pagination Error',
+                                  'Count [%s] is invalid' % count)
+        self._count = count
+
     def _parse_pagination(self):
         page = request.args.get(self.page_qp, None)
         per_page = request.args.get(self.per_page_qp, None)
+        after = request.args.get(self.after_qp, None)
+        before = request.args.get(self.before_qp, None)
 
-        if page is None:
+        if after is not None or before is not None:
+            self._parse_cursor(page, after, before)
+        elif page is None:
             return
 
         if page:
@@ -328,6 +600,24 @@ class RequestParser(object):
                                       'Per Page number [%s] is not integer'
                                       % per_page)
 
+    def _parse_cursor(self, page, after, before):
+        if page is not None:
+            raise UnableToProcess('Pagination Error',
+                                  'Page number and cursor can not be '
+                                  'used together')
+        if after is not None and before is not None:
+            raise UnableToProcess('Pagination Error',
+                                  'Only one of [%s] or [%s] can be set'
+                                  % (self.after_qp, self.before_qp))
+        # a blank cursor requests the first page
+        if after is not None:
+            self._after = decode_cursor(after) if after else ()
+        else:
+            if not before:
+                raise UnableToProcess('Pagination Error',
+                                      'Cursor [%s] is blank' % self.before_qp)
+            self._before = decode_cursor(before)
+
 
 class GetRequestParser(RequestParser):
     """Parses request parameters for HTTP GET requests
@@ -342,6 +632,8 @@ class GetRequestParser(RequestParser):
         self._parse_sort()
         self._parse_include()
         self._parse_pagination()
+        self._parse_count()
+        self._parse_fields()
 
 
 class PostRequestParser(RequestParser):
@@ -349,6 +641,8 @@ class PostRequestParser(RequestParser):
     """
     def _parse(self, **kwargs):
         self._parse_idents(kwargs)
+        self._parse_link(kwargs)
+        self._parse_prefer()
 
 
 class PutRequestParser(RequestParser):
@@ -356,6 +650,15 @@ class PutRequestParser(RequestParser):
     """
     def _parse(self, **kwargs):
         self._parse_idents(kwargs)
+        self._parse_link(kwargs)
+        self._parse_prefer()
+
+
+class PatchRequestParser(RequestParser):
+    """Parses request parameters for HTTP PATCH requests
+    """
+    def _parse(self, **kwargs):
+        self._parse_idents(kwargs)
 
 
 class DeleteRequestParser(RequestParser):
@@ -363,3 +666,6 @@ class DeleteRequestParser(RequestParser):
     """
     def _parse(self, **kwargs):
         self._parse_idents(kwargs)
+        self._parse_link(kwargs)
+        self._parse_link_idents(kwargs)
+        self._parse_filter()
@@ -4,13 +4,33 @@
     ~~~~~~~~~~~~~~~~~~~~~~~~~
 
 """
+import datetime
+import decimal
+import hashlib
+import math
 from abc import abstractmethod
 
 from flask import request
 
-from inflection import pluralize
+from sqlalchemy import and_, or_, case, func, literal, select
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import load_only, selectinload
+from sqlalchemy.sql import ClauseElement
 
 from flask_resteasy.errors import UnableToProcess
+from flask_resteasy.inflect import pluralize
+from flask_resteasy.parsers import encode_cursor
+
+# maximum number of ids bound in a single IN clause
+IN_CHUNK_SIZE = 500
+
+# operators changing a field in the database, see _field_value
+FIELD_OPS = {'$inc', '$dec', '$append'}
+
+# field types accepting the numeric and string operators
+NUMERIC_TYPES = {'INTEGER', 'BIGINT', 'SMALLINT', 'NUMERIC', 'DECIMAL',
+                 'FLOAT', 'REAL', 'DOUBLE', 'DOUBLE PRECISION'}
+STRING_TYPES = {'VARCHAR', 'NVARCHAR', 'CHAR', 'NCHAR', 'TEXT', 'CLOB'}
 
 
 class RequestProcessor(object):
@@ -22,6 +42,13 @@ class RequestProcessor(object):
                            instance
 
     """
+    # can field operators like $inc be used, see _field_value
+    _allow_field_ops = False
+
+    # are to-many links replaced instead of set on new resources, see
+    # _replace_links
+    _replace_to_many = False
+
     def __init__(self, cfg, request_parser):
         self._cfg = cfg
         self._parser = request_parser
@@ -29,6 +56,8 @@ class RequestProcessor(object):
         self._links = {}
         self._render_as_list = False
         self._pager = None
+        self._stream_chunk_size = None
+        self._bulk = False
         self._process()
 
     @abstractmethod
@@ -49,6 +78,14 @@ class RequestProcessor(object):
         """
         return self._render_as_list
 
+    @property
+    def bulk(self):
+        """Did the request write a list of resources? The URLs of the
+        resources are returned in the meta node instead of the Location
+        header.
+        """
+        return self._bulk
+
     @property
     def links(self):
         """List of link model objects set as a result of processing
@@ -73,7 +110,33 @@ class RequestProcessor(object):
         """
         return self._pager
 
-    def _build_query(self, idents, target_class, join_class=None):
+    @property
+    def streaming(self):
+        """Are the resources streamed to the client? If so they are only
+        available through :meth:`iter_resources`.
+        """
+        return self._pager is not None and self._pager.streamed
+
+    def iter_resources(self):
+        """Iterates over the resources of a streamed request.
+        """
+        return iter(self._pager.items)
+
+    def _request_json(self):
+        """Request body decoded with the configured
+        :attr:`flask_resteasy.configs.APIConfig.json_codec`, see
+        :attr:`flask_resteasy.parsers.RequestParser.request_json`
+        """
+        return self._parser.request_json
+
+    @property
+    def fields(self):
+        """Dictionary of resource names and the fields to return for them
+        (sparse fieldsets), None if all allowed fields are returned.
+        """
+        return self._parser.fields
+
+    def _filter_query(self, idents, target_class, join_class=None):
         q = target_class.query
         if join_class:
             q = q.join(join_class).filter(join_class.id.in_(idents))
@@ -84,15 +147,121 @@ class RequestProcessor(object):
             for f in self._parser.filter:
                 q = q.filter(getattr(target_class, f)
                              == self._parser.filter[f])
+        return q
+
+    def _build_query(self, idents, target_class, join_class=None):
+        q = self._filter_query(idents, target_class, join_class)
         if self._parser.sort:
             for col, order in self._parser.sort.items():
                 # TODO research why we have to access the col this way
                 fld = getattr(getattr(target_class, col), order)()
                 q = q.order_by(fld)
+        # always break ties on the id so pages are stable
+        q = q.order_by(getattr(target_class, self._cfg.id_field))
+        if self._parser.include or self._parser.fields:
+            # includes and fields apply to the link resource if there is one
+            if join_class is None:
+                target_cfg = self._cfg
+            else:
+                target_cfg = self._cfg.api_manager.get_cfg(
+                    self._cfg.resource_name_case(self._parser.link))
+            fields = self._load_only_for(target_cfg)
+            if fields:
+                q = q.options(load_only(*fields))
+            if self._parser.include:
+                q = q.options(*self._include_options(target_cfg))
         return q
 
+    def _load_only_for(self, cfg):
+        """Columns to load for a resource when the client requested sparse
+        fields. The key fields of links are loaded too so rendering the
+        links doesn't load them one row at a time.
+        """
+        if not self._parser.fields or \
+                cfg.resource_name not in self._parser.fields:
+            return None
+        fields = set(self._parser.fields[cfg.resource_name])
+        for key in cfg.relationship_keys.values():
+            fields.add(key[1])
+        return [getattr(cfg.model_class, f) for f in fields]
+
+    def _include_options(self, cfg):
+        """Loader options that side-load every include for a page of
+        resources with one IN query per relationship.
+        """
+        rels = inspect(cfg.model_class).relationships
+        rv = []
+        for inc in self._parser.include:
+            # dynamic relationships are queries and can't be eager loaded
+            if rels[inc].lazy == 'dynamic':
+                continue
+            option = selectinload(getattr(cfg.model_class, inc))
+            fields = self._load_only_for(cfg.api_manager.get_cfg(
+                cfg.resource_name_case(inc)))
+            if fields:
+                option = option.load_only(*fields)
+            rv.append(option)
+        return rv
+
+    def _count_key(self, idents, target_class, join_class=None):
+        """Key for caching the total items of a query, made of the tables
+        queried, the relationship and its direction for a link, and the
+        normalized idents and filter. Links of self-referential
+        relationships or of other relationships between the same models
+        don't share counts.
+        """
+        tables = (target_class.__table__.name,)
+        link = None
+        if join_class is not None:
+            tables += (join_class.__table__.name,)
+            rel = self._cfg.model_case(self._parser.link)
+            link = (self._cfg.resource_name, rel,
+                    self._cfg.relationship_types.get(rel))
+        filters = (tuple(sorted(self._parser.filter.items()))
+                   if self._parser.filter else ())
+        return tables, (link, tuple(sorted(idents)), filters)
+
+    def _commit(self, keep=()):
+        """Commits the session and invalidates cached data for the resource.
+        Use this in custom processes instead of committing the session.
+
+        :param keep: model objects returned in the response, their state
+                     and the state of their loaded links is kept after the
+                     commit so the response is built without reloading
+                     them. All other objects in the session are expired.
+        """
+        session = self._cfg.db.session()
+        expire_on_commit = session.expire_on_commit
+        session.expire_on_commit = False
+        try:
+            session.commit()
+        finally:
+            session.expire_on_commit = expire_on_commit
+        self._expire_except(session, keep)
+        self._cfg.api_manager.invalidate(self._cfg)
+
+    @staticmethod
+    def _expire_except(session, keep):
+        keep_ids = set()
+        for obj in keep:
+            keep_ids.add(id(obj))
+            state = inspect(obj)
+            unloaded = state.unloaded
+            for rel in state.mapper.relationships:
+                value = state.dict.get(rel.key)
+                if rel.key in unloaded or value is None:
+                    continue
+                keep_ids.update(id(o) for o in
+                                (value if rel.uselist else [value]))
+        for obj in list(session.identity_map.values()):
+            if id(obj) not in keep_ids:
+                session.expire(obj)
+
     def _get_all(self, model_class):
-        self._pager = Pager(self._parser, self._build_query([], model_class))
+        self._pager = Pager(self._parser, self._build_query([], model_class),
+                            model_class,
+                            count_key=self._count_key([], model_class),
+                            stream_chunk_size=self._stream_chunk_size)
         return self._pager.items
 
     def _get_all_or_404(self, idents, target_class=None, join_class=None):
@@ -101,15 +270,21 @@ class RequestProcessor(object):
         else:
             target_class = target_class
 
-        q = self._build_query(idents, target_class, join_class)
-        self._pager = Pager(self._parser, q)
-        rv = self._pager.items
-
         # if we are retrieving a primary resource link, for example
         # products/1 or products/1,3 - length of ids should match results
         # if no filter set
-        if self._parser.filter is None and join_class is None \
-                and len(idents) != self._pager.total_items:
+        check_idents = self._parser.filter is None and join_class is None
+
+        q = self._build_query(idents, target_class, join_class)
+        self._pager = Pager(self._parser, q, target_class,
+                            require_total=check_idents,
+                            count_key=self._count_key(idents, target_class,
+                                                      join_class),
+                            stream_chunk_size=(None if check_idents else
+                                               self._stream_chunk_size))
+        rv = self._pager.items
+
+        if check_idents and len(idents) != self._pager.total_items:
             raise UnableToProcess('Resource Not Found',
                                   'One or more resources with IDs %s '
                                   'not found' % idents, 404)
@@ -125,8 +300,7 @@ class RequestProcessor(object):
         return rv
 
     def _copy(self, obj, flds, fld_defaults=None, model_class=None):
-        # if it's a large collection it could have scaling issue
-        # do this on the database server?
+        # copies in Python, use _clone for large collections
         if model_class is None:
             model_class = self._cfg.model_class
         else:
@@ -142,54 +316,447 @@ class RequestProcessor(object):
         rv = [self._copy(obj, flds, fld_defaults, model_class) for obj in objs]
         return rv
 
-    def _json_to_model(self, j_dict, model):
+    def _clone(self, flds=None, fld_defaults=None, model_class=None,
+               idents=None, filter_by=None):
+        """Copies rows without loading them and returns the ids of the
+        copies in the order of the rows copied. The copies are not added
+        to the session.
 
-        def _json_to_model_fields(j_dict_root):
-            """Update model fields from JSON
-            """
-            for fld in self._cfg.allowed_to_model:
-                j_key = self._cfg.json_case(fld)
-                if j_key in j_dict_root:
-                    setattr(model, fld, j_dict_root[j_key])
-
-        def _json_to_model_rels(j_dict_links):
-            """Update model relationships from JSON
-            """
-            for rel in self._cfg.allowed_relationships:
-                j_key = self._cfg.json_case(rel)
-                if j_key in j_dict_links:
-                    link_ids = j_dict_links[j_key]
-                    # link_ids is a list, str(single id) or None
-                    if link_ids is None:
-                        continue
-                    elif isinstance(link_ids, list):
-                        lst = self._get_all_or_404(
-                            link_ids,
-                            self._cfg.api_manager.get_model(
-                                self._cfg.resource_name_case(j_key)))
-                        # TODO will it work if it's lazy=dynamic relationship?
-                        # I think you can only use append and not extend for
-                        # this type of relationship
-                        # write a test for this condition
-                        getattr(model, rel).extend(lst)
-                    else:
-                        setattr(model, rel, self._get_or_404(link_ids,
-                                self._cfg.api_manager.get_model(
-                                    self._cfg.resource_name_case(j_key))))
-
-        # loop through main nodes
-        for j_node in j_dict:
-            # update model fields
-            _json_to_model_fields(j_dict[j_node])
-
-            # update model relationships
-            if self._cfg.use_link_nodes \
-                    and self._cfg.links_node in j_dict[j_node]:
-                # using "links" node
-                _json_to_model_rels(j_dict[j_node][self._cfg.links_node])
+        If the database supports ``RETURNING`` the rows are copied on the
+        server with a single ``INSERT INTO ... SELECT`` statement returning
+        the ids. Otherwise the values are selected and inserted one row at
+        a time, as the ids of an ``INSERT INTO ... SELECT`` can't be told
+        apart from the rows other transactions insert at the same time.
+
+        :param flds: names of the fields copied, all columns but the
+                     primary key if None
+
+        :param fld_defaults: dictionary of field names and the values, or
+                             SQL expressions, the copies get instead of
+                             the values copied
+
+        :param model_class: model class copied, the model class of the
+                            resource if None
+
+        :param idents: ids of the rows copied
+
+        :param filter_by: dictionary of field names and the values of the
+                          rows copied
+        """
+        if not idents and not filter_by:
+            raise UnableToProcess('Bad Request',
+                                  'IDs or a filter are required to clone', 400)
+        if model_class is None:
+            model_class = self._cfg.model_class
+        fld_defaults = fld_defaults if fld_defaults else {}
+        mapper = inspect(model_class)
+        if flds is None:
+            flds = [attr.key for attr in mapper.column_attrs
+                    if attr.columns[0] not in mapper.primary_key]
+        flds = list(flds) + [f for f in fld_defaults if f not in flds]
+
+        columns = []
+        values = []
+        for fld in flds:
+            col = mapper.get_property(fld).columns[0]
+            columns.append(col)
+            if fld not in fld_defaults:
+                values.append(col)
+            elif isinstance(fld_defaults[fld], ClauseElement):
+                values.append(fld_defaults[fld])
             else:
-                # no "links" node, saving on same level with fields
-                _json_to_model_rels(j_dict[j_node])
+                values.append(literal(fld_defaults[fld], col.type))
+
+        id_col = mapper.get_property(self._cfg.id_field).columns[0]
+        rows = select(*values).select_from(mapper.local_table)
+        if idents:
+            rows = rows.where(id_col.in_(idents))
+        for fld, value in (filter_by or {}).items():
+            rows = rows.where(mapper.get_property(fld).columns[0] == value)
+        rows = rows.order_by(id_col)
+
+        session = self._cfg.db.session
+        dialect = session().get_bind(mapper).dialect
+        if getattr(dialect, 'insert_returning',
+                   getattr(dialect, 'full_returning', False)):
+            insert = mapper.local_table.insert().from_select(columns, rows)
+            return sorted(row[0] for row in
+                          session.execute(insert.returning(id_col)))
+
+        connection = session.connection(mapper=mapper)
+        insert = mapper.local_table.insert()
+        keys = [col.key for col in columns]
+        return [connection.execute(insert, dict(zip(keys, row)))
+                .inserted_primary_key[0]
+                for row in connection.execute(rows).fetchall()]
+
+    @staticmethod
+    def _is_field_op(value):
+        return isinstance(value, dict) and len(value) == 1 and \
+            next(iter(value)).startswith('$')
+
+    def _field_value(self, fld, value):
+        """Returns the value written to a field. An operator like
+        ``{"$inc": 5}`` is compiled to an SQL expression, so the field is
+        changed in the database without reading it first.
+
+        ``$inc`` and ``$dec`` add to or subtract from numeric fields and
+        ``$append`` appends to string fields. Operators are only allowed
+        when updating resources.
+        """
+        if not self._is_field_op(value):
+            return value
+        op, operand = next(iter(value.items()))
+        if op not in FIELD_OPS:
+            raise UnableToProcess('Bad Request',
+                                  'Operator [%s] is unknown' % op, 400)
+        if not self._allow_field_ops:
+            raise UnableToProcess('Bad Request',
+                                  'Operator [%s] can only be used when '
+                                  'updating resources' % op, 400)
+
+        col = getattr(self._cfg.model_class, fld)
+        fld_type = self._cfg.field_types.get(fld, '').split('(')[0]
+        if op == '$append':
+            if fld_type not in STRING_TYPES or not isinstance(operand, str):
+                raise UnableToProcess('Bad Request',
+                                      'Operator [%s] needs a string field '
+                                      'and value, field [%s] is %s'
+                                      % (op, fld, fld_type), 400)
+            return func.coalesce(col, '') + operand
+
+        if fld_type not in NUMERIC_TYPES or isinstance(operand, bool) or \
+                not isinstance(operand, (int, float)):
+            raise UnableToProcess('Bad Request',
+                                  'Operator [%s] needs a numeric field and '
+                                  'value, field [%s] is %s'
+                                  % (op, fld, fld_type), 400)
+        return func.coalesce(col, 0) + (operand if op == '$inc'
+                                        else -operand)
+
+    def _json_links(self, j_root):
+        """Returns the node of a JSON resource holding its links
+        """
+        if self._cfg.use_link_nodes and self._cfg.links_node in j_root:
+            return j_root[self._cfg.links_node]
+        return j_root
+
+    def _load_by_ids(self, model_class, idents):
+        """Loads the models with the ids with one IN query per
+        IN_CHUNK_SIZE ids. Returns a dictionary of the string ids and
+        models.
+        """
+        id_col = getattr(model_class, self._cfg.id_field)
+        idents = list(idents)
+        rv = {}
+        for i in range(0, len(idents), IN_CHUNK_SIZE):
+            for obj in model_class.query.filter(
+                    id_col.in_(idents[i:i + IN_CHUNK_SIZE])):
+                rv[str(getattr(obj, self._cfg.id_field))] = obj
+        return rv
+
+    def _from_identity_map(self, model_class, idents):
+        """Returns a dictionary of the string ids and models already loaded
+        in the session, found without querying the database.
+        """
+        mapper = inspect(model_class)
+        id_col = mapper.get_property(self._cfg.id_field).columns[0]
+        if list(mapper.primary_key) != [id_col]:
+            return {}
+        try:
+            python_type = id_col.type.python_type
+        except NotImplementedError:
+            return {}
+
+        identity_map = self._cfg.db.session.identity_map
+        rv = {}
+        for ident in idents:
+            try:
+                key = mapper.identity_key_from_primary_key(
+                    [python_type(ident)])
+            except (TypeError, ValueError):
+                continue
+            obj = identity_map.get(key)
+            if obj is not None and \
+                    self._cfg.id_field not in inspect(obj).expired_attributes:
+                rv[ident] = obj
+        return rv
+
+    def _existing_ids(self, model_class, idents):
+        """Returns a dictionary of the string ids and ids of the resources
+        that exist, read with one query per IN_CHUNK_SIZE ids.
+        """
+        id_col = getattr(model_class, self._cfg.id_field)
+        idents = list(idents)
+        rv = {}
+        for i in range(0, len(idents), IN_CHUNK_SIZE):
+            for row in self._cfg.db.session.query(id_col).filter(
+                    id_col.in_(idents[i:i + IN_CHUNK_SIZE])):
+                rv[str(row[0])] = row[0]
+        return rv
+
+    def _check_exists(self, idents):
+        """Raises a 404 listing the ids that don't exist, checked with one
+        query per IN_CHUNK_SIZE ids
+        """
+        self._raise_missing(idents, self._existing_ids(self._cfg.model_class,
+                                                       idents))
+
+    @staticmethod
+    def _raise_missing(idents, found):
+        missing = [i for i in idents if i not in found]
+        if missing:
+            raise UnableToProcess('Resource Not Found',
+                                  'One or more resources with IDs %s '
+                                  'not found' % missing, 404)
+
+    def _link_models(self, j_links_list):
+        """Returns tuples of the allowed relationships sent in a list of
+        JSON resources, their JSON keys and the related model classes.
+        """
+        rv = []
+        for rel in self._cfg.allowed_relationships:
+            j_key = self._cfg.json_case(rel)
+            if any(j_key in j_links for j_links in j_links_list):
+                rv.append((rel, j_key, self._cfg.api_manager.get_model(
+                    self._cfg.resource_name_case(j_key))))
+        return rv
+
+    def _resolve_links(self, j_links_list, link_models, id_rels=()):
+        """Loads the models linked by a list of JSON resources with one
+        query per related model. Only the ids of the relationships in
+        id_rels are read. Raises a single 404 listing every id not found.
+
+        Returns a dictionary of the relationships and dictionaries of the
+        string ids and models, or ids for the relationships in id_rels.
+        """
+        ids_for_models = {}
+        for rel, j_key, model_class in link_models:
+            ids = ids_for_models.setdefault((model_class, rel in id_rels),
+                                            set())
+            for j_links in j_links_list:
+                link_ids = j_links.get(j_key)
+                if link_ids is None:
+                    continue
+                if isinstance(link_ids, list):
+                    ids.update(str(i) for i in link_ids)
+                else:
+                    ids.add(str(link_ids))
+
+        found = {}
+        missing = []
+        for (model_class, ids_only), ids in ids_for_models.items():
+            if ids_only:
+                objs = self._existing_ids(model_class, ids)
+            else:
+                objs = self._from_identity_map(model_class, ids)
+                objs.update(self._load_by_ids(model_class,
+                                              ids.difference(objs)))
+            found[(model_class, ids_only)] = objs
+            missing.extend('%s/%s' % (model_class.__table__.name, i)
+                           for i in sorted(ids) if i not in objs)
+        if missing:
+            raise UnableToProcess('Resource Not Found',
+                                  'Linked resources %s not found'
+                                  % ', '.join(missing), 404)
+        return dict((rel, found[(model_class, rel in id_rels)])
+                    for rel, _, model_class in link_models)
+
+    def _json_to_models(self, j_roots, models):
+        """Updates models from a list of JSON resources. The linked resources
+        of all of them are loaded with one query per related model.
+
+        If _replace_to_many is set the to-many links written with set based
+        statements are replaced, see :meth:`_replace_links`.
+        """
+        j_links_list = [self._json_links(j_root) for j_root in j_roots]
+        link_models = self._link_models(j_links_list)
+        link_keys = {}
+        if self._replace_to_many:
+            for rel, _, _ in link_models:
+                key = self._set_based_key(rel)
+                if key is not None:
+                    link_keys[rel] = key
+        related = self._resolve_links(j_links_list, link_models, link_keys)
+        fields = [(fld, self._cfg.json_case(fld))
+                  for fld in self._cfg.allowed_to_model]
+        rels = [(rel, j_key, related[rel])
+                for rel, j_key, _ in link_models if rel not in link_keys]
+        for j_root, j_links, model in zip(j_roots, j_links_list, models):
+            for fld, j_key in fields:
+                if j_key in j_root:
+                    setattr(model, fld, self._field_value(fld, j_root[j_key]))
+            for rel, j_key, objs in rels:
+                link_ids = j_links.get(j_key)
+                if link_ids is None:
+                    continue
+                if isinstance(link_ids, list):
+                    setattr(model, rel, [objs[str(i)] for i in link_ids])
+                else:
+                    setattr(model, rel, objs[str(link_ids)])
+
+        for rel, j_key, _ in link_models:
+            if rel not in link_keys:
+                continue
+            key = link_keys[rel]
+            new_links = {}
+            for j_links, model in zip(j_links_list, models):
+                link_ids = j_links.get(j_key)
+                if link_ids is None:
+                    continue
+                if not isinstance(link_ids, list):
+                    link_ids = [link_ids]
+                new_links[getattr(model, key[1])] = set(
+                    related[rel][str(i)] for i in link_ids)
+                # the links changed in the database
+                self._cfg.db.session.expire(model, [rel])
+            self._replace_links(key, new_links)
+
+    def _set_based_key(self, rel):
+        """Returns the key of a to-many relationship from
+        :attr:`flask_resteasy.configs.APIConfig.relationship_keys` if its
+        links can be written with set based statements on the link table,
+        None if they have to be written through the session.
+
+        Relationships joined by conditions besides the foreign key have no
+        key, see :func:`flask_resteasy.configs.is_fk_join`.
+        """
+        key = self._cfg.relationship_keys.get(rel)
+        if key is None or key[0] == 'MANYTOONE':
+            return None
+        prop = inspect(self._cfg.model_class).relationships[rel]
+        # view only relationships are never written, orphans are deleted
+        # and versions counted by the session
+        if prop.viewonly or prop.cascade.delete_orphan or \
+                prop.mapper.version_id_col is not None:
+            return None
+        return key
+
+    def _link_columns(self, key):
+        """Returns the link table of a to-many relationship key and its
+        columns for the parent and child ids
+        """
+        table = self._cfg.model_class.metadata.tables[key[2]]
+        return table, table.c[key[3]], table.c[key[4]]
+
+    def _read_links(self, key, parents, children=None):
+        """Reads the ids of the linked resources of parents without loading
+        them. Returns a dictionary of the parents and sets of child ids.
+
+        :param children: if set, only these child ids are read
+        """
+        table, parent_col, child_col = self._link_columns(key)
+        rv = dict((parent, set()) for parent in parents)
+        parents = list(rv)
+        if children is None:
+            conds = [parent_col.in_(parents[i:i + IN_CHUNK_SIZE])
+                     for i in range(0, len(parents), IN_CHUNK_SIZE)]
+        else:
+            children = list(children)
+            conds = [and_(parent_col.in_(parents),
+                          child_col.in_(children[i:i + IN_CHUNK_SIZE]))
+                     for i in range(0, len(children), IN_CHUNK_SIZE)]
+        for cond in conds:
+            for parent, child in self._cfg.db.session.execute(
+                    select(parent_col, child_col).where(cond)):
+                rv[parent].add(child)
+        return rv
+
+    def _add_links(self, key, links, skip_existing=True):
+        """Links child ids to parents with an INSERT into the association
+        table or an UPDATE of the foreign key of the children, without
+        loading either of them.
+
+        :param links: dictionary of parents and sets of child ids
+
+        :param skip_existing: read which of the links exist before
+                              inserting into the association table
+        """
+        table, parent_col, child_col = self._link_columns(key)
+        session = self._cfg.db.session
+        if key[0] == 'ONETOMANY':
+            for parent, children in links.items():
+                children = list(children)
+                for i in range(0, len(children), IN_CHUNK_SIZE):
+                    session.execute(table.update().where(
+                        child_col.in_(children[i:i + IN_CHUNK_SIZE])).values(
+                        {parent_col.name: parent}))
+            return
+
+        if skip_existing:
+            existing = self._read_links(key, links,
+                                        set().union(*links.values()))
+        else:
+            existing = dict((parent, ()) for parent in links)
+        rows = [{parent_col.name: parent, child_col.name: child}
+                for parent, children in links.items()
+                for child in children if child not in existing[parent]]
+        if rows:
+            session.execute(table.insert(), rows)
+
+    def _remove_links(self, key, links):
+        """Unlinks child ids from parents with a DELETE from the association
+        table or by setting the foreign key of the children to NULL.
+
+        :param links: dictionary of parents and sets of child ids
+        """
+        table, parent_col, child_col = self._link_columns(key)
+        session = self._cfg.db.session
+        for parent, children in links.items():
+            children = list(children)
+            for i in range(0, len(children), IN_CHUNK_SIZE):
+                cond = and_(parent_col == parent,
+                            child_col.in_(children[i:i + IN_CHUNK_SIZE]))
+                if key[0] == 'ONETOMANY':
+                    session.execute(table.update().where(cond).values(
+                        {parent_col.name: None}))
+                else:
+                    session.execute(table.delete().where(cond))
+
+    def _replace_links(self, key, links):
+        """Replaces the links of parents by the difference with the links
+        in the database. Only the ids of the existing links are read, the
+        linked resources are neither loaded nor hydrated into collections,
+        so it works with dynamic relationships too.
+
+        :param links: dictionary of parents and sets of child ids
+        """
+        existing = self._read_links(key, links)
+        self._remove_links(key, dict(
+            (parent, existing[parent] - children)
+            for parent, children in links.items()))
+        self._add_links(key, dict(
+            (parent, children - existing[parent])
+            for parent, children in links.items()), skip_existing=False)
+
+    def _bulk_roots(self, j_dict):
+        """Returns the list of JSON resources sent under the plural
+        resource name or None if a single resource was sent.
+        """
+        if not isinstance(j_dict, dict):
+            raise UnableToProcess('Bad Request',
+                                  'Expected a JSON object', 400)
+        j_roots = j_dict.get(self._cfg.resource_name_plural)
+        if not isinstance(j_roots, list):
+            return None
+        if not j_roots:
+            raise UnableToProcess('Bad Request',
+                                  'Expected at least one resource for [%s]'
+                                  % self._cfg.resource_name_plural, 400)
+        if not all(isinstance(j_root, dict) for j_root in j_roots):
+            raise UnableToProcess('Bad Request',
+                                  'Expected a list of JSON objects for [%s]'
+                                  % self._cfg.resource_name_plural, 400)
+        return j_roots
+
+    def _json_to_model(self, j_dict, model):
+        """Updates a model from the resource nodes of a JSON document. The
+        links of all nodes are resolved together, see
+        :meth:`_json_to_models`.
+        """
+        j_roots = [j_root for j_root in j_dict.values()
+                   if isinstance(j_root, dict)]
+        self._json_to_models(j_roots, [model] * len(j_roots))
 
 
 class GetRequestProcessor(RequestProcessor):
@@ -208,12 +775,6 @@ class GetRequestProcessor(RequestProcessor):
             target_class = self._cfg.model_class
             join_class = None
 
-        if len(self._parser.idents) > 0:
-            resources = self._get_all_or_404(self._parser.idents,
-                                             target_class, join_class)
-        else:
-            resources = self._get_all(target_class)
-
         # Should we render response as a list? - tricky logic here
         # if no route parm ids or,
         # if route parm ids provided is more than 1 & it's not a link resource
@@ -225,27 +786,32 @@ class GetRequestProcessor(RequestProcessor):
             (self._parser.link and self._parser.link == pluralize(
                 self._parser.link)))
 
-        self._process_includes_for(resources)
-        self._resources.extend(resources)
+        # lists are streamed if the resource is configured for it, not
+        # with includes, which are held until the end of the response
+        if self._render_as_list and not self._parser.include:
+            self._stream_chunk_size = self._cfg.stream_chunk_size
+
+        if len(self._parser.idents) > 0:
+            resources = self._get_all_or_404(self._parser.idents,
+                                             target_class, join_class)
+        else:
+            resources = self._get_all(target_class)
+
+        # requests with includes are not streamed
+        if not self.streaming:
+            self._process_includes_for(resources)
+            self._resources.extend(resources)
 
     def _process_includes_for(self, resources):
-        # TODO - what if includes are large collections?
+        # includes were loaded with the resources by _build_query, so
+        # reading them here doesn't query the database
         if self._parser.include:
             for include in self._parser.include:
+                # include nodes are always plural
+                inc_key = pluralize(include)
+                links = self._links.setdefault(inc_key, [])
                 for resource in resources:
-                    self._set_include(resource, include)
-
-    def _set_include(self, resc, inc):
-        # include nodes are always plural
-        inc_key = pluralize(inc)
-        if inc_key not in self._links:
-            self._links[inc_key] = []
-        # TODO should we check for duplicates here and
-        # remove from builder process?
-        # TODO if inc is a list will it get loaded by calling
-        # getattr, do we need to limit here what loads or handle
-        # this in the builder process?
-        self._links[inc_key].append(getattr(resc, inc))
+                    links.append(getattr(resource, include))
 
 
 class DeleteRequestProcessor(RequestProcessor):
@@ -255,10 +821,108 @@ class DeleteRequestProcessor(RequestProcessor):
         super(DeleteRequestProcessor, self).__init__(cfg, request_parser)
 
     def _process(self):
-        for i in self._parser.idents:
-            obj = self._get_or_404(i, self._cfg.model_class)
+        idents = self._parser.idents
+        if not idents and not self._parser.filter:
+            raise UnableToProcess('Bad Request',
+                                  'IDs or a filter are required to delete '
+                                  '[%s]' % self._cfg.resource_name_plural,
+                                  400)
+
+        if self._cfg.orm_delete:
+            self._delete_orm(idents)
+        else:
+            self._delete_set(idents)
+        self._commit()
+
+    def _delete_set(self, idents):
+        """Deletes with DELETE statements, one per IN_CHUNK_SIZE ids,
+        without loading the resources.
+        """
+        model_class = self._cfg.model_class
+        if not idents:
+            self._filter_query([], model_class).delete(
+                synchronize_session=False)
+            return
+
+        self._check_exists(idents)
+        id_col = getattr(model_class, self._cfg.id_field)
+        for i in range(0, len(idents), IN_CHUNK_SIZE):
+            self._filter_query([], model_class).filter(
+                id_col.in_(idents[i:i + IN_CHUNK_SIZE])).delete(
+                synchronize_session=False)
+
+    def _delete_orm(self, idents):
+        """Deletes through the session so relationship cascades are applied,
+        the resources are loaded with one query per IN_CHUNK_SIZE ids.
+        """
+        model_class = self._cfg.model_class
+        if not idents:
+            objs = self._filter_query([], model_class).all()
+        else:
+            found = self._load_by_ids(model_class, idents)
+            self._raise_missing(idents, found)
+            objs = found.values()
+            if self._parser.filter:
+                matches = set(self._filter_query(idents, model_class))
+                objs = [o for o in objs if o in matches]
+        for obj in objs:
             self._cfg.db.session.delete(obj)
-        self._cfg.db.session.commit()
+
+
+class ETagRequestProcessor(GetRequestProcessor):
+    """Processor computing the ETag for an HTTP GET request without loading
+    the resources. The ETag is built from the request URL and an aggregate
+    query over the
+    :attr:`flask_resteasy.configs.APIConfig.version_column` of the
+    resources that match the request, so a conditional GET can be answered
+    with a single aggregate query.
+
+    The ETag is only computed for conditional requests. It is None if the
+    resource has no version column, renders to-many links, which change
+    without writing the resource, or the request has links or includes,
+    which would need the versions of other resources.
+    """
+    def __init__(self, cfg, request_parser):
+        self._etag = None
+        super(ETagRequestProcessor, self).__init__(cfg, request_parser)
+
+    @property
+    def etag(self):
+        """ETag for the request or None if it can't be computed cheaply.
+        """
+        return self._etag
+
+    def _process(self):
+        version = self._cfg.version_column
+        if version is None or self._parser.link or self._parser.include or \
+                not request.if_none_match:
+            return
+        types = self._cfg.relationship_types
+        if any(types[r] != 'MANYTOONE'
+               for r in self._cfg.allowed_relationships):
+            return
+
+        model_class = self._cfg.model_class
+        idents = self._parser.idents
+        id_col = getattr(model_class, self._cfg.id_field)
+        version_col = getattr(model_class, version)
+        # timestamps only increase on writes, counters are summed so an
+        # update of any row changes the aggregate
+        if self._cfg.field_types.get(version) in ('DATETIME', 'DATE',
+                                                  'TIMESTAMP'):
+            version_agg = func.max(version_col)
+        else:
+            version_agg = func.sum(version_col)
+        row = self._filter_query(idents, model_class).with_entities(
+            func.count(id_col), func.sum(id_col), version_agg).one()
+
+        # missing resources are reported by the GetRequestProcessor
+        if idents and self._parser.filter is None and row[0] != len(idents):
+            return
+
+        validator = (request.full_path, self._cfg.json_codec.name) + tuple(row)
+        self._etag = hashlib.sha1(
+            repr(validator).encode('utf-8')).hexdigest()
 
 
 class PostRequestProcessor(RequestProcessor):
@@ -268,44 +932,460 @@ class PostRequestProcessor(RequestProcessor):
         super(PostRequestProcessor, self).__init__(cfg, request_parser)
 
     def _process(self):
-        # TODO - handle many inserts per post
-        json = request.json
+        json = self._request_json()
+        j_roots = self._bulk_roots(json)
+        if j_roots is not None:
+            self._process_bulk(j_roots)
+            return
+
         with self._cfg.db.session.no_autoflush:
             model = self._cfg.model_class()
             self._json_to_model(json, model)
         self._cfg.db.session.add(model)
-        self._cfg.db.session.commit()
+        self._commit(keep=[model])
         self._resources.append(model)
 
+    def _process_bulk(self, j_roots):
+        """Creates all resources of a list in one transaction
+        """
+        self._bulk = True
+        self._render_as_list = True
+        with self._cfg.db.session.no_autoflush:
+            models = [self._cfg.model_class() for _ in j_roots]
+            self._json_to_models(j_roots, models)
+        self._cfg.db.session.add_all(models)
+        self._commit(keep=models)
+        self._resources.extend(models)
+
 
 class PutRequestProcessor(RequestProcessor):
     """Processor for HTTP PUT requests.
+
+    To-many links sent replace the links of the resources. They are
+    compared with the ids linked in the database and only the difference
+    is written, see :meth:`RequestProcessor._replace_links`.
     """
+    _allow_field_ops = True
+    _replace_to_many = True
+
     def __init__(self, cfg, request_parser):
         super(PutRequestProcessor, self).__init__(cfg, request_parser)
 
     def _process(self):
-        # TODO - handle many updates per put
-        json = request.json
+        json = self._request_json()
+        j_roots = self._bulk_roots(json)
+        if j_roots is not None:
+            self._process_bulk(j_roots)
+            return
+
+        if len(self._parser.idents) != 1:
+            raise UnableToProcess('Bad Request',
+                                  'Expected a list of resources for [%s]'
+                                  % self._cfg.resource_name_plural, 400)
         with self._cfg.db.session.no_autoflush:
             model = self._get_or_404(self._parser.idents[0],
                                      self._cfg.model_class)
             self._json_to_model(json, model)
         self._cfg.db.session.add(model)
-        self._cfg.db.session.commit()
+        self._commit(keep=[model])
         self.resources.append(model)
         # TODO - Do we need to only return objects on put if changed by server?
         # We should only be returning the object(s) added in the response
         # if the server modified what was saved, like for example an updated
         # date set by the server
 
+    def _process_bulk(self, j_roots):
+        """Updates all resources of a list in one transaction. The resources
+        are loaded with one IN query, or not at all when bulk update
+        mappings are used.
+        """
+        self._bulk = True
+        self._render_as_list = True
+        idents = self._bulk_idents(j_roots)
+        model_class = self._cfg.model_class
+
+        if self._cfg.bulk_update_mappings and \
+                not self._has_links(j_roots) and not self._has_ops(j_roots):
+            found = self._existing_ids(model_class, idents)
+            self._raise_missing(idents, found)
+            fields = [(fld, self._cfg.json_case(fld))
+                      for fld in self._cfg.allowed_to_model]
+            mappings = []
+            for ident, j_root in zip(idents, j_roots):
+                mapping = dict((fld, j_root[j_key]) for fld, j_key in fields
+                               if j_key in j_root)
+                mapping[self._cfg.id_field] = found[ident]
+                mappings.append(mapping)
+            self._cfg.db.session.bulk_update_mappings(model_class, mappings)
+            self._commit()
+            if self._parser.return_minimal:
+                return
+            # the mappings were not loaded, load them in chunks
+            models = self._load_by_ids(model_class, idents)
+        else:
+            models = self._load_by_ids(model_class, idents)
+            self._raise_missing(idents, models)
+            with self._cfg.db.session.no_autoflush:
+                self._json_to_models(j_roots, [models[i] for i in idents])
+            self._commit(keep=models.values())
+        self._resources.extend(models[i] for i in idents)
+
+    def _bulk_idents(self, j_roots):
+        """Returns the string ids of a list of JSON resources, taken from
+        the id field of a resource or else the route id at its position.
+        Ids are validated like route ids. Route ids and resource ids have
+        to match.
+        """
+        id_key = self._cfg.json_case(self._cfg.id_field)
+        route_idents = self._parser.idents
+        if route_idents and len(route_idents) != len(j_roots):
+            raise UnableToProcess('Bad Request',
+                                  'Expected %s resources for IDs %s'
+                                  % (len(route_idents), route_idents), 400)
+        rv = []
+        for pos, j_root in enumerate(j_roots):
+            ident = j_root.get(id_key)
+            if ident is None:
+                if not route_idents:
+                    raise UnableToProcess('Bad Request',
+                                          'Resource [%s] in list has no [%s]'
+                                          % (pos, id_key), 400)
+                ident = route_idents[pos]
+            try:
+                if isinstance(ident, (bool, float)):
+                    raise TypeError
+                rv.append(str(int(ident)))
+            except (TypeError, ValueError):
+                raise UnableToProcess('Bad Request',
+                                      'ID [%s] of resource [%s] in list is '
+                                      'invalid' % (ident, pos), 400)
+        route_idents = [str(int(i)) for i in route_idents]
+        if len(set(rv)) != len(rv) or \
+                (route_idents and set(rv) != set(route_idents)):
+            raise UnableToProcess('Bad Request',
+                                  'IDs of resources %s do not match the '
+                                  'request' % rv, 400)
+        return rv
+
+    def _has_ops(self, j_roots):
+        for j_root in j_roots:
+            for fld in self._cfg.allowed_to_model:
+                if self._is_field_op(j_root.get(self._cfg.json_case(fld))):
+                    return True
+        return False
+
+    def _has_links(self, j_roots):
+        j_keys = [self._cfg.json_case(rel)
+                  for rel in self._cfg.allowed_relationships]
+        for j_root in j_roots:
+            j_links = self._json_links(j_root)
+            if any(j_key in j_links for j_key in j_keys):
+                return True
+        return False
+
+
+class PatchRequestProcessor(PutRequestProcessor):
+    """Processor for HTTP PATCH requests.
+
+    The fields sent are written with a single UPDATE statement without
+    loading the resources, the row count of the statement tells if they
+    exist. Payloads changing links are applied through the session like a
+    PUT request. No resources are returned.
+    """
+    def __init__(self, cfg, request_parser):
+        super(PatchRequestProcessor, self).__init__(cfg, request_parser)
+
+    def _process(self):
+        json = self._request_json()
+        j_root = (json.get(self._cfg.resource_name)
+                  if isinstance(json, dict) else None)
+        if not isinstance(j_root, dict):
+            raise UnableToProcess('Bad Request',
+                                  'Expected a JSON object for [%s]'
+                                  % self._cfg.resource_name, 400)
+        if not self._parser.idents:
+            raise UnableToProcess('Bad Request', 'IDs are required', 400)
+
+        if self._has_links([j_root]):
+            self._patch_orm(j_root)
+        else:
+            self._patch_set(j_root)
+        self._commit()
+
+    def _patch_orm(self, j_root):
+        idents = self._parser.idents
+        models = self._load_by_ids(self._cfg.model_class, idents)
+        self._raise_missing(idents, models)
+        with self._cfg.db.session.no_autoflush:
+            self._json_to_models([j_root] * len(idents),
+                                 [models[i] for i in idents])
+
+    def _patch_set(self, j_root):
+        idents = self._parser.idents
+        model_class = self._cfg.model_class
+        values = {}
+        for fld in self._cfg.allowed_to_model:
+            j_key = self._cfg.json_case(fld)
+            if j_key in j_root:
+                values[getattr(model_class, fld)] = self._field_value(
+                    fld, j_root[j_key])
+        if not values:
+            self._check_exists(idents)
+            return
+
+        rowcount = self._filter_query(idents, model_class).update(
+            values, synchronize_session=False)
+        # 1 and 01 are the same row
+        if rowcount != len(set(str(int(i)) for i in idents)):
+            # don't leave the rows that exist updated in the session
+            self._cfg.db.session.rollback()
+            raise UnableToProcess('Resource Not Found',
+                                  'One or more resources with IDs %s '
+                                  'not found' % idents, 404)
+
+
+class LinkRequestProcessor(RequestProcessor):
+    """Processor for HTTP POST, PUT and DELETE requests on the links of a
+    resource, i.e. `/orders/1/links/order_items`.
+
+    POST adds links to a to-many relationship, PUT replaces the links and
+    DELETE removes the links with the ids in the route, i.e.
+    `/orders/1/links/order_items/2,3`, or unsets a to-one link. The body
+    is a JSON object with the link name and a list of ids, or an id for
+    to-one links::
+
+        {"order_items": [2, 3]}
+
+    To-many links are written with set based statements on the association
+    table or the foreign key of the linked resources, without loading the
+    resource or its collection. Relationships the session has to write,
+    like the ones deleting orphans, are updated through the model.
+    """
+    def __init__(self, cfg, request_parser):
+        super(LinkRequestProcessor, self).__init__(cfg, request_parser)
+
+    def _process(self):
+        if len(self._parser.idents) != 1:
+            raise UnableToProcess('Bad Request',
+                                  'Links are written for one resource', 400)
+        rel = self._cfg.model_case(self._parser.link)
+        prop = inspect(self._cfg.model_class).relationships[rel]
+        if request.method == 'POST' and not prop.uselist:
+            raise UnableToProcess('Bad Request',
+                                  'Links can only be added to a to-many '
+                                  'link, [%s] is to-one' % self._parser.link,
+                                  400)
+        if request.method == 'DELETE' and prop.uselist and \
+                not self._parser.link_idents:
+            raise UnableToProcess('Bad Request',
+                                  'Link IDs are required', 400)
+
+        key = self._set_based_key(rel)
+        if key is None:
+            self._process_orm(rel, prop)
+        else:
+            self._process_set(rel, key, prop.mapper.class_)
+        self._commit()
+
+    def _link_ids(self, uselist):
+        """Returns the list of link ids sent in the request body
+        """
+        json = self._request_json()
+        if not isinstance(json, dict) or self._parser.link not in json:
+            raise UnableToProcess('Bad Request',
+                                  'Expected a JSON object with [%s]'
+                                  % self._parser.link, 400)
+        link_ids = json[self._parser.link]
+        if link_ids is None:
+            return []
+        if not isinstance(link_ids, list):
+            return [link_ids]
+        if not uselist:
+            raise UnableToProcess('Bad Request',
+                                  'Expected one ID for [%s]'
+                                  % self._parser.link, 400)
+        return link_ids
+
+    def _resolve(self, rel, model_class, link_ids, ids_only):
+        return self._resolve_links(
+            [{self._parser.link: link_ids}],
+            [(rel, self._parser.link, model_class)],
+            (rel,) if ids_only else ())[rel]
+
+    def _process_set(self, rel, key, model_class):
+        ident = self._parser.idents[0]
+        row = self._cfg.db.session.query(
+            getattr(self._cfg.model_class, key[1])).filter(
+            getattr(self._cfg.model_class, self._cfg.id_field) ==
+            ident).first()
+        if row is None:
+            raise UnableToProcess('Resource Not Found',
+                                  'Resource with ID [%s] not found' % ident,
+                                  404)
+        parent = row[0]
+
+        if request.method == 'DELETE':
+            self._remove_links(key, {parent: set(self._parser.link_idents)})
+            return
+
+        children = set(self._resolve(rel, model_class, self._link_ids(True),
+                                     True).values())
+        if request.method == 'POST':
+            self._add_links(key, {parent: children})
+        else:
+            self._replace_links(key, {parent: children})
+
+    def _process_orm(self, rel, prop):
+        model_class = prop.mapper.class_
+        model = self._get_or_404(self._parser.idents[0], self._cfg.model_class)
+        if request.method == 'DELETE':
+            if not prop.uselist:
+                setattr(model, rel, None)
+                return
+            objs = self._load_by_ids(model_class, self._parser.link_idents)
+            collection = getattr(model, rel)
+            for obj in set(collection).intersection(objs.values()):
+                collection.remove(obj)
+            return
+
+        link_ids = self._link_ids(prop.uselist)
+        objs = self._resolve(rel, model_class, link_ids, False)
+        with self._cfg.db.session.no_autoflush:
+            if not prop.uselist:
+                setattr(model, rel, objs[str(link_ids[0])] if link_ids
+                        else None)
+            elif request.method == 'POST':
+                collection = getattr(model, rel)
+                for obj in set(objs.values()).difference(collection):
+                    collection.append(obj)
+            else:
+                setattr(model, rel, list(objs.values()))
+
+
+class ClonePostProcess(RequestProcessor):
+    """Custom post process copying resources on the database server with
+    :meth:`RequestProcessor._clone`. Register it for a resource::
+
+        api_manager.register_api(OrderItem, methods=['GET', 'POST'],
+                                 post_process=('action', ClonePostProcess))
+
+    and send the ids or a filter of the resources copied, and the fields
+    and to-one links the copies get instead of the ones copied::
+
+        {"action": "ClonePostProcess",
+         "filter": {"order": 1},
+         "order_item": {"links": {"order": 2}}}
+
+    The filter matches fields and to-one links. All columns but the
+    primary key are copied and the copies are returned.
+    """
+    def __init__(self, cfg, request_parser):
+        super(ClonePostProcess, self).__init__(cfg, request_parser)
+
+    def _process(self):
+        json = self._request_json()
+        if not isinstance(json, dict):
+            raise UnableToProcess('Bad Request',
+                                  'Expected a JSON object', 400)
+        idents = json.get('ids')
+        if idents is not None and not isinstance(idents, list):
+            raise UnableToProcess('Bad Request',
+                                  'Expected a list of IDs for [ids]', 400)
+        j_filter = json.get('filter') or {}
+        j_root = json.get(self._cfg.resource_name) or {}
+        if not isinstance(j_filter, dict) or not isinstance(j_root, dict):
+            raise UnableToProcess('Bad Request',
+                                  'Expected JSON objects for [filter] and '
+                                  '[%s]' % self._cfg.resource_name, 400)
+
+        filter_by = self._clone_values(j_filter,
+                                       self._cfg.allowed_filter, True)
+        fld_defaults = self._clone_values(j_root, self._cfg.allowed_to_model)
+        ids = self._clone(fld_defaults=fld_defaults, idents=idents,
+                          filter_by=filter_by)
+        self._commit()
+
+        self._bulk = True
+        self._render_as_list = True
+        models = self._load_by_ids(self._cfg.model_class, ids)
+        self._resources.extend(models[str(i)] for i in ids)
+
+    def _clone_values(self, j_root, fields, strict=False):
+        """Returns a dictionary of the field names and values of the fields
+        and to-one links of a JSON object. The linked resources have to
+        exist.
+
+        :param strict: raise a 400 for keys that are neither
+        """
+        rv = {}
+        known = {self._cfg.links_node}
+        for fld in fields:
+            j_key = self._cfg.json_case(fld)
+            known.add(j_key)
+            if j_key in j_root:
+                rv[fld] = j_root[j_key]
+
+        j_links = self._json_links(j_root)
+        keys = self._cfg.relationship_keys
+        link_models = []
+        for rel, j_key, model_class in self._link_models([j_links]):
+            key = keys.get(rel)
+            if key is not None and key[0] == 'MANYTOONE':
+                known.add(j_key)
+                if isinstance(j_links[j_key], (list, dict, bool)):
+                    raise UnableToProcess('Bad Request',
+                                          'Expected an ID for [%s]' % j_key,
+                                          400)
+                rv[key[1]] = j_links[j_key]
+                link_models.append((rel, j_key, model_class))
+        self._resolve_links([j_links], link_models,
+                            [rel for rel, _, _ in link_models])
+
+        unknown = sorted(set(j_root).union(j_links) - known)
+        if strict and unknown:
+            raise UnableToProcess('Bad Request',
+                                  'Unable to clone by %s' % unknown, 400)
+        return rv
+
 
 class Pager(object):
     """
-    Paginates a query
+    Paginates a query, either by page number or by keyset when the client
+    sends a `page[after]` or `page[before]` cursor.
+
+    Keyset pagination orders by the active sort fields plus the id field and
+    filters on the cursor values instead of using an offset, so the cost of
+    a page does not grow with its position. It also does not count the
+    total number of items unless `require_total` is set. NULL sorts after
+    every value of a nullable sort field.
+
+    Page number pagination counts the total number of items as set by
+    :attr:`flask_resteasy.configs.APIConfig.count_mode`, or not at all if
+    the client sends `count=none`.
+
+    :param rp: :class:`flask_resteasy.parsers.RequestParser` instance
+
+    :param query: query to paginate
+
+    :param model_class: model class queried, required for keyset pagination
+
+    :param require_total: always count the total number of items
+
+    :param count_key: tuple of the tables queried and the normalized filter
+                      used to cache the total number of items, see
+                      :attr:`flask_resteasy.configs.APIConfig.count_mode`
+
+    :param stream_chunk_size: if set, :attr:`items` is not loaded up front
+                              but is an iterable reading this many rows at
+                              a time. Keyset pages are never streamed, nor
+                              are pages read from MySQL or SQL Server, see
+                              :meth:`_supports_streaming`.
     """
-    def __init__(self, rp, query):
-        self._set_by_client = rp.page is not None
+    def __init__(self, rp, query, model_class=None, require_total=False,
+                 count_key=None, stream_chunk_size=None):
+        self._cursor = rp.after if rp.after is not None else rp.before
+        self._backwards = rp.before is not None
+        self._set_by_client = rp.page is not None or self._cursor is not None
         self._page = rp.page if rp.page else 1
 
         if rp.per_page is None or rp.per_page > rp._cfg.max_per_page:
@@ -314,13 +1394,36 @@ class Pager(object):
             self._per_page = rp.per_page
 
         self._query = query
+        self._model_class = model_class
+        self._require_total = require_total
+        self._cfg = rp._cfg
+        self._window_count = rp._cfg.window_count
+        self._count = rp.count
+        self._count_key = count_key
+        self._count_mode = rp._cfg.count_mode
+        self._estimated = False
+        self._stream_chunk_size = (None if self._cursor is not None
+                                   else stream_chunk_size)
+        if self._stream_chunk_size is not None and \
+                not self._supports_streaming():
+            self._stream_chunk_size = None
+        self._sort = rp.sort
+        self._id_field = rp._cfg.id_field
         self._no_pages = 0
         self._total_items = 0
         self._items = None
+        self._next = None
+        self._prev = None
         self._page_no_param = rp.page_qp
         self._per_page_param = rp.per_page_qp
         self._no_pages_param = rp.no_pages_param
-        self._paginate()
+        self._total_estimate_param = rp.total_estimate_param
+        self._next_param = rp.next_param
+        self._prev_param = rp.prev_param
+        if self.is_keyset:
+            self._paginate_keyset()
+        else:
+            self._paginate()
 
     @property
     def page_no_param(self):
@@ -342,6 +1445,58 @@ class Pager(object):
         """
         return self._no_pages_param
 
+    @property
+    def total_estimate_param(self):
+        """Estimated total items key used when building pagination
+        meta response.
+        """
+        return self._total_estimate_param
+
+    @property
+    def next_param(self):
+        """Next cursor key used when building keyset pagination
+        meta response.
+        """
+        return self._next_param
+
+    @property
+    def prev_param(self):
+        """Previous cursor key used when building keyset pagination
+        meta response.
+        """
+        return self._prev_param
+
+    @property
+    def streamed(self):
+        """Is :attr:`items` an iterable streaming the page from the
+        database?
+        """
+        return self._stream_chunk_size is not None
+
+    @property
+    def stream_chunk_size(self):
+        """Number of rows read at a time when streamed
+        """
+        return self._stream_chunk_size
+
+    @property
+    def is_keyset(self):
+        """Is the query paginated by keyset (cursor) instead of page number?
+        """
+        return self._cursor is not None
+
+    @property
+    def next(self):
+        """Cursor for the next page, None if there is no next page
+        """
+        return self._next
+
+    @property
+    def prev(self):
+        """Cursor for the previous page, None if there is no previous page
+        """
+        return self._prev
+
     @property
     def page(self):
         """Current page number
@@ -368,10 +1523,16 @@ class Pager(object):
 
     @property
     def total_items(self):
-        """Total number of items
+        """Total number of items, None if the items were not counted
         """
         return self._total_items
 
+    @property
+    def is_estimate(self):
+        """Is :attr:`total_items` an estimate?
+        """
+        return self._estimated
+
     @property
     def client_requested(self):
         """Did the client request pagination via query parameters?
@@ -382,16 +1543,251 @@ class Pager(object):
     def should_return_meta(self):
         """Should we build the response with a meta pagination section?
         """
-        return self.client_requested or self.no_pages > 1
+        return self.client_requested or (self.no_pages is not None and
+                                         self.no_pages > 1)
 
     def _paginate(self):
-        pagination = self._query.paginate(self._page, self._per_page,
-                                          error_out=False)
-        self._no_pages = pagination.pages
-        self._items = pagination.items
-        self._total_items = pagination.total
-        if not self._items and self._page > 1:
+        cached = (self._count_key is not None and
+                  self._count_mode != 'exact' and not self._require_total)
+        if self._count == 'none' and not self._require_total:
+            self._fetch_page()
+            self._total_items = None
+            self._no_pages = None
+        elif not cached:
+            self._fetch_page_and_count()
+        else:
+            # count=exact refreshes the cached count
+            cache = self._cfg.api_manager.count_cache
+            total = (cache.get(*self._count_key)
+                     if self._count != 'exact' else None)
+            if total is None:
+                self._fetch_page_and_count()
+                cache.set(self._count_key[0], self._count_key[1],
+                          self._total_items, self._cfg.count_ttl,
+                          estimate=self._count_mode == 'estimate')
+            else:
+                self._fetch_page()
+                self._set_total(total)
+            self._estimated = self._count_mode == 'estimate'
+
+        if self.streamed:
+            # the page isn't read yet, use the total to check it exists
+            if self._page > 1 and self._total_items is not None and \
+                    (self._page - 1) * self._per_page >= self._total_items:
+                raise UnableToProcess('Not Found',
+                                      'Page [%s] does not exist for '
+                                      'paginated request' % self._page,
+                                      404)
+        elif not self._items and self._page > 1:
             raise UnableToProcess('Not Found',
                                   'Page [%s] does not exist for paginated '
                                   'request' % self._page,
                                   404)
+
+    def _set_total(self, total):
+        self._total_items = total
+        self._no_pages = int(math.ceil(total / float(self._per_page)))
+
+    def _fetch_page(self):
+        q = self._query.limit(self._per_page).offset(
+            (self._page - 1) * self._per_page)
+        if self.streamed:
+            self._items = q.yield_per(self._stream_chunk_size)
+        else:
+            self._items = q.all()
+
+    def _fetch_page_and_count(self):
+        if self.streamed:
+            self._fetch_page()
+            self._set_total(self._query.order_by(None).count())
+        elif self._window_count and self._supports_window_functions():
+            self._paginate_window()
+        else:
+            pagination = self._query.paginate(self._page, self._per_page,
+                                              error_out=False)
+            self._no_pages = pagination.pages
+            self._items = pagination.items
+            self._total_items = pagination.total
+
+    def _dialect(self):
+        mapper = (self._model_class.__mapper__
+                  if self._model_class is not None else None)
+        return self._query.session.get_bind(mapper=mapper).dialect
+
+    def _supports_streaming(self):
+        """Can the connection run other statements while the rows of a
+        streamed page are read? The links of each chunk are read on the
+        same connection, see
+        :meth:`flask_resteasy.builders.ResponseBuilder.iter_json`, which the
+        MySQL and SQL Server drivers refuse while a result is open.
+        """
+        return self._dialect().name not in ('mysql', 'mssql')
+
+    def _supports_window_functions(self):
+        """Can the database backend count with ``COUNT(*) OVER ()``?
+        """
+        dialect = self._dialect()
+        version = dialect.server_version_info or ()
+        if dialect.name == 'sqlite':
+            dbapi = getattr(dialect, 'loaded_dbapi', None) or dialect.dbapi
+            return dbapi.sqlite_version_info >= (3, 25)
+        elif dialect.name == 'mysql':
+            if getattr(dialect, 'is_mariadb', False):
+                return version >= (10, 2)
+            return version >= (8,)
+        return True
+
+    def _paginate_window(self):
+        """Fetch the page and the total number of items in one statement.
+        The window is evaluated before LIMIT and OFFSET so every row carries
+        the total for the whole query.
+        """
+        rows = self._query.add_columns(
+            func.count().over().label('total_count')).limit(
+            self._per_page).offset((self._page - 1) * self._per_page).all()
+        self._items = [r[0] for r in rows]
+        self._set_total(rows[0][-1] if rows else 0)
+
+    def _keyset_columns(self):
+        """Sort fields of the query with the id field as a tie breaker as a
+        list of (field name, column, descending) tuples.
+        """
+        rv = []
+        if self._sort:
+            for fld, order in self._sort.items():
+                rv.append((fld, getattr(self._model_class, fld),
+                           order == 'desc'))
+        if not self._sort or self._id_field not in self._sort:
+            rv.append((self._id_field,
+                       getattr(self._model_class, self._id_field), False))
+        return rv
+
+    @staticmethod
+    def _cursor_value(column, value):
+        """Convert a cursor value decoded from JSON back to the
+        column's type
+        """
+        try:
+            python_type = column.type.python_type
+        except (AttributeError, NotImplementedError):
+            return value
+        if value is None or not isinstance(value, str):
+            return value
+        if python_type is datetime.datetime:
+            for fmt in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
+                try:
+                    return datetime.datetime.strptime(value, fmt)
+                except ValueError:
+                    pass
+        elif python_type is datetime.date:
+            try:
+                return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                pass
+        elif python_type is datetime.time:
+            for fmt in ('%H:%M:%S.%f', '%H:%M:%S'):
+                try:
+                    return datetime.datetime.strptime(value, fmt).time()
+                except ValueError:
+                    pass
+        elif python_type is decimal.Decimal:
+            try:
+                return decimal.Decimal(value)
+            except decimal.InvalidOperation:
+                raise UnableToProcess('Pagination Error',
+                                      'Cursor value [%s] is not a number'
+                                      % value)
+        return value
+
+    @staticmethod
+    def _nullable(col):
+        """Can the column of a model attribute be NULL?
+        """
+        return any(c.nullable for c in getattr(col.property, 'columns', ()))
+
+    def _keyset_filter(self, columns, values):
+        """Builds the where clause selecting rows past the cursor values,
+        for example with sort (a asc, id asc) and cursor (1, 5)::
+
+            a > 1 OR (a = 1 AND id > 5)
+
+        NULL sorts after every value, so if `a` is nullable the clause is::
+
+            a > 1 OR a IS NULL OR (a = 1 AND id > 5)
+
+        and with cursor (None, 5)::
+
+            a IS NULL AND id > 5
+        """
+        clauses = []
+        for i, (_, col, desc) in enumerate(columns):
+            value = values[i]
+            if desc != self._backwards:
+                past = col.isnot(None) if value is None else col < value
+            elif value is None:
+                # nothing sorts after NULL
+                continue
+            else:
+                past = col > value
+                if self._nullable(col):
+                    past = or_(past, col.is_(None))
+            equal = [c.is_(None) if v is None else c == v
+                     for (_, c, _), v in zip(columns[:i], values)]
+            clauses.append(and_(*(equal + [past])))
+        return or_(*clauses)
+
+    def _make_cursor(self, columns, item):
+        try:
+            return encode_cursor([c[0] for c in columns],
+                                 [getattr(item, c[0]) for c in columns])
+        except TypeError:
+            raise UnableToProcess('Pagination Error',
+                                  'The sort fields can not be used to '
+                                  'page by cursor')
+
+    def _paginate_keyset(self):
+        columns = self._keyset_columns()
+        q = self._query.order_by(None)
+        for _, col, desc in columns:
+            descending = desc != self._backwards
+            if self._nullable(col):
+                # NULL sorts after every value, whatever the database's
+                # default is
+                is_null = case((col.is_(None), 1), else_=0)
+                q = q.order_by(is_null.desc() if descending
+                               else is_null.asc())
+            q = q.order_by(col.desc() if descending else col.asc())
+
+        if self._cursor:
+            keys, values = self._cursor
+            if keys != [c[0] for c in columns]:
+                raise UnableToProcess('Pagination Error',
+                                      'Cursor does not match the sort '
+                                      'for the request')
+            values = [self._cursor_value(c[1], v)
+                      for c, v in zip(columns, values)]
+            q = q.filter(self._keyset_filter(columns, values))
+
+        # fetch one extra item to find out if there is another page
+        items = q.limit(self._per_page + 1).all()
+        has_more = len(items) > self._per_page
+        items = items[:self._per_page]
+        if self._backwards:
+            items.reverse()
+        self._items = items
+
+        if items:
+            first = self._make_cursor(columns, items[0])
+            last = self._make_cursor(columns, items[-1])
+            if self._backwards:
+                self._prev = first if has_more else None
+                self._next = last
+            else:
+                self._prev = first if self._cursor else None
+                self._next = last if has_more else None
+
+        if self._require_total:
+            self._total_items = self._query.order_by(None).count()
+        else:
+            self._total_items = None
+        self._no_pages = None
@@ -5,22 +5,60 @@
 
 """
 from flask.views import MethodView
-from flask import jsonify
+from flask import Response
+from flask import request
+from flask import stream_with_context
 
 
 class APIView(MethodView):
     """Based on the :class:`flask.views.MethodView` provided by the
     Flask framework.
 
-    On each HTTP request for a GET, PUT, POST, DELETE or OPTIONS an instance
-    of APIView will be created for the incoming request.
-
-    Note this does not currently support HTTP PATCH request.
+    On each HTTP request for a GET, PUT, PATCH, POST, DELETE or OPTIONS an
+    instance of APIView will be created for the incoming request.
 
     """
 
     def __init__(self, cfg):
-        self._cfg = cfg
+        self._cfg = cfg.finalize()
+
+    def _json_response(self, json_dic, status=200, headers=None):
+        """Returns a response with json_dic encoded by the configured
+        :attr:`flask_resteasy.configs.APIConfig.json_codec`
+        """
+        return Response(self._cfg.json_codec.dumpb(json_dic), status,
+                        headers, mimetype='application/json')
+
+    @staticmethod
+    def _not_modified(etag):
+        """Returns an empty 304 Not Modified response
+        """
+        rv = Response(status=304)
+        rv.set_etag(etag)
+        return rv
+
+    def _cached_response(self, data, etag):
+        """Returns a cached response, 304 Not Modified if the client has it
+        """
+        if request.if_none_match.contains_weak(etag):
+            return self._not_modified(etag)
+        rv = Response(data, mimetype='application/json')
+        rv.set_etag(etag)
+        return rv
+
+    def _tables_for(self, parser):
+        """Tables a GET response is read from, the response is removed from
+        the cache when one of them is written to.
+        """
+        cfg = self._cfg
+        rv = {cfg.model_class.__table__.name}
+        if parser.link:
+            cfg = cfg.api_manager.get_cfg(cfg.resource_name_case(parser.link))
+            rv.add(cfg.model_class.__table__.name)
+        for include in parser.include or ():
+            rv.add(cfg.api_manager.get_cfg(cfg.resource_name_case(
+                include)).model_class.__table__.name)
+        return rv
 
     def get(self, **kwargs):
         """Handles HTTP GET requests. The behavior of this method
@@ -32,6 +70,18 @@ class APIView(MethodView):
                        current HTTP request
         """
         parser = self._cfg.parser_factory.create(self._cfg, **kwargs)
+        cache = self._cfg.response_cache
+        if cache is not None:
+            cache_key = '%s%s' % (request.endpoint, parser.cache_key)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return self._cached_response(*cached)
+            generation = cache.generation
+
+        etag = self._cfg.processor_factory.create_etag(self._cfg, parser).etag
+        if etag is not None and request.if_none_match.contains_weak(etag):
+            return self._not_modified(etag)
+
         processor = self._cfg.processor_factory.create(self._cfg, parser)
         if parser.link:
             # for links we need to us the builder registered with the link
@@ -41,7 +91,22 @@ class APIView(MethodView):
         else:
             builder = self._cfg.builder_factory.create(self._cfg, processor)
 
-        return jsonify(builder.json_dic)
+        if processor.streaming:
+            rv = Response(stream_with_context(builder.iter_json()),
+                          mimetype='application/json')
+            if etag is not None:
+                rv.set_etag(etag)
+            return rv
+
+        rv = self._json_response(builder.json_dic)
+        if etag is None:
+            rv.add_etag()
+        else:
+            rv.set_etag(etag)
+        if cache is not None:
+            cache.set(cache_key, (rv.get_data(), rv.get_etag()[0]),
+                      self._tables_for(parser), generation)
+        return rv.make_conditional(request)
 
     def post(self, **kwargs):
         """Handles HTTP POST requests. The behavior of this method
@@ -54,10 +119,27 @@ class APIView(MethodView):
         """
         parser = self._cfg.parser_factory.create(self._cfg, **kwargs)
         processor = self._cfg.processor_factory.create(self._cfg, parser)
+        if parser.link:
+            # links were written, there is nothing to return
+            return Response(status=204)
+        if parser.return_minimal:
+            # respond without building the resources
+            urls = ['%s/%s' % (self._cfg.url_for,
+                               getattr(r, self._cfg.id_field))
+                    for r in processor.resources]
+            headers = {'Preference-Applied': 'return=minimal'}
+            if processor.bulk:
+                return self._json_response({'meta': {'urls': urls}}, 201,
+                                           headers)
+            if urls:
+                headers['Location'] = urls[0]
+            return Response(status=201, headers=headers)
+
         builder = self._cfg.builder_factory.create(self._cfg, processor)
-        url = builder.urls[0] if len(builder.urls) == 1 else builder.urls
+        # resources created in bulk return their urls in the meta node
+        headers = None if processor.bulk else {'Location': builder.urls[0]}
 
-        return jsonify(builder.json_dic), 201, {'Location': url}
+        return self._json_response(builder.json_dic, 201, headers)
 
     def delete(self, **kwargs):
         """Handles HTTP DELETE requests. The behavior of this method
@@ -70,9 +152,12 @@ class APIView(MethodView):
         """
         parser = self._cfg.parser_factory.create(self._cfg, **kwargs)
         processor = self._cfg.processor_factory.create(self._cfg, parser)
+        if parser.link:
+            # links were written, there is nothing to return
+            return Response(status=204)
         builder = self._cfg.builder_factory.create(self._cfg, processor)
 
-        return jsonify(builder.json_dic)
+        return self._json_response(builder.json_dic)
 
     def put(self, **kwargs):
         """Handles HTTP PUT requests. The behavior of this method
@@ -85,6 +170,26 @@ class APIView(MethodView):
         """
         parser = self._cfg.parser_factory.create(self._cfg, **kwargs)
         processor = self._cfg.processor_factory.create(self._cfg, parser)
+        if parser.link:
+            # links were written, there is nothing to return
+            return Response(status=204)
+        if parser.return_minimal:
+            return Response(status=204,
+                            headers={'Preference-Applied': 'return=minimal'})
         builder = self._cfg.builder_factory.create(self._cfg, processor)
 
-        return jsonify(builder.json_dic)
+        return self._json_response(builder.json_dic)
+
+    def patch(self, **kwargs):
+        """Handles HTTP PATCH requests. The response has no body, so
+        no builder is used. The behavior of this method can be changed by
+        providing your own factories for parsers and processors.
+
+        :param kwargs: dictionary of keyword arguments which contains
+                       route parameters and query parameters for the
+                       current HTTP request
+        """
+        parser = self._cfg.parser_factory.create(self._cfg, **kwargs)
+        self._cfg.processor_factory.create(self._cfg, parser)
+
+        return Response(status=204)
@@ -6,14 +6,35 @@
     :copyright: (c) 2014 by Michael Schenk.
     :license: BSD, see LICENSE for more details.
 """
+import gc
+import os
+import shutil
+import tempfile
 import unittest
 import json
+import datetime
+import decimal
+import threading
+from contextlib import contextmanager
 
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-
+from sqlalchemy import event
+import inflection
+
+from flask_resteasy import configs
+from flask_resteasy import inflect
+from flask_resteasy import parsers
+from flask_resteasy.caches import IntrospectionCache
+from flask_resteasy.caches import ResponseCache
+from flask_resteasy.codecs import JSONCodec
+from flask_resteasy.codecs import OrjsonCodec
 from flask_resteasy.manager import APIManager
+from flask_resteasy.configs import APIConfig
 from flask_resteasy.configs import EmberConfig
+from flask_resteasy.configs import ConfigSnapshot
+from flask_resteasy.processors import ClonePostProcess
+from flask_resteasy.processors import Pager
 from flask_resteasy.processors import RequestProcessor
 
 app = None
@@ -74,6 +95,20 @@ class TestAPI(unittest.TestCase):
         product_category = db.relationship('ProductCategory',
                                            foreign_keys=parent_category_id)
 
+    class Tag (db.Model):
+        """Tag Model
+        """
+        __tablename__ = "tag"
+        id = db.Column('id', db.Integer, primary_key=True)
+        name = db.Column('name', db.String)
+        products = db.relationship(
+            'Product', lazy='dynamic',
+            secondary=db.Table(
+                'product_tag',
+                db.Column('tag_id', db.Integer, db.ForeignKey('tag.id')),
+                db.Column('product_id', db.Integer,
+                          db.ForeignKey('product.id'))))
+
     class Client (db.Model):
         """Client Model
         """
@@ -83,6 +118,27 @@ class TestAPI(unittest.TestCase):
         email = db.Column('email', db.String)
         private = db.Column('private', db.String)
 
+    class Shelf (db.Model):
+        """Shelf Model with a relationship filtered by a condition
+        """
+        __tablename__ = "shelf"
+        id = db.Column('id', db.Integer, primary_key=True)
+        name = db.Column('name', db.String)
+        active_books = db.relationship(
+            'Book', primaryjoin='and_(Shelf.id == Book.shelf_id, '
+                                'Book.active == True)')
+        books = db.relationship('Book', viewonly=True)
+
+    class Book (db.Model):
+        """Book Model
+        """
+        __tablename__ = "book"
+        id = db.Column('id', db.Integer, primary_key=True)
+        title = db.Column('title', db.String)
+        active = db.Column('active', db.Boolean)
+        price = db.Column('price', db.Numeric(8, 2))
+        shelf_id = db.Column('shelf_id', db.Integer, db.ForeignKey('shelf.id'))
+
     @classmethod
     def setUpClass(cls):
         global app, db
@@ -168,6 +224,21 @@ class TestAPI(unittest.TestCase):
                    'Accept': 'application/json'}
         return headers
 
+    @contextmanager
+    def count_queries(self):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute',
+                     before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute',
+                         before_cursor_execute)
+
 
 class TestGetRequest(TestAPI):
 
@@ -219,6 +290,29 @@ class TestGetRequest(TestAPI):
             j = json.loads(rv.data.decode(encoding='UTF-8'))
             self.assertTrue(j['product']['links']['product_category'] == 1)
 
+    def test_get_links_not_loaded(self):
+        with self.client as c:
+            with self.count_queries() as statements:
+                rv = c.get(self.get_url('/products'),
+                           headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+            # to-one links are read from foreign keys
+            self.assertFalse([st for st in statements
+                              if 'FROM product_category' in st])
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['products'][0]['links']['product_category']
+                            == 1)
+
+            with self.count_queries() as statements:
+                rv = c.get(self.get_url('/orders'),
+                           headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+            # page, count and one grouped query for the to-many links
+            self.assertTrue(len(statements) == 3)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['orders'][0]['links']['order_items'] == [1, 2])
+            self.assertTrue(j['orders'][1]['links']['order_items'] == [3])
+
     def test_get_link(self):
         with self.client as c:
             rv = c.get(self.get_url('/products/1/links/product_category'),
@@ -436,6 +530,17 @@ class TestInclude(TestAPI):
             j = json.loads(rv.data.decode(encoding='UTF-8'))
             self.assertTrue(len(j['linked']['clients']) == 2)
 
+    def test_include_batched(self):
+        with self.client as c:
+            for url in ('/orders/1', '/orders'):
+                with self.count_queries() as statements:
+                    rv = c.get(self.get_url(url), headers=self.get_headers(),
+                               query_string={'include': 'order_items'})
+                self.assertTrue(rv.status_code == 200)
+                loads = [st for st in statements if 'FROM order_item' in st]
+                self.assertTrue(len(loads) == 1)
+                self.assertTrue(' IN (' in loads[0])
+
     def test_include_many(self):
         with self.client as c:
             rv = c.get(self.get_url('/orders/1'), headers=self.get_headers(),
@@ -473,6 +578,75 @@ class TestInclude(TestAPI):
             self.assertTrue(rv.status_code == 400)
 
 
+class TestSparseFields(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestSparseFields, cls).setUpClass()
+        api_manager = APIManager(app, db)
+        api_manager.register_api(TestAPI.Order)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Product)
+        api_manager.register_api(TestAPI.ProductCategory)
+        api_manager.register_api(TestAPI.Client,
+                                 excludes={'all': ['private']})
+
+    def test_fields(self):
+        with self.client as c:
+            with self.count_queries() as statements:
+                rv = c.get(self.get_url('/products'),
+                           headers=self.get_headers(),
+                           query_string={'fields[products]': 'name,sku'})
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(set(j['products'][0]) ==
+                            {'id', 'name', 'sku', 'links'})
+            self.assertTrue(j['products'][0]['links']['product_category']
+                            == 1)
+            # only the requested columns are selected
+            self.assertTrue(len(statements) == 2)
+            self.assertTrue('product.description' not in statements[0])
+
+    def test_fields_include(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/orders/1'), headers=self.get_headers(),
+                       query_string={'include': 'order_items',
+                                     'fields[order_items]': 'amount'})
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue('order_no' in j['order'])
+            self.assertTrue(set(j['linked']['order_items'][0]) ==
+                            {'id', 'amount', 'links'})
+
+    def test_fields_link(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/orders/1/links/order_items'),
+                       headers=self.get_headers(),
+                       query_string={'fields[order_items]': 'amount'})
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(set(j['order_items'][0]) ==
+                            {'id', 'amount', 'links'})
+
+    def test_fields_invalid(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/clients'), headers=self.get_headers(),
+                       query_string={'fields[clients]': 'unknown'})
+            self.assertTrue(rv.status_code == 400)
+
+            rv = c.get(self.get_url('/clients'), headers=self.get_headers(),
+                       query_string={'fields[clients]': 'private'})
+            self.assertTrue(rv.status_code == 403)
+
+            rv = c.get(self.get_url('/clients'), headers=self.get_headers(),
+                       query_string={'fields[clients]': ''})
+            self.assertTrue(rv.status_code == 400)
+
+            rv = c.get(self.get_url('/clients'), headers=self.get_headers(),
+                       query_string={'fields[unknown]': 'email'})
+            self.assertTrue(rv.status_code == 400)
+
+
 class TestPagination(TestAPI):
 
     @classmethod
@@ -540,119 +714,2009 @@ class TestPagination(TestAPI):
             self.assertTrue(rv.status_code == 400)
 
 
-class TestPostRequest(TestAPI):
+class TestWindowCount(TestAPI):
 
     @classmethod
     def setUpClass(cls):
-        class ClientPostProcess(RequestProcessor):
-            def _process(self):
-                self._resources.append(TestAPI.Client(full_name='Custom Post'))
-
-        super(TestPostRequest, cls).setUpClass()
-        api_manager = APIManager(app, db)
-        api_manager.register_api(TestAPI.Product,
-                                 methods=['GET', 'POST', 'PUT', 'DELETE'])
-        api_manager.register_api(TestAPI.ProductCategory)
-        api_manager.register_api(TestAPI.Order, methods=['GET', 'POST'])
+        super(TestWindowCount, cls).setUpClass()
+        api_manager = APIManager(app, db, window_count=True)
+        api_manager.register_api(TestAPI.Order)
         api_manager.register_api(TestAPI.OrderItem)
-        api_manager.register_api(
-            TestAPI.Client,
-            post_process=('action', ClientPostProcess),
-            methods=['POST'])
+        api_manager.register_api(TestAPI.Client)
 
-    def test_post_one_to_one(self):
-        p_json = {
-            "product": {
-                "sku": "BEET",
-                "name": 'Beets',
-                "description": "Locally produced beets",
-                "price": 1.95,
-                "links": {'product_category': 2},
-            }
-        }
+    def test_pagination(self):
+        with self.client as c:
+            with self.count_queries() as statements:
+                rv = c.get(self.get_url('/orders'),
+                           headers=self.get_headers(),
+                           query_string={'page': 2, 'per_page': 1})
+            self.assertTrue(rv.status_code == 200)
+            counts = [st for st in statements if 'count(' in st]
+            self.assertTrue(len(counts) == 1)
+            self.assertTrue('OVER ()' in counts[0])
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['meta']['page'] == 2)
+            self.assertTrue(j['meta']['no_pages'] == 2)
+            self.assertTrue(len(j['orders']) == 1)
+
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers(),
+                       query_string={'page': 3, 'per_page': 1})
+            self.assertTrue(rv.status_code == 404)
 
+    def test_pagination_link(self):
         with self.client as c:
-            rv = c.post(self.get_url('/products'), data=json.dumps(p_json),
-                        headers=self.get_headers())
-            self.assertTrue(rv.status_code == 201)
+            rv = c.get(self.get_url('/orders/1/links/order_items'),
+                       headers=self.get_headers(),
+                       query_string={'page': 1, 'per_page': 1})
+            self.assertTrue(rv.status_code == 200)
             j = json.loads(rv.data.decode(encoding='UTF-8'))
-            self.assertTrue(j['product']['sku'] == "BEET")
-            self.assertTrue(j['product']['links']['product_category'] == 2)
-            self.assertTrue(('Location',
-                             self.get_url('/products/3')) == rv.headers[2])
+            self.assertTrue(j['meta']['no_pages'] == 2)
+            self.assertTrue(len(j['order_items']) == 1)
 
+    def test_get_404(self):
         with self.client as c:
-            rv = c.get(self.get_url('/products/3'), headers=self.get_headers())
+            rv = c.get(self.get_url('/clients/1,2'),
+                       headers=self.get_headers())
             self.assertTrue(rv.status_code == 200)
-            self.assertTrue(j['product']['sku'] == "BEET")
-            self.assertTrue(j['product']['links']['product_category'] == 2)
+            rv = c.get(self.get_url('/clients/1,10'),
+                       headers=self.get_headers())
+            self.assertTrue(rv.status_code == 404)
 
-    def test_post_one_to_many(self):
-        p_json = {
-            "order": {
-                "order_no": "3",
-                "links": {'order_items': [1], 'client': None},
-                }
-        }
 
+class TestCountCache(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        class EstimateConfig(APIConfig):
+            def _get_count_mode(self):
+                return 'estimate'
+
+        super(TestCountCache, cls).setUpClass()
+        api_manager = APIManager(app, db, count_mode='cached',
+                                 methods=['GET', 'POST', 'DELETE'])
+        api_manager.register_api(TestAPI.Order)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client, cfg_class=EstimateConfig)
+        cls.api_manager = api_manager
+
+    def setUp(self):
+        super(TestCountCache, self).setUp()
+        self.api_manager.count_cache.clear()
+
+    def get_orders(self, c, **kwargs):
+        query_string = {'page': 1, 'per_page': 1}
+        query_string.update(kwargs)
+        with self.count_queries() as statements:
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers(),
+                       query_string=query_string)
+        self.assertTrue(rv.status_code == 200)
+        counts = [st for st in statements if 'count(' in st]
+        return json.loads(rv.data.decode(encoding='UTF-8')), len(counts)
+
+    def test_cached(self):
         with self.client as c:
-            rv = c.post(self.get_url('/orders'), data=json.dumps(p_json),
+            j, counts = self.get_orders(c)
+            self.assertTrue(counts == 1)
+            self.assertTrue(j['meta']['no_pages'] == 2)
+
+            j, counts = self.get_orders(c, page=2)
+            self.assertTrue(counts == 0)
+            self.assertTrue(j['meta']['no_pages'] == 2)
+
+            # filtered counts are cached separately
+            j, counts = self.get_orders(c, filter='order_no:3')
+            self.assertTrue(counts == 1)
+
+            rv = c.post(self.get_url('/orders'),
+                        data=json.dumps({'order': {'order_no': '3'}}),
                         headers=self.get_headers())
             self.assertTrue(rv.status_code == 201)
+
+            j, counts = self.get_orders(c)
+            self.assertTrue(counts == 1)
+            self.assertTrue(j['meta']['no_pages'] == 3)
+
+    def test_link_key(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/orders/1/links/order_items'),
+                       headers=self.get_headers(),
+                       query_string={'page': 1, 'per_page': 1})
             j = json.loads(rv.data.decode(encoding='UTF-8'))
-            self.assertTrue(j['order']['order_no'] == "3")
-            self.assertTrue(j['order']['links']['order_items'] == [1])
-            self.assertTrue(('Location',
-                             self.get_url('/orders/3')) == rv.headers[2])
+            self.assertTrue(j['meta']['no_pages'] == 2)
+            keys = list(self.api_manager.count_cache._entries)
+            self.assertTrue(keys == [(('order_item', 'order'), (
+                ('order', 'order_items', 'ONETOMANY'), ('1',), ()))])
 
+    def test_estimate(self):
         with self.client as c:
-            rv = c.get(self.get_url('/orders/3'), headers=self.get_headers())
+            rv = c.get(self.get_url('/clients'), headers=self.get_headers(),
+                       query_string={'page': 1, 'per_page': 1})
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['meta']['total_estimate'] == 3)
+            self.assertTrue('no_pages' not in j['meta'])
+
+            rv = c.delete(self.get_url('/clients/1'),
+                          headers=self.get_headers())
             self.assertTrue(rv.status_code == 200)
-            self.assertTrue(j['order']['order_no'] == "3")
-            self.assertTrue(j['order']['links']['order_items'] == [1])
 
-    def test_custom_post(self):
-        p_json = {'action': 'ClientPostProcess'}
+            # estimates are not invalidated by writes
+            rv = c.get(self.get_url('/clients'), headers=self.get_headers(),
+                       query_string={'page': 1, 'per_page': 1})
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['meta']['total_estimate'] == 3)
 
-        with self.client as c:
-            rv = c.post(self.get_url('/clients'), data=json.dumps(p_json),
-                        headers=self.get_headers())
-            self.assertTrue(rv.status_code == 201)
+            rv = c.get(self.get_url('/clients'), headers=self.get_headers(),
+                       query_string={'page': 1, 'per_page': 1,
+                                     'count': 'exact'})
             j = json.loads(rv.data.decode(encoding='UTF-8'))
-            self.assertTrue(j['client']['full_name'] == 'Custom Post')
+            self.assertTrue(j['meta']['total_estimate'] == 2)
 
-    def test_custom_post_does_not_macth(self):
-        p_json = {'action': 'PostProcess'}
+    def test_count_none(self):
+        with self.client as c:
+            j, counts = self.get_orders(c, count='none')
+            self.assertTrue(counts == 0)
+            self.assertTrue('no_pages' not in j['meta'])
+            self.assertTrue(len(j['orders']) == 1)
+
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers(),
+                       query_string={'page': 3, 'per_page': 1,
+                                     'count': 'none'})
+            self.assertTrue(rv.status_code == 404)
+
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers(),
+                       query_string={'count': 'some'})
+            self.assertTrue(rv.status_code == 400)
+
+            # missing ids are still found without counting
+            rv = c.get(self.get_url('/orders/1,10'),
+                       headers=self.get_headers(),
+                       query_string={'count': 'none'})
+            self.assertTrue(rv.status_code == 404)
+
+
+class TestJSONCodec(TestAPI):
 
+    @classmethod
+    def setUpClass(cls):
+        class CountingCodec(JSONCodec):
+            decoded = []
+
+            def loads(self, data):
+                self.decoded.append(data)
+                return super(CountingCodec, self).loads(data)
+
+        class OrderNoProcess(RequestProcessor):
+            def _process(self):
+                self._resources.append(TestAPI.Order(
+                    order_no=self._request_json()['order_no']))
+
+        super(TestJSONCodec, cls).setUpClass()
+        cls.codec = CountingCodec()
+        api_manager = APIManager(app, db, json_codec=cls.codec,
+                                 methods=['GET', 'POST'])
+        api_manager.register_api(TestAPI.Order,
+                                 post_process=('action', OrderNoProcess))
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client)
+        cls.api_manager = api_manager
+
+    def test_compact(self):
+        app.debug = True
+        try:
+            with self.client as c:
+                rv = c.get(self.get_url('/orders/1'),
+                           headers=self.get_headers())
+                self.assertTrue(rv.status_code == 200)
+                self.assertTrue(rv.mimetype == 'application/json')
+                self.assertTrue(b'\n' not in rv.data)
+                self.assertTrue(b'": ' not in rv.data)
+        finally:
+            app.debug = False
+
+    def test_post_invalid_json(self):
         with self.client as c:
-            rv = c.post(self.get_url('/clients'), data=json.dumps(p_json),
+            rv = c.post(self.get_url('/orders'), data='{"order": ',
                         headers=self.get_headers())
-            self.assertTrue(rv.status_code == 201)
+            self.assertTrue(rv.status_code == 400)
+
+    def test_decode_once(self):
+        with self.client as c:
+            for p_json in ({'action': 'OrderNoProcess', 'order_no': '7'},
+                           {'order': {'order_no': '7'}}):
+                del self.codec.decoded[:]
+                rv = c.post(self.get_url('/orders'),
+                            data=json.dumps(p_json),
+                            headers=self.get_headers())
+                self.assertTrue(rv.status_code == 201)
+                j = json.loads(rv.data.decode(encoding='UTF-8'))
+                self.assertTrue(j['order']['order_no'] == '7')
+                self.assertTrue(len(self.codec.decoded) == 1)
+
+    def test_converters(self):
+        cfg = self.api_manager.get_cfg('orders')
+        self.assertTrue('DATETIME' in cfg._serializer_converters())
+
+    def test_orjson(self):
+        try:
+            codec = OrjsonCodec()
+        except ImportError:
+            raise unittest.SkipTest('orjson is not installed')
+        d = datetime.datetime(2015, 1, 2, 3, 4, 5, 6)
+        self.assertTrue(codec.loads(codec.dumpb({'d': d})) ==
+                        {'d': d.isoformat()})
+        self.assertTrue('DATETIME' in codec.native_types)
+
+
+class TestConfigSnapshot(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        class CustomConfig(APIConfig):
+            @staticmethod
+            def _get_id_route_param():
+                return 'order_id'
+
+            def custom_setting(self):
+                return 'custom'
+
+        super(TestConfigSnapshot, cls).setUpClass()
+        cls.api_manager = APIManager(app, db)
+        cls.api_manager.register_api(TestAPI.Order, cfg_class=CustomConfig)
+        cls.api_manager.register_api(TestAPI.OrderItem)
+        cls.api_manager.register_api(TestAPI.Client)
+
+    def test_finalize(self):
+        cfg = self.api_manager.configs['order']
+        snapshot = cfg.finalize()
+        self.assertTrue(isinstance(snapshot, ConfigSnapshot))
+        self.assertTrue(cfg.finalize() is snapshot)
+        self.assertTrue(snapshot.finalize() is snapshot)
+        self.assertTrue(self.api_manager.get_cfg('orders') is snapshot)
+
+        self.assertTrue(snapshot.id_route_param == 'order_id')
+        self.assertTrue(snapshot.custom_setting() == 'custom')
+        self.assertTrue(snapshot.allowed_relationships ==
+                        {'client', 'order_items'})
+        self.assertTrue(isinstance(snapshot.allowed_relationships, frozenset))
+        self.assertTrue(snapshot.json_case is snapshot.json_case)
+        self.assertTrue(snapshot.db is db)
+        with self.assertRaises(AttributeError):
+            snapshot.resource_name = 'other'
+
+    def test_finalize_threads(self):
+        cfg = self.api_manager.configs['client']
+        snapshots = []
+
+        def finalize():
+            with app.app_context():
+                snapshots.append(cfg.finalize())
+
+        threads = [threading.Thread(target=finalize) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(len(snapshots) == 8)
+        self.assertTrue(all(s is snapshots[0] for s in snapshots))
+
+    def test_finalize_per_app(self):
+        cfg = self.api_manager.configs['order']
+        other_app = Flask(__name__)
+        other_manager = APIManager(other_app, db, count_ttl=5)
+        with app.app_context():
+            snapshot = cfg.finalize()
+        with other_app.app_context():
+            other = cfg.finalize()
+            self.assertTrue(cfg.finalize() is other)
+        self.assertTrue(other is not snapshot)
+        self.assertTrue(snapshot.api_manager is self.api_manager)
+        self.assertTrue(other.api_manager is other_manager)
+        self.assertTrue(other.count_ttl == 5)
+
+    def test_request(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/orders/1'), headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
             j = json.loads(rv.data.decode(encoding='UTF-8'))
-            self.assertFalse(j['client']['full_name'] == 'Custom Post')
+            self.assertTrue(j['order']['links']['order_items'] == [1, 2])
 
 
-class TestDeleteRequest(TestAPI):
+class TestInflect(TestAPI):
 
     @classmethod
     def setUpClass(cls):
-        super(TestDeleteRequest, cls).setUpClass()
+        super(TestInflect, cls).setUpClass()
         api_manager = APIManager(app, db)
-        api_manager.register_api(
-            TestAPI.Product,
-            methods=['GET', 'POST', 'PUT', 'DELETE'])
+        api_manager.register_api(TestAPI.Order)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client, cfg_class=EmberConfig)
+
+    @contextmanager
+    def no_inflection(self):
+        def fail(*args):
+            raise AssertionError('%s was converted' % (args,))
+
+        names = ('underscore', 'camelize', 'singularize', 'pluralize')
+        saved = [getattr(inflection, name) for name in names]
+        for name in names:
+            setattr(inflection, name, fail)
+        try:
+            yield
+        finally:
+            for name, func in zip(names, saved):
+                setattr(inflection, name, func)
+
+    def test_memoized(self):
+        self.assertTrue(inflect.pluralize('order_item') == 'order_items')
+        self.assertTrue(inflect.camelize('order_items', False) ==
+                        'orderItems')
+        with self.no_inflection():
+            self.assertTrue(inflect.singularize('orderItems') == 'orderItem')
+            self.assertTrue(inflect.underscore('orderItems') ==
+                            'order_items')
+
+    def test_bounded(self):
+        max_words = inflect.MAX_WORDS
+        inflect.MAX_WORDS = 0
+        try:
+            self.assertTrue(inflect.pluralize('unseeded_word') ==
+                            'unseeded_words')
+            with self.no_inflection():
+                self.assertRaises(AssertionError, inflect.pluralize,
+                                  'unseeded_word')
+        finally:
+            inflect.MAX_WORDS = max_words
+
+    def test_requests(self):
+        urls = ('/orders?include=order_items',
+                '/orders/1/links/order_items', '/order_items?sort=-amount',
+                '/clients/1')
+        with self.client as c:
+            for url in urls:
+                c.get(self.get_url(url), headers=self.get_headers())
 
-    def test_delete(self):
+            with self.no_inflection():
+                for url in urls:
+                    rv = c.get(self.get_url(url), headers=self.get_headers())
+                    self.assertTrue(rv.status_code == 200)
+
+
+class TestWarmUp(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestWarmUp, cls).setUpClass()
+        cls.api_manager = APIManager(app, db)
+        cls.api_manager.register_api(TestAPI.Order)
+        cls.api_manager.register_api(TestAPI.OrderItem)
+        cls.api_manager.register_api(TestAPI.Client, cfg_class=EmberConfig)
+
+    def test_warm_up(self):
+        session = db.session()
+        times = self.api_manager.warm_up()
+        self.assertTrue(list(times) == ['order', 'order_item', 'client'])
+        self.assertTrue(all(t >= 0 for t in times.values()))
+        for name, seconds in times.items():
+            self.assertTrue(self.api_manager.warm_up_times[name] == seconds)
+        for cfg in self.api_manager.configs.values():
+            self.assertTrue(app in cfg._snapshots)
+        # the application's session is left as it is
+        self.assertTrue(db.session() is session)
 
         with self.client as c:
-            rv = c.delete(self.get_url('/products/1'),
-                          headers=self.get_headers())
+            rv = c.get(self.get_url('/orders?include=order_items'),
+                       headers=self.get_headers())
             self.assertTrue(rv.status_code == 200)
 
+    def test_warm_up_resources(self):
+        times = self.api_manager.warm_up(['orders'])
+        self.assertTrue(list(times) == ['order'])
+
+    def test_prepare_fork(self):
+        frozen = []
+        disposed = []
+
+        def engine_disposed(engine):
+            disposed.append(engine)
+
+        freeze = getattr(gc, 'freeze', None)
+        gc.freeze = lambda: frozen.append(True)
+        event.listen(db.engine, 'engine_disposed', engine_disposed)
+        try:
+            self.api_manager.warm_up(['client'], prepare_fork=True)
+        finally:
+            event.remove(db.engine, 'engine_disposed', engine_disposed)
+            if freeze is None:
+                del gc.freeze
+            else:
+                gc.freeze = freeze
+        self.assertTrue(frozen == [True])
+        self.assertTrue(len(disposed) == 1)
+
+    def test_warm_up_on_register(self):
+        warm_app = Flask(__name__)
+        warm_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(warm_app)
+        with warm_app.app_context():
+            db.create_all()
+        api_manager = APIManager(warm_app, db, warm_up=True)
+        api_manager.register_api(TestAPI.Product)
+        self.assertTrue(list(api_manager.warm_up_times) == ['product'])
+        self.assertTrue(warm_app in api_manager.configs['product']._snapshots)
+
+
+class TestIntrospectionCache(TestAPI):
+
+    def setUp(self):
+        super(TestIntrospectionCache, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'introspection.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestIntrospectionCache, self).tearDown()
+
+    def register(self, cache, warm_up=False):
+        """Registers the resources on an application of their own, the
+        way a new process would
+        """
+        cache_app = Flask(__name__)
+        cache_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(cache_app)
+        with cache_app.app_context():
+            db.create_all()
+        api_manager = APIManager(cache_app, db, introspection_cache=cache,
+                                 methods={'GET', 'POST', 'DELETE'},
+                                 warm_up=warm_up)
+        api_manager.register_api(TestAPI.Order,
+                                 excludes={'from_model': ['order_no']})
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client, cfg_class=EmberConfig)
+        return cache_app, api_manager
+
+    @contextmanager
+    def no_inspection(self):
+        def fail(*args):
+            raise AssertionError('%s was inspected' % (args,))
+
+        saved = configs.inspect
+        configs.inspect = fail
+        try:
+            yield
+        finally:
+            configs.inspect = saved
+
+    def test_rebuild_and_load(self):
+        cache = IntrospectionCache(self.path, '1')
+        cache_app, api_manager = self.register(cache)
+        self.assertTrue(not os.path.exists(self.path))
+        api_manager.warm_up()
+        with open(self.path) as f:
+            data = json.load(f)
+        self.assertTrue(data['schema_version'] == '1')
+        self.assertTrue(len(data['resources']) == 3)
+        with cache_app.app_context():
+            expected = dict((name, cfg.introspected()) for name, cfg in
+                            api_manager.configs.items())
+
+        with self.no_inspection():
+            cache_app, api_manager = self.register(
+                IntrospectionCache(self.path, '1'))
+            with cache_app.app_context():
+                for name, cfg in api_manager.configs.items():
+                    api_manager.get_cfg(name)
+                    self.assertTrue(cfg.introspected() == expected[name])
+                snapshot = api_manager.get_cfg('orders')
+                self.assertTrue(snapshot.relationship_keys['client'] ==
+                                ('MANYTOONE', 'client_id'))
+                self.assertTrue('order_no' not in snapshot.allowed_sort)
+        self.assertTrue(not api_manager.introspection_cache.save())
+
+    def test_warm_up_on_register(self):
+        cache = IntrospectionCache(self.path, '1')
+        cache_app, api_manager = self.register(cache, warm_up=True)
+        # resources warmed up as they are registered are not written
+        self.assertTrue(not os.path.exists(self.path))
+        self.assertTrue(cache.save())
+        with open(self.path) as f:
+            self.assertTrue(len(json.load(f)['resources']) == 3)
+
+        with self.no_inspection():
+            cache_app, api_manager = self.register(
+                IntrospectionCache(self.path, '1'), warm_up=True)
+        self.assertTrue(not api_manager.introspection_cache.save())
+
+    def test_key(self):
+        cache_app, api_manager = self.register(None)
+        cfg = api_manager.configs['order']
+        with cache_app.app_context():
+            keys = {cfg.introspection_key()}
+            cfg._get_id_field = lambda: 'order_no'
+            keys.add(cfg.introspection_key())
+            cfg._get_relationship_field_id_postfix = lambda: '_ref'
+            keys.add(cfg.introspection_key())
+            cfg._get_private_field_prefix = lambda: 'secret_'
+            keys.add(cfg.introspection_key())
+        self.assertTrue(len(keys) == 4)
+
+    def test_schema_changed(self):
+        cache_app, api_manager = self.register(
+            IntrospectionCache(self.path, '1'))
+        api_manager.warm_up()
+        cache = IntrospectionCache(self.path, '2')
+        cache_app, api_manager = self.register(cache)
+        with cache_app.app_context():
+            for name in api_manager.configs:
+                api_manager.get_cfg(name)
+            self.assertTrue(cache.save())
+        with open(self.path) as f:
+            data = json.load(f)
+        self.assertTrue(data['schema_version'] == '2')
+        self.assertTrue(len(data['resources']) == 3)
+
+    def test_excludes_validated(self):
+        cache_app, api_manager = self.register(
+            IntrospectionCache(self.path, '1'))
+        api_manager.warm_up()
+        cache_app, api_manager = self.register(
+            IntrospectionCache(self.path, '1'))
+        cfg = api_manager.configs['order']
+        with self.no_inspection():
+            with cache_app.app_context():
+                self.assertTrue(
+                    api_manager.introspection_cache.load(cfg))
+                self.assertTrue('order_no' not in cfg.allowed_sort)
+                # excludes are checked against the loaded fields
+                cfg._excludes = {'sort': ['unknown']}
+                cfg._allowed_sort = None
+                with self.assertRaises(AssertionError) as cm:
+                    cfg.allowed_sort
+                self.assertTrue('Invalid excluded' in str(cm.exception))
+
+    def test_corrupt_file(self):
+        with open(self.path, 'w') as f:
+            f.write('{"version":')
+        cache = IntrospectionCache(self.path, '1')
+        cache_app, api_manager = self.register(cache)
+        with cache_app.app_context():
+            self.assertTrue(api_manager.get_cfg('orders').fields ==
+                            {'id', 'order_no', 'client_id'})
+
+
+class TestETag(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        class VersionConfig(APIConfig):
+            def _get_version_column(self):
+                return 'id'
+
+        super(TestETag, cls).setUpClass()
+        api_manager = APIManager(app, db, methods=['GET', 'PUT'])
+        api_manager.register_api(TestAPI.Order, cfg_class=VersionConfig)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client, cfg_class=VersionConfig)
+
+    def test_version_column(self):
         with self.client as c:
-            rv = c.delete(self.get_url('/products/1'),
-                          headers=self.get_headers())
-            self.assertTrue(rv.status_code == 404)
+            # the version is only read for conditional requests
+            with self.count_queries() as statements:
+                rv = c.get(self.get_url('/clients'),
+                           headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+            self.assertTrue(not any('sum(' in s for s in statements))
+
+            headers = self.get_headers()
+            headers['If-None-Match'] = rv.headers['ETag']
+            rv = c.get(self.get_url('/clients'), headers=headers)
+            self.assertTrue(rv.status_code == 200)
+            etag = rv.headers['ETag']
+
+            headers['If-None-Match'] = etag
+            with self.count_queries() as statements:
+                rv = c.get(self.get_url('/clients'), headers=headers)
+            self.assertTrue(rv.status_code == 304)
+            self.assertTrue(rv.data == b'')
+            self.assertTrue(rv.headers['ETag'] == etag)
+            self.assertTrue(len(statements) == 1)
+            self.assertTrue('sum(' in statements[0])
+
+            # the filter is part of the ETag
+            rv = c.get(self.get_url('/clients'), headers=headers,
+                       query_string={'filter': 'email:ford@hh.net'})
+            self.assertTrue(rv.status_code == 200)
+
+            db.session.add(TestAPI.Client(full_name='Zaphod'))
+            db.session.commit()
+            rv = c.get(self.get_url('/clients'), headers=headers)
+            self.assertTrue(rv.status_code == 200)
+            self.assertTrue(rv.headers['ETag'] != etag)
+
+    def test_to_many_links(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/orders/1'), headers=self.get_headers())
+            headers = self.get_headers()
+            headers['If-None-Match'] = rv.headers['ETag']
+            with self.count_queries() as statements:
+                rv = c.get(self.get_url('/orders/1'), headers=headers)
+            self.assertTrue(rv.status_code == 304)
+            self.assertTrue(not any('sum(' in s for s in statements))
+
+            # moving an order item changes the links but not the order
+            order_item = TestAPI.OrderItem.query.get(2)
+            order_item.order_id = 2
+            db.session.commit()
+            rv = c.get(self.get_url('/orders/1'), headers=headers)
+            self.assertTrue(rv.status_code == 200)
+            self.assertTrue(rv.headers['ETag'] != headers['If-None-Match'])
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['order']['links']['order_items'] == [1])
+
+    def test_version_column_not_found(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/clients/1,7'),
+                       headers=self.get_headers())
+            self.assertTrue(rv.status_code == 404)
+
+    def test_body_hash(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/orders/1'), headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+            etag = rv.headers['ETag']
+
+            headers = self.get_headers()
+            headers['If-None-Match'] = etag
+            rv = c.get(self.get_url('/orders/1'), headers=headers)
+            self.assertTrue(rv.status_code == 304)
+            self.assertTrue(rv.data == b'')
+
+            p_json = {'order': {'order_no': '42'}}
+            rv = c.put(self.get_url('/orders/1'), data=json.dumps(p_json),
+                       headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+            rv = c.get(self.get_url('/orders/1'), headers=headers)
+            self.assertTrue(rv.status_code == 200)
+
+
+class TestResponseCache(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        class ClientCacheConfig(APIConfig):
+            client_cache = ResponseCache()
+
+            def _get_response_cache(self):
+                return self.client_cache
+
+        super(TestResponseCache, cls).setUpClass()
+        api_manager = APIManager(app, db, response_cache=ResponseCache(),
+                                 methods=['GET', 'PUT', 'DELETE'])
+        api_manager.register_api(TestAPI.Order)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client, cfg_class=ClientCacheConfig)
+        api_manager.register_api(TestAPI.Product)
+        cls.api_manager = api_manager
+        cls.client_cache = ClientCacheConfig.client_cache
+
+    def setUp(self):
+        super(TestResponseCache, self).setUp()
+        self.api_manager.response_cache.clear()
+        self.client_cache.clear()
+
+    def get(self, c, url, **kwargs):
+        with self.count_queries() as statements:
+            rv = c.get(self.get_url(url), headers=self.get_headers(),
+                       query_string=kwargs)
+        self.assertTrue(rv.status_code == 200)
+        return json.loads(rv.data.decode(encoding='UTF-8')), len(statements)
+
+    def test_cached(self):
+        with self.client as c:
+            j, num_statements = self.get(c, '/orders', include='order_items')
+            self.assertTrue(num_statements > 0)
+            j_cached, num_statements = self.get(c, '/orders',
+                                                include='order_items')
+            self.assertTrue(num_statements == 0)
+            self.assertTrue(j == j_cached)
+
+            # other parameters are cached separately
+            _, num_statements = self.get(c, '/orders')
+            self.assertTrue(num_statements > 0)
+
+    def test_not_modified(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/clients'), headers=self.get_headers())
+            headers = self.get_headers()
+            headers['If-None-Match'] = rv.headers['ETag']
+            with self.count_queries() as statements:
+                rv = c.get(self.get_url('/clients'), headers=headers)
+            self.assertTrue(rv.status_code == 304)
+            self.assertTrue(len(statements) == 0)
+
+    def test_invalidate_cascade(self):
+        with self.client as c:
+            self.get(c, '/orders', include='order_items')
+            self.get(c, '/clients')
+
+            p_json = {'order_item': {'amount': 5}}
+            rv = c.put(self.get_url('/order_items/1'), data=json.dumps(p_json),
+                       headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+
+            # orders side-load order items
+            j, num_statements = self.get(c, '/orders', include='order_items')
+            self.assertTrue(num_statements > 0)
+            self.assertTrue(j['linked']['order_items'][0]['amount'] == 5)
+
+            # clients are not related to order items
+            _, num_statements = self.get(c, '/clients')
+            self.assertTrue(num_statements == 0)
+
+    def test_invalidate_links(self):
+        with self.client as c:
+            j, _ = self.get(c, '/orders/1')
+            self.assertTrue(j['order']['links']['order_items'] == [1, 2])
+
+            rv = c.delete(self.get_url('/order_items/2'),
+                          headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+
+            j, _ = self.get(c, '/orders/1')
+            self.assertTrue(j['order']['links']['order_items'] == [1])
+
+    def test_invalidate_config_cache(self):
+        with self.client as c:
+            self.get(c, '/orders')
+            j, _ = self.get(c, '/clients/1')
+            self.assertTrue(self.api_manager._response_caches ==
+                            {self.api_manager.response_cache,
+                             self.client_cache})
+
+            p_json = {'client': {'full_name': 'Zaphod'}}
+            rv = c.put(self.get_url('/clients/1'), data=json.dumps(p_json),
+                       headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+
+            j, num_statements = self.get(c, '/clients/1')
+            self.assertTrue(num_statements > 0)
+            self.assertTrue(j['client']['full_name'] == 'Zaphod')
+
+    def test_generation(self):
+        cache = ResponseCache()
+        generation = cache.generation
+        cache.invalidate(['order'])
+        cache.set('key', 'stale', ['order'], generation)
+        self.assertTrue(cache.get('key') is None)
+        cache.set('key', 'fresh', ['order'], cache.generation)
+        self.assertTrue(cache.get('key') == 'fresh')
+
+    def test_ttl_lru(self):
+        now = [0]
+        cache = ResponseCache(max_size=2, ttl=10, timer=lambda: now[0])
+        cache.set('a', 1, ['order'], cache.generation)
+        cache.set('b', 2, ['order'], cache.generation)
+        self.assertTrue(cache.get('a') == 1)
+        cache.set('c', 3, ['order'], cache.generation)
+        self.assertTrue(cache.get('b') is None)
+        self.assertTrue(cache.get('a') == 1)
+        now[0] = 11
+        self.assertTrue(cache.get('a') is None)
+
+
+class TestStreaming(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestStreaming, cls).setUpClass()
+        api_manager = APIManager(app, db, stream_chunk_size=2)
+        api_manager.register_api(TestAPI.Order)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client)
+        api_manager.register_api(TestAPI.Product)
+
+    def test_stream(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/order_items'),
+                       headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+            self.assertTrue('Content-Length' not in rv.headers)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue([i['id'] for i in j['order_items']] == [1, 2, 3])
+            self.assertTrue(j['order_items'][0]['links']['order'] == 1)
+
+    def test_stream_include_meta(self):
+        with self.client as c:
+            # includes are not streamed
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers(),
+                       query_string={'include': 'order_items',
+                                     'page': 1, 'per_page': 2})
+            self.assertTrue(rv.status_code == 200)
+            self.assertTrue('Content-Length' in rv.headers)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(len(j['orders']) == 2)
+            self.assertTrue(j['orders'][0]['links']['order_items'] == [1, 2])
+            self.assertTrue(len(j['linked']['order_items']) == 3)
+            self.assertTrue(j['meta']['no_pages'] == 1)
+
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers(),
+                       query_string={'page': 2, 'per_page': 2})
+            self.assertTrue(rv.status_code == 404)
+
+    def test_stream_empty(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/clients'), headers=self.get_headers(),
+                       query_string={'filter': 'email:doesnotexist'})
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j == {'clients': []})
+
+    def test_not_streamed_dialect(self):
+        dialect = db.engine.dialect
+        name = dialect.name
+        # MySQL can't read the links while the page is read
+        dialect.name = 'mysql'
+        try:
+            with self.client as c:
+                rv = c.get(self.get_url('/order_items'),
+                           headers=self.get_headers())
+        finally:
+            dialect.name = name
+        self.assertTrue(rv.status_code == 200)
+        self.assertTrue('Content-Length' in rv.headers)
+        j = json.loads(rv.data.decode(encoding='UTF-8'))
+        self.assertTrue([i['id'] for i in j['order_items']] == [1, 2, 3])
+
+    def test_not_streamed(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/orders/1'), headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['order']['id'] == 1)
+
+
+class TestKeysetPagination(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestKeysetPagination, cls).setUpClass()
+        api_manager = APIManager(app, db)
+        api_manager.register_api(TestAPI.Order)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Product)
+        api_manager.register_api(TestAPI.Book)
+
+    def test_keyset(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers(),
+                       query_string={'page[after]': '', 'per_page': 1})
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(len(j['orders']) == 1)
+            self.assertTrue(j['orders'][0]['id'] == 1)
+            self.assertTrue(j['meta']['prev'] is None)
+            self.assertTrue('no_pages' not in j['meta'])
+
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers(),
+                       query_string={'page[after]': j['meta']['next'],
+                                     'per_page': 1})
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['orders'][0]['id'] == 2)
+            self.assertTrue(j['meta']['next'] is None)
+
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers(),
+                       query_string={'page[before]': j['meta']['prev'],
+                                     'per_page': 1})
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['orders'][0]['id'] == 1)
+            self.assertTrue(j['meta']['prev'] is None)
+
+    def test_keyset_sort(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/order_items'),
+                       headers=self.get_headers(),
+                       query_string={'sort': '-amount', 'page[after]': '',
+                                     'per_page': 2})
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue([i['id'] for i in j['order_items']] == [2, 3])
+
+            rv = c.get(self.get_url('/order_items'),
+                       headers=self.get_headers(),
+                       query_string={'sort': '-amount',
+                                     'page[after]': j['meta']['next'],
+                                     'per_page': 2})
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue([i['id'] for i in j['order_items']] == [1])
+            self.assertTrue(j['meta']['next'] is None)
+
+            # cursor built for another sort is rejected
+            rv = c.get(self.get_url('/order_items'),
+                       headers=self.get_headers(),
+                       query_string={'page[before]': j['meta']['prev']})
+            self.assertTrue(rv.status_code == 400)
+
+    def test_keyset_numeric(self):
+        db.session.add_all([
+            TestAPI.Book(title='Dune', price=decimal.Decimal('9.99')),
+            TestAPI.Book(title='Emma', price=decimal.Decimal('4.50')),
+            TestAPI.Book(title='Ulysses', price=decimal.Decimal('12.00'))])
+        db.session.commit()
+        with self.client as c:
+            titles = []
+            meta = {'next': ''}
+            while meta['next'] is not None:
+                rv = c.get(self.get_url('/books'),
+                           headers=self.get_headers(),
+                           query_string={'sort': 'price',
+                                         'page[after]': meta['next'],
+                                         'per_page': 1})
+                self.assertTrue(rv.status_code == 200)
+                j = json.loads(rv.data.decode(encoding='UTF-8'))
+                titles.extend(b['title'] for b in j['books'])
+                meta = j['meta']
+            self.assertTrue(titles == ['Emma', 'Dune', 'Ulysses'])
+
+    def test_keyset_time(self):
+        value = datetime.time(13, 45, 30, 250)
+        cursor = parsers.encode_cursor(['opens'], [value])
+        keys, values = parsers.decode_cursor(cursor)
+        self.assertTrue(Pager._cursor_value(
+            db.Column('opens', db.Time), values[0]) == value)
+
+    def test_keyset_not_encodable(self):
+        TestAPI.Product.query.get(1).image = b'\x89PNG'
+        db.session.commit()
+        with self.client as c:
+            rv = c.get(self.get_url('/products'), headers=self.get_headers(),
+                       query_string={'sort': 'image', 'page[after]': ''})
+            self.assertTrue(rv.status_code == 400)
+
+            cursor = parsers.encode_cursor(['price', 'id'], ['abc', 1])
+            rv = c.get(self.get_url('/books'), headers=self.get_headers(),
+                       query_string={'sort': 'price', 'page[after]': cursor})
+            self.assertTrue(rv.status_code == 400)
+
+    def test_keyset_nulls(self):
+        db.session.add_all([TestAPI.OrderItem(order_id=1),
+                            TestAPI.OrderItem(order_id=2, amount=2),
+                            TestAPI.OrderItem(order_id=2)])
+        db.session.commit()
+
+        def get_page(sort, param, cursor):
+            rv = c.get(self.get_url('/order_items'),
+                       headers=self.get_headers(),
+                       query_string={'sort': sort, param: cursor,
+                                     'per_page': 1})
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            return j['order_items'][0]['id'], j['meta']
+
+        def page_through(sort, ids):
+            rv_ids = []
+            meta = {'next': ''}
+            while meta['next'] is not None:
+                item_id, meta = get_page(sort, 'page[after]', meta['next'])
+                rv_ids.append(item_id)
+            self.assertTrue(rv_ids == ids)
+
+            rv_ids = []
+            while meta['prev'] is not None:
+                item_id, meta = get_page(sort, 'page[before]', meta['prev'])
+                rv_ids.append(item_id)
+            self.assertTrue(rv_ids == ids[-2::-1])
+
+        with self.client as c:
+            page_through('amount', [1, 2, 3, 5, 4, 6])
+            page_through('-amount', [4, 6, 2, 3, 5, 1])
+
+    def test_keyset_invalid(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers(),
+                       query_string={'page[after]': 'abc'})
+            self.assertTrue(rv.status_code == 400)
+
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers(),
+                       query_string={'page[after]': '', 'page': 1})
+            self.assertTrue(rv.status_code == 400)
+
+
+class TestBulkPost(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestBulkPost, cls).setUpClass()
+        api_manager = APIManager(app, db)
+        api_manager.register_api(TestAPI.Order, methods=['GET', 'POST'])
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client)
+
+    def test_post_list(self):
+        p_json = {
+            'orders': [
+                {'order_no': '3', 'links': {'client': 2, 'order_items': [3]}},
+                {'order_no': '4', 'links': {'client': 2}},
+                {'order_no': '5', 'links': {'client': 3}},
+            ]
+        }
+
+        with self.client as c:
+            with self.count_queries() as statements:
+                rv = c.post(self.get_url('/orders'), data=json.dumps(p_json),
+                            headers=self.get_headers())
+            self.assertTrue(rv.status_code == 201)
+            self.assertTrue('Location' not in rv.headers)
+            clients = [st for st in statements if 'FROM client' in st]
+            self.assertTrue(len(clients) == 1)
+
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue([o['order_no'] for o in j['orders']] ==
+                            ['3', '4', '5'])
+            self.assertTrue(j['orders'][0]['links']['order_items'] == [3])
+            self.assertTrue(j['orders'][2]['links']['client'] == 3)
+            self.assertTrue(j['meta']['urls'] ==
+                            ['/orders/%s' % i for i in (3, 4, 5)])
+
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers())
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(len(j['orders']) == 5)
+
+    def test_post_list_not_found(self):
+        p_json = {
+            'orders': [
+                {'order_no': '3', 'links': {'client': 7}},
+                {'order_no': '4', 'links': {'order_items': [1, 9]}},
+            ]
+        }
+
+        with self.client as c:
+            rv = c.post(self.get_url('/orders'), data=json.dumps(p_json),
+                        headers=self.get_headers())
+            self.assertTrue(rv.status_code == 404)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            detail = j['errors'][0]['detail']
+            self.assertTrue('client/7' in detail)
+            self.assertTrue('order_item/9' in detail)
+
+            rv = c.get(self.get_url('/orders'), headers=self.get_headers())
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(len(j['orders']) == 2)
+
+    def test_post_list_invalid(self):
+        with self.client as c:
+            rv = c.post(self.get_url('/orders'),
+                        data=json.dumps({'orders': [1, 2]}),
+                        headers=self.get_headers())
+            self.assertTrue(rv.status_code == 400)
+
+            rv = c.post(self.get_url('/orders'),
+                        data=json.dumps({'orders': []}),
+                        headers=self.get_headers())
+            self.assertTrue(rv.status_code == 400)
+
+
+class TestLinkResolution(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestLinkResolution, cls).setUpClass()
+        api_manager = APIManager(app, db)
+        api_manager.register_api(TestAPI.Order, methods=['GET', 'POST', 'PUT'],
+                                 max_per_page=20)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client)
+
+    def test_post_many_links(self):
+        items = [TestAPI.OrderItem(amount=i) for i in range(200)]
+        db.session.add_all(items)
+        db.session.commit()
+        item_ids = [item.id for item in items]
+        db.session.expire_all()
+
+        p_json = {'order': {'order_no': '3',
+                            'links': {'client': 2, 'order_items': item_ids}}}
+        with self.client as c:
+            with self.count_queries() as statements:
+                rv = c.post(self.get_url('/orders'), data=json.dumps(p_json),
+                            headers=self.get_headers())
+            self.assertTrue(rv.status_code == 201)
+            selects = [st for st in statements if st.startswith('SELECT')]
+            self.assertTrue(len([st for st in selects
+                                 if 'FROM order_item' in st]) == 1)
+            self.assertTrue(len([st for st in selects
+                                 if 'FROM client' in st]) == 1)
+            self.assertTrue(not [st for st in selects if 'count(' in st])
+
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['order']['links']['order_items'] == item_ids)
+            self.assertTrue(j['order']['links']['client'] == 2)
+
+    def test_identity_map(self):
+        client = db.session.get(TestAPI.Client, 3)
+        self.assertTrue(client.full_name == 'Marvin')
+
+        p_json = {'order': {'order_no': '3', 'links': {'client': 3}}}
+        with self.client as c:
+            with self.count_queries() as statements:
+                rv = c.post(self.get_url('/orders'), data=json.dumps(p_json),
+                            headers=self.get_headers())
+            self.assertTrue(rv.status_code == 201)
+            self.assertTrue(not [st for st in statements
+                                 if 'FROM client' in st])
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['order']['links']['client'] == 3)
+
+    def test_links_not_found(self):
+        p_json = {'order': {'order_no': '3',
+                            'links': {'client': 7,
+                                      'order_items': [1, 8, 9]}}}
+        with self.client as c:
+            rv = c.put(self.get_url('/orders/1'), data=json.dumps(p_json),
+                       headers=self.get_headers())
+            self.assertTrue(rv.status_code == 404)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            detail = j['errors'][0]['detail']
+            self.assertTrue('client/7' in detail)
+            self.assertTrue('order_item/8' in detail)
+            self.assertTrue('order_item/9' in detail)
+            self.assertTrue('order_item/1,' not in detail)
+
+
+class TestFilteredRelationship(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestFilteredRelationship, cls).setUpClass()
+        cls.api_manager = APIManager(app, db,
+                                     methods=['GET', 'POST', 'PUT', 'DELETE'])
+        cls.api_manager.register_api(TestAPI.Shelf)
+        cls.api_manager.register_api(TestAPI.Book)
+
+    def load_data(self):
+        super(TestFilteredRelationship, self).load_data()
+        db.session.add_all([
+            TestAPI.Shelf(id=1, name='Fiction'),
+            TestAPI.Book(title='Dune', active=True, shelf_id=1),
+            TestAPI.Book(title='Emma', active=False, shelf_id=1)])
+        db.session.commit()
+
+    def test_filtered_relationship_keys(self):
+        cfg = self.api_manager.get_cfg('shelves')
+        self.assertTrue('active_books' not in cfg.relationship_keys)
+
+    def test_get_filtered_links(self):
+        with self.client as c:
+            for url in ('/shelves/1', '/shelves'):
+                rv = c.get(self.get_url(url), headers=self.get_headers())
+                self.assertTrue(rv.status_code == 200)
+                j = json.loads(rv.data.decode(encoding='UTF-8'))
+                shelf = j.get('shelf') or j['shelves'][0]
+                self.assertTrue(shelf['links']['active_books'] == [1])
+
+    def shelf_ids(self):
+        return [book.shelf_id for book in
+                TestAPI.Book.query.order_by(TestAPI.Book.id)]
+
+    def test_replace_filtered_links(self):
+        with self.client as c:
+            rv = c.put(self.get_url('/shelves/1/links/active_books'),
+                       data=json.dumps({'active_books': [1]}),
+                       headers=self.get_headers())
+            self.assertTrue(rv.status_code == 204)
+            # the inactive book isn't a link and keeps its shelf
+            self.assertTrue(self.shelf_ids() == [1, 1])
+
+    def test_replace_view_only_links(self):
+        with self.client as c:
+            rv = c.put(self.get_url('/shelves/1/links/books'),
+                       data=json.dumps({'books': [1]}),
+                       headers=self.get_headers())
+            self.assertTrue(rv.status_code == 204)
+            self.assertTrue(self.shelf_ids() == [1, 1])
+
+
+class TestLinkRequests(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestLinkRequests, cls).setUpClass()
+        api_manager = APIManager(app, db,
+                                 methods=['GET', 'POST', 'PUT', 'DELETE'])
+        api_manager.register_api(TestAPI.Order)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client)
+        api_manager.register_api(TestAPI.Product)
+        api_manager.register_api(TestAPI.Tag)
+
+    def get_links(self, c, url):
+        rv = c.get(self.get_url(url), headers=self.get_headers())
+        j = json.loads(rv.data.decode(encoding='UTF-8'))
+        return list(j.values())[0]['links']
+
+    def tag_products(self):
+        table = db.metadata.tables['product_tag']
+        return sorted(row.product_id for row in db.session.execute(
+            table.select().where(table.c.tag_id == 1)))
+
+    def test_add_one_to_many(self):
+        with self.client as c:
+            with self.count_queries() as statements:
+                rv = c.post(self.get_url('/orders/2/links/order_items'),
+                            data=json.dumps({'order_items': [1]}),
+                            headers=self.get_headers())
+            self.assertTrue(rv.status_code == 204)
+            # the order items are not loaded
+            self.assertTrue(not [st for st in statements
+                                 if 'order_item.amount' in st])
+            self.assertTrue(
+                self.get_links(c, '/orders/2')['order_items'] == [1, 3])
+            self.assertTrue(
+                self.get_links(c, '/orders/1')['order_items'] == [2])
+
+    def test_remove_one_to_many(self):
+        with self.client as c:
+            rv = c.delete(self.get_url('/orders/1/links/order_items/2'),
+                          headers=self.get_headers())
+            self.assertTrue(rv.status_code == 204)
+            self.assertTrue(
+                self.get_links(c, '/orders/1')['order_items'] == [1])
+            self.assertTrue(
+                self.get_links(c, '/order_items/2')['order'] is None)
+
+            rv = c.delete(self.get_url('/orders/1/links/order_items'),
+                          headers=self.get_headers())
+            self.assertTrue(rv.status_code == 400)
+
+    def test_replace_one_to_many(self):
+        with self.client as c:
+            rv = c.put(self.get_url('/orders/1/links/order_items'),
+                       data=json.dumps({'order_items': [2, 3]}),
+                       headers=self.get_headers())
+            self.assertTrue(rv.status_code == 204)
+            self.assertTrue(
+                self.get_links(c, '/orders/1')['order_items'] == [2, 3])
+            self.assertTrue(
+                self.get_links(c, '/orders/2')['order_items'] == [])
+
+    def test_put_replaces_links(self):
+        p_json = {'order': {'order_no': '7',
+                            'links': {'order_items': [2, 3]}}}
+        with self.client as c:
+            with self.count_queries() as statements:
+                rv = c.put(self.get_url('/orders/1'), data=json.dumps(p_json),
+                           headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+            self.assertTrue(not [st for st in statements
+                                 if 'order_item.amount' in st])
+            updates = [st for st in statements
+                       if st.startswith('UPDATE order_item')]
+            # item 1 is unlinked and item 3 linked
+            self.assertTrue(len(updates) == 2)
+
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['order']['order_no'] == '7')
+            self.assertTrue(j['order']['links']['order_items'] == [2, 3])
+            self.assertTrue(
+                self.get_links(c, '/orders/2')['order_items'] == [])
+
+    def test_many_to_many(self):
+        db.session.add(TestAPI.Tag(name='Fresh'))
+        db.session.commit()
+
+        with self.client as c:
+            for link_ids in ([1, 2], [2]):
+                with self.count_queries() as statements:
+                    rv = c.post(self.get_url('/tags/1/links/products'),
+                                data=json.dumps({'products': link_ids}),
+                                headers=self.get_headers())
+                self.assertTrue(rv.status_code == 204)
+                self.assertTrue(not [st for st in statements
+                                     if 'product.name' in st])
+            # the existing link is not inserted twice
+            self.assertTrue(len([st for st in statements
+                                 if st.startswith('INSERT')]) == 0)
+            self.assertTrue(self.tag_products() == [1, 2])
+
+            rv = c.delete(self.get_url('/tags/1/links/products/1'),
+                          headers=self.get_headers())
+            self.assertTrue(rv.status_code == 204)
+            self.assertTrue(self.tag_products() == [2])
+
+            rv = c.put(self.get_url('/tags/1/links/products'),
+                       data=json.dumps({'products': [1]}),
+                       headers=self.get_headers())
+            self.assertTrue(rv.status_code == 204)
+            self.assertTrue(self.tag_products() == [1])
+
+    def test_not_found(self):
+        with self.client as c:
+            rv = c.post(self.get_url('/orders/1/links/order_items'),
+                        data=json.dumps({'order_items': [3, 9]}),
+                        headers=self.get_headers())
+            self.assertTrue(rv.status_code == 404)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue('order_item/9' in j['errors'][0]['detail'])
+            self.assertTrue(
+                self.get_links(c, '/orders/1')['order_items'] == [1, 2])
+
+            rv = c.post(self.get_url('/orders/9/links/order_items'),
+                        data=json.dumps({'order_items': [3]}),
+                        headers=self.get_headers())
+            self.assertTrue(rv.status_code == 404)
+
+    def test_to_one(self):
+        with self.client as c:
+            rv = c.put(self.get_url('/orders/1/links/client'),
+                       data=json.dumps({'client': 3}),
+                       headers=self.get_headers())
+            self.assertTrue(rv.status_code == 204)
+            self.assertTrue(self.get_links(c, '/orders/1')['client'] == 3)
+
+            rv = c.delete(self.get_url('/orders/1/links/client'),
+                          headers=self.get_headers())
+            self.assertTrue(rv.status_code == 204)
+            self.assertTrue(self.get_links(c, '/orders/1')['client'] is None)
+
+            rv = c.post(self.get_url('/orders/1/links/client'),
+                        data=json.dumps({'client': 3}),
+                        headers=self.get_headers())
+            self.assertTrue(rv.status_code == 400)
+
+
+class TestBulkPut(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        class MappingsConfig(APIConfig):
+            @staticmethod
+            def _get_bulk_update_mappings():
+                return True
+
+        super(TestBulkPut, cls).setUpClass()
+        api_manager = APIManager(app, db, methods=['GET', 'PUT'])
+        api_manager.register_api(TestAPI.Order)
+        api_manager.register_api(TestAPI.OrderItem,
+                                 cfg_class=MappingsConfig)
+        api_manager.register_api(TestAPI.Client)
+        api_manager.register_api(TestAPI.Product)
+
+    def put(self, c, url, p_json):
+        with self.count_queries() as statements:
+            rv = c.put(self.get_url(url), data=json.dumps(p_json),
+                       headers=self.get_headers())
+        return rv, statements
+
+    def test_put_ids(self):
+        p_json = {'orders': [{'order_no': 'A', 'links': {'client': 2}},
+                             {'order_no': 'B'}]}
+        with self.client as c:
+            rv, statements = self.put(c, '/orders/1,2', p_json)
+            self.assertTrue(rv.status_code == 200)
+            selects = [st for st in statements
+                       if st.startswith('SELECT') and 'FROM "order"' in st]
+            # the response is built from the orders loaded for the update
+            self.assertTrue(len(selects) == 1)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue([o['order_no'] for o in j['orders']] ==
+                            ['A', 'B'])
+            self.assertTrue(j['orders'][0]['links']['client'] == 2)
+            self.assertTrue(j['meta']['urls'] == ['/orders/1', '/orders/2'])
+
+    def test_put_collection(self):
+        p_json = {'orders': [{'id': 2, 'order_no': 'B'},
+                             {'id': 1, 'order_no': 'A'}]}
+        with self.client as c:
+            rv, _ = self.put(c, '/orders', p_json)
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue([(o['id'], o['order_no']) for o in j['orders']] ==
+                            [(2, 'B'), (1, 'A')])
+
+            rv = c.get(self.get_url('/orders/1'), headers=self.get_headers())
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['order']['order_no'] == 'A')
+
+    def test_put_mappings(self):
+        p_json = {'order_items': [{'id': 1, 'amount': 10},
+                                  {'id': 3, 'amount': 30}]}
+        with self.client as c:
+            rv, statements = self.put(c, '/order_items', p_json)
+            self.assertTrue(rv.status_code == 200)
+            updates = [st for st in statements if st.startswith('UPDATE')]
+            self.assertTrue(len(updates) == 1)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue([o['amount'] for o in j['order_items']] ==
+                            [10, 30])
+
+    def test_put_not_found(self):
+        p_json = {'order_items': [{'id': 1, 'amount': 10},
+                                  {'id': 8, 'amount': 30}]}
+        with self.client as c:
+            rv, _ = self.put(c, '/order_items', p_json)
+            self.assertTrue(rv.status_code == 404)
+
+            p_json = {'orders': [{'id': 1}, {'id': 9}]}
+            rv, _ = self.put(c, '/orders', p_json)
+            self.assertTrue(rv.status_code == 404)
+
+    def test_put_mismatch(self):
+        with self.client as c:
+            rv, _ = self.put(c, '/orders/1,2',
+                             {'orders': [{'order_no': 'A'}]})
+            self.assertTrue(rv.status_code == 400)
+            rv, _ = self.put(c, '/orders/1,2',
+                             {'orders': [{'id': 1}, {'id': 3}]})
+            self.assertTrue(rv.status_code == 400)
+            rv, _ = self.put(c, '/orders', {'orders': [{'order_no': 'A'}]})
+            self.assertTrue(rv.status_code == 400)
+            rv, _ = self.put(c, '/orders', {'order': {'order_no': 'A'}})
+            self.assertTrue(rv.status_code == 400)
+            rv, _ = self.put(c, '/orders', {'orders': []})
+            self.assertTrue(rv.status_code == 400)
+
+    def test_put_invalid_ids(self):
+        with self.client as c:
+            for ident in ('abc', [1], {'id': 1}, True, 1.5):
+                rv, _ = self.put(c, '/orders',
+                                 {'orders': [{'id': ident}]})
+                self.assertTrue(rv.status_code == 400)
+                rv, _ = self.put(c, '/order_items',
+                                 {'order_items': [{'id': ident}]})
+                self.assertTrue(rv.status_code == 400)
+
+    def test_put_string_ids(self):
+        with self.client as c:
+            rv, statements = self.put(c, '/order_items', {
+                'order_items': [{'id': '1', 'amount': 10},
+                                {'id': '03', 'amount': 30}]})
+            self.assertTrue(rv.status_code == 200)
+            self.assertTrue(len([st for st in statements
+                                 if st.startswith('UPDATE')]) == 1)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue([(o['id'], o['amount'])
+                             for o in j['order_items']] == [(1, 10), (3, 30)])
+
+            rv, _ = self.put(c, '/orders/2', {'orders': [{'id': '2'}]})
+            self.assertTrue(rv.status_code == 200)
+
+
+class TestReturnMinimal(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        class MinimalConfig(APIConfig):
+            @staticmethod
+            def _get_return_minimal():
+                return True
+
+        super(TestReturnMinimal, cls).setUpClass()
+        api_manager = APIManager(app, db, methods=['GET', 'POST', 'PUT'])
+        api_manager.register_api(TestAPI.Order)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client, cfg_class=MinimalConfig)
+
+    def send(self, method, c, url, p_json, prefer=None):
+        headers = self.get_headers()
+        if prefer:
+            headers['Prefer'] = prefer
+        with self.count_queries() as statements:
+            rv = getattr(c, method)(self.get_url(url),
+                                    data=json.dumps(p_json), headers=headers)
+        return rv, statements
+
+    def test_post_minimal(self):
+        with self.client as c:
+            rv, statements = self.send('post', c, '/orders',
+                                       {'order': {'order_no': '3'}},
+                                       prefer='return=minimal')
+            self.assertTrue(rv.status_code == 201)
+            self.assertTrue(rv.data == b'')
+            self.assertTrue(rv.headers['Location'] == '/orders/3')
+            self.assertTrue(rv.headers['Preference-Applied'] ==
+                            'return=minimal')
+            self.assertTrue(len(statements) == 1)
+
+            rv, _ = self.send('post', c, '/orders',
+                              {'orders': [{'order_no': '4'},
+                                          {'order_no': '5'}]},
+                              prefer='return=minimal')
+            self.assertTrue(rv.status_code == 201)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j == {'meta': {'urls': ['/orders/4',
+                                                    '/orders/5']}})
+
+    def test_put_minimal(self):
+        with self.client as c:
+            rv, _ = self.send('put', c, '/orders/1',
+                              {'order': {'order_no': 'A'}},
+                              prefer='return=minimal')
+            self.assertTrue(rv.status_code == 204)
+            self.assertTrue(rv.data == b'')
+
+    def test_config_default(self):
+        with self.client as c:
+            rv, _ = self.send('put', c, '/clients/1',
+                              {'client': {'full_name': 'A'}})
+            self.assertTrue(rv.status_code == 204)
+
+            rv, _ = self.send('put', c, '/clients/1',
+                              {'client': {'full_name': 'B'}},
+                              prefer='return=representation')
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['client']['full_name'] == 'B')
+
+    def test_representation_from_session(self):
+        with self.client as c:
+            rv, statements = self.send('post', c, '/orders',
+                                       {'order': {'order_no': '3',
+                                                  'links': {'client': 1}}})
+            self.assertTrue(rv.status_code == 201)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['order']['order_no'] == '3')
+            self.assertTrue(j['order']['links']['client'] == 1)
+            # the order isn't reloaded after the commit
+            selects = [st for st in statements
+                       if st.startswith('SELECT') and 'FROM "order"' in st]
+            self.assertTrue(len(selects) == 0)
+
+    def test_other_objects_expired(self):
+        with self.client as c:
+            rv = c.get(self.get_url('/order_items/1'),
+                       headers=self.get_headers())
+            db.session.query(TestAPI.OrderItem).filter_by(id=1).update(
+                {'amount': 9})
+            rv, _ = self.send('put', c, '/orders/2',
+                              {'order': {'order_no': 'B'}})
+            rv = c.get(self.get_url('/order_items/1'),
+                       headers=self.get_headers())
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['order_item']['amount'] == 9)
+
+
+class TestClone(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        class OrderTemplateProcess(RequestProcessor):
+            def _process(self):
+                template = self._request_json()['template']
+                order_id = self._clone(idents=[template],
+                                       fld_defaults={'order_no': 'copy'})[0]
+                self._clone(model_class=TestAPI.OrderItem,
+                            filter_by={'order_id': template},
+                            fld_defaults={'order_id': order_id})
+                self._commit()
+                self._resources.append(
+                    self._get_or_404(order_id, TestAPI.Order))
+
+        super(TestClone, cls).setUpClass()
+        api_manager = APIManager(app, db, methods=['GET', 'POST'])
+        api_manager.register_api(
+            TestAPI.Order, post_process=('action', OrderTemplateProcess))
+        api_manager.register_api(
+            TestAPI.OrderItem, excludes={'filter': ['amount']},
+            post_process=('action', ClonePostProcess))
+        api_manager.register_api(TestAPI.Product)
+
+    def post(self, c, url, p_json):
+        rv = c.post(self.get_url(url), data=json.dumps(p_json),
+                    headers=self.get_headers())
+        return rv, json.loads(rv.data.decode(encoding='UTF-8'))
+
+    def test_clone_in_custom_process(self):
+        with self.client as c:
+            with self.count_queries() as statements:
+                rv, j = self.post(c, '/orders', {
+                    'action': 'OrderTemplateProcess', 'template': 1})
+            self.assertTrue(rv.status_code == 201)
+            self.assertTrue(j['order']['id'] == 3)
+            self.assertTrue(j['order']['order_no'] == 'copy')
+            self.assertTrue(j['order']['links']['client'] == 1)
+            self.assertTrue(j['order']['links']['order_items'] == [4, 5])
+            inserts = [st for st in statements if st.startswith('INSERT')]
+            # SQLite has no RETURNING, one INSERT per row copied
+            self.assertTrue(len(inserts) == 3)
+            self.assertTrue(not any('SELECT' in st for st in inserts))
+
+            rv = c.get(self.get_url('/order_items/4,5'),
+                       headers=self.get_headers())
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue([i['amount'] for i in j['order_items']] == [1, 2])
+            self.assertTrue([i['links']['product'] for i in j['order_items']]
+                            == [1, 2])
+
+    def test_clone_action(self):
+        with self.client as c:
+            rv, j = self.post(c, '/order_items', {
+                'action': 'ClonePostProcess', 'filter': {'order': 1},
+                'order_item': {'amount': 7, 'links': {'order': 2}}})
+            self.assertTrue(rv.status_code == 201)
+            self.assertTrue([i['id'] for i in j['order_items']] == [4, 5])
+            self.assertTrue([i['amount'] for i in j['order_items']] == [7, 7])
+            self.assertTrue([i['links']['order'] for i in j['order_items']]
+                            == [2, 2])
+            self.assertTrue(j['meta']['urls'] ==
+                            ['/order_items/4', '/order_items/5'])
+
+            rv, j = self.post(c, '/order_items', {
+                'action': 'ClonePostProcess', 'ids': [3]})
+            self.assertTrue(rv.status_code == 201)
+            self.assertTrue(j['order_items'][0]['id'] == 6)
+            self.assertTrue(j['order_items'][0]['links']['product'] == 2)
+
+    def test_clone_action_invalid(self):
+        with self.client as c:
+            rv, j = self.post(c, '/order_items',
+                              {'action': 'ClonePostProcess'})
+            self.assertTrue(rv.status_code == 400)
+
+            rv, j = self.post(c, '/order_items', {
+                'action': 'ClonePostProcess', 'filter': {'amount': 1}})
+            self.assertTrue(rv.status_code == 400)
+
+            rv, j = self.post(c, '/order_items', {
+                'action': 'ClonePostProcess', 'ids': [1],
+                'order_item': {'links': {'order': [2]}}})
+            self.assertTrue(rv.status_code == 400)
+
+            rv, j = self.post(c, '/order_items', {
+                'action': 'ClonePostProcess', 'filter': {'order': {'id': 1}}})
+            self.assertTrue(rv.status_code == 400)
+
+            rv, j = self.post(c, '/order_items', {
+                'action': 'ClonePostProcess', 'filter': {'unknown': 1}})
+            self.assertTrue(rv.status_code == 400)
+
+            rv, j = self.post(c, '/order_items', {
+                'action': 'ClonePostProcess', 'ids': [1],
+                'order_item': {'links': {'order': 9}}})
+            self.assertTrue(rv.status_code == 404)
+            self.assertTrue('order/9' in j['errors'][0]['detail'])
+
+
+class TestPostRequest(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        class ClientPostProcess(RequestProcessor):
+            def _process(self):
+                self._resources.append(TestAPI.Client(full_name='Custom Post'))
+
+        super(TestPostRequest, cls).setUpClass()
+        api_manager = APIManager(app, db)
+        api_manager.register_api(TestAPI.Product,
+                                 methods=['GET', 'POST', 'PUT', 'DELETE'])
+        api_manager.register_api(TestAPI.ProductCategory)
+        api_manager.register_api(TestAPI.Order, methods=['GET', 'POST'])
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(
+            TestAPI.Client,
+            post_process=('action', ClientPostProcess),
+            methods=['POST'])
+
+    def test_post_one_to_one(self):
+        p_json = {
+            "product": {
+                "sku": "BEET",
+                "name": 'Beets',
+                "description": "Locally produced beets",
+                "price": 1.95,
+                "links": {'product_category': 2},
+            }
+        }
+
+        with self.client as c:
+            rv = c.post(self.get_url('/products'), data=json.dumps(p_json),
+                        headers=self.get_headers())
+            self.assertTrue(rv.status_code == 201)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['product']['sku'] == "BEET")
+            self.assertTrue(j['product']['links']['product_category'] == 2)
+            self.assertTrue(('Location',
+                             self.get_url('/products/3')) == rv.headers[2])
+
+        with self.client as c:
+            rv = c.get(self.get_url('/products/3'), headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+            self.assertTrue(j['product']['sku'] == "BEET")
+            self.assertTrue(j['product']['links']['product_category'] == 2)
+
+    def test_post_one_to_many(self):
+        p_json = {
+            "order": {
+                "order_no": "3",
+                "links": {'order_items': [1], 'client': None},
+                }
+        }
+
+        with self.client as c:
+            rv = c.post(self.get_url('/orders'), data=json.dumps(p_json),
+                        headers=self.get_headers())
+            self.assertTrue(rv.status_code == 201)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['order']['order_no'] == "3")
+            self.assertTrue(j['order']['links']['order_items'] == [1])
+            self.assertTrue(('Location',
+                             self.get_url('/orders/3')) == rv.headers[2])
+
+        with self.client as c:
+            rv = c.get(self.get_url('/orders/3'), headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+            self.assertTrue(j['order']['order_no'] == "3")
+            self.assertTrue(j['order']['links']['order_items'] == [1])
+
+    def test_custom_post(self):
+        p_json = {'action': 'ClientPostProcess'}
+
+        with self.client as c:
+            rv = c.post(self.get_url('/clients'), data=json.dumps(p_json),
+                        headers=self.get_headers())
+            self.assertTrue(rv.status_code == 201)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['client']['full_name'] == 'Custom Post')
+
+    def test_custom_post_does_not_macth(self):
+        p_json = {'action': 'PostProcess'}
+
+        with self.client as c:
+            rv = c.post(self.get_url('/clients'), data=json.dumps(p_json),
+                        headers=self.get_headers())
+            self.assertTrue(rv.status_code == 201)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertFalse(j['client']['full_name'] == 'Custom Post')
+
+
+class TestDeleteRequest(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestDeleteRequest, cls).setUpClass()
+        api_manager = APIManager(app, db)
+        api_manager.register_api(
+            TestAPI.Product,
+            methods=['GET', 'POST', 'PUT', 'DELETE'])
+
+    def test_delete(self):
+
+        with self.client as c:
+            rv = c.delete(self.get_url('/products/1'),
+                          headers=self.get_headers())
+            self.assertTrue(rv.status_code == 200)
+
+        with self.client as c:
+            rv = c.delete(self.get_url('/products/1'),
+                          headers=self.get_headers())
+            self.assertTrue(rv.status_code == 404)
+
+
+class TestSetDelete(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestSetDelete, cls).setUpClass()
+        api_manager = APIManager(app, db, methods=['GET', 'DELETE'])
+        api_manager.register_api(TestAPI.Order)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client)
+        cls.api_manager = api_manager
+
+    def delete(self, c, url, **kwargs):
+        with self.count_queries() as statements:
+            rv = c.delete(self.get_url(url), headers=self.get_headers(),
+                          query_string=kwargs)
+        return rv, statements
+
+    def get_ids(self, c, url):
+        rv = c.get(self.get_url(url), headers=self.get_headers())
+        j = json.loads(rv.data.decode(encoding='UTF-8'))
+        return [r['id'] for r in list(j.values())[0]]
+
+    def test_orm_delete(self):
+        self.assertTrue(self.api_manager.get_cfg('orders').orm_delete)
+        self.assertFalse(self.api_manager.get_cfg('order_items').orm_delete)
+        self.assertFalse(self.api_manager.get_cfg('clients').orm_delete)
+
+    def test_delete_ids(self):
+        with self.client as c:
+            rv, statements = self.delete(c, '/order_items/1,3')
+            self.assertTrue(rv.status_code == 200)
+            self.assertTrue(len(statements) == 2)
+            self.assertTrue(statements[0].startswith('SELECT'))
+            self.assertTrue(statements[1].startswith('DELETE'))
+            self.assertTrue(self.get_ids(c, '/order_items') == [2])
+
+    def test_delete_not_found(self):
+        with self.client as c:
+            rv, statements = self.delete(c, '/order_items/1,7')
+            self.assertTrue(rv.status_code == 404)
+            self.assertTrue(len(statements) == 1)
+            self.assertTrue(self.get_ids(c, '/order_items') == [1, 2, 3])
+
+    def test_delete_filter(self):
+        with self.client as c:
+            rv, statements = self.delete(c, '/clients',
+                                         filter='full_name:Marvin')
+            self.assertTrue(rv.status_code == 200)
+            self.assertTrue(len(statements) == 1)
+            self.assertTrue(self.get_ids(c, '/clients') == [1, 2])
+
+            rv, _ = self.delete(c, '/clients', filter='unknown:x')
+            self.assertTrue(rv.status_code == 400)
+            self.assertTrue(self.get_ids(c, '/clients') == [1, 2])
+
+            rv, _ = self.delete(c, '/clients')
+            self.assertTrue(rv.status_code == 400)
+
+    def test_delete_orm(self):
+        with self.client as c:
+            rv, _ = self.delete(c, '/orders/1')
+            self.assertTrue(rv.status_code == 200)
+            # the order items of the order are unlinked by the ORM
+            rv = c.get(self.get_url('/order_items/1'),
+                       headers=self.get_headers())
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['order_item']['links']['order'] is None)
+
+            rv, _ = self.delete(c, '/orders/1,2')
+            self.assertTrue(rv.status_code == 404)
+
+
+class TestPatchRequest(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestPatchRequest, cls).setUpClass()
+        api_manager = APIManager(app, db, methods=['GET', 'PATCH'])
+        api_manager.register_api(TestAPI.Order)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client)
+
+    def patch(self, c, url, p_json):
+        with self.count_queries() as statements:
+            rv = c.patch(self.get_url(url), data=json.dumps(p_json),
+                         headers=self.get_headers())
+        return rv, statements
+
+    def get(self, c, url):
+        rv = c.get(self.get_url(url), headers=self.get_headers())
+        return json.loads(rv.data.decode(encoding='UTF-8'))
+
+    def test_patch(self):
+        with self.client as c:
+            rv, statements = self.patch(c, '/order_items/1',
+                                        {'order_item': {'amount': 7}})
+            self.assertTrue(rv.status_code == 204)
+            self.assertTrue(rv.data == b'')
+            self.assertTrue(len(statements) == 1)
+            self.assertTrue(statements[0].startswith('UPDATE'))
+            j = self.get(c, '/order_items/1')
+            self.assertTrue(j['order_item']['amount'] == 7)
+            self.assertTrue(j['order_item']['links']['order'] == 1)
+
+    def test_patch_many(self):
+        with self.client as c:
+            rv, statements = self.patch(c, '/order_items/1,3',
+                                        {'order_item': {'amount': 9}})
+            self.assertTrue(rv.status_code == 204)
+            self.assertTrue(len(statements) == 1)
+            j = self.get(c, '/order_items')
+            self.assertTrue([i['amount'] for i in j['order_items']] ==
+                            [9, 2, 9])
+
+    def test_patch_same_id(self):
+        with self.client as c:
+            rv, _ = self.patch(c, '/order_items/1,01',
+                               {'order_item': {'amount': 7}})
+            self.assertTrue(rv.status_code == 204)
+            j = self.get(c, '/order_items/1')
+            self.assertTrue(j['order_item']['amount'] == 7)
+
+    def test_patch_not_found(self):
+        with self.client as c:
+            rv, _ = self.patch(c, '/order_items/7',
+                               {'order_item': {'amount': 7}})
+            self.assertTrue(rv.status_code == 404)
+
+            rv, _ = self.patch(c, '/order_items/1,7',
+                               {'order_item': {'amount': 7}})
+            self.assertTrue(rv.status_code == 404)
+            j = self.get(c, '/order_items/1')
+            self.assertTrue(j['order_item']['amount'] == 1)
+
+            rv, _ = self.patch(c, '/order_items/7', {'order_item': {}})
+            self.assertTrue(rv.status_code == 404)
+
+    def test_patch_links(self):
+        with self.client as c:
+            rv, _ = self.patch(c, '/order_items/1',
+                               {'order_item': {'amount': 4,
+                                               'links': {'order': 2}}})
+            self.assertTrue(rv.status_code == 204)
+            j = self.get(c, '/order_items/1')
+            self.assertTrue(j['order_item']['amount'] == 4)
+            self.assertTrue(j['order_item']['links']['order'] == 2)
+
+    def test_patch_invalid(self):
+        with self.client as c:
+            rv, _ = self.patch(c, '/order_items/1', {'amount': 4})
+            self.assertTrue(rv.status_code == 400)
+
+
+class TestFieldOps(TestAPI):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestFieldOps, cls).setUpClass()
+        api_manager = APIManager(app, db, methods=['GET', 'POST', 'PUT',
+                                                   'PATCH'])
+        api_manager.register_api(TestAPI.Order)
+        api_manager.register_api(TestAPI.OrderItem)
+        api_manager.register_api(TestAPI.Client)
+
+    def send(self, method, c, url, p_json):
+        with self.count_queries() as statements:
+            rv = getattr(c, method)(self.get_url(url),
+                                    data=json.dumps(p_json),
+                                    headers=self.get_headers())
+        return rv, statements
+
+    def get(self, c, url):
+        rv = c.get(self.get_url(url), headers=self.get_headers())
+        return json.loads(rv.data.decode(encoding='UTF-8'))
+
+    def test_patch_inc(self):
+        with self.client as c:
+            rv, statements = self.send('patch', c, '/order_items/1,2',
+                                       {'order_item':
+                                        {'amount': {'$inc': 5}}})
+            self.assertTrue(rv.status_code == 204)
+            self.assertTrue(len(statements) == 1)
+            self.assertTrue('amount=(coalesce(order_item.amount, ?) + ?)'
+                            in statements[0].replace(' = ', '='))
+            j = self.get(c, '/order_items')
+            self.assertTrue([i['amount'] for i in j['order_items']] ==
+                            [6, 7, 2])
+
+    def test_put_dec_append(self):
+        with self.client as c:
+            rv, _ = self.send('put', c, '/order_items/3',
+                              {'order_item': {'amount': {'$dec': 3}}})
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue(j['order_item']['amount'] == -1)
+
+            rv, _ = self.send('put', c, '/orders',
+                              {'orders': [{'id': 1,
+                                           'order_no': {'$append': '-A'}},
+                                          {'id': 2,
+                                           'order_no': {'$append': '-B'}}]})
+            self.assertTrue(rv.status_code == 200)
+            j = json.loads(rv.data.decode(encoding='UTF-8'))
+            self.assertTrue([o['order_no'] for o in j['orders']] ==
+                            ['1-A', '1-B'])
+
+    def test_invalid_ops(self):
+        with self.client as c:
+            for op in ({'$inc': 'x'}, {'$inc': True}, {'$append': 1},
+                       {'$mul': 2}):
+                rv, _ = self.send('patch', c, '/order_items/1',
+                                  {'order_item': {'amount': op}})
+                self.assertTrue(rv.status_code == 400)
+
+            rv, _ = self.send('patch', c, '/orders/1',
+                              {'order': {'order_no': {'$inc': 1}}})
+            self.assertTrue(rv.status_code == 400)
+
+            rv, _ = self.send('post', c, '/order_items',
+                              {'order_item': {'amount': {'$inc': 1}}})
+            self.assertTrue(rv.status_code == 400)
+
+            j = self.get(c, '/order_items')
+            self.assertTrue([i['amount'] for i in j['order_items']] ==
+                            [1, 2, 2])
 
 
 class TestPutRequest(TestAPI):
@@ -3,7 +3,9 @@ import unittest
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 
+from flask_resteasy.configs import APIConfig
 from flask_resteasy.manager import APIManager
+from flask_resteasy.errors import UnableToProcess
 
 db = SQLAlchemy()
 app = Flask(__name__)
@@ -32,3 +34,55 @@ class TestManager(unittest.TestCase):
         put_process = api_manager.get_put_process('testmodel')
         self.assertTrue(post_process == ('action', TestPostProcess))
         self.assertTrue(put_process == ('action', TestPutProcess))
+
+    def test_resource_spellings(self):
+
+        class OrderItem(db.Model):
+            __tablename__ = 'order_items'
+            id = db.Column('id', db.Integer, primary_key=True)
+
+        class ItemPostProcess(object):
+            pass
+
+        test_app = Flask(__name__)
+        api_manager = APIManager(
+            app=test_app, db=db, methods={'GET', 'POST'})
+        api_manager.register_api(OrderItem,
+                                 post_process=('action', ItemPostProcess))
+        with test_app.app_context():
+            cfg = api_manager.get_cfg('order_item')
+            for name in ('order_item', 'order_items', 'orderItem',
+                         'orderItems', 'OrderItem', 'OrderItems'):
+                self.assertTrue(name in api_manager._resources)
+                self.assertTrue(api_manager.get_cfg(name) is cfg)
+                self.assertTrue(api_manager.get_model(name) is OrderItem)
+                self.assertTrue(api_manager.get_post_process(name) ==
+                                ('action', ItemPostProcess))
+                self.assertTrue(api_manager.get_put_process(name) is None)
+
+    def test_conflicting_spelling(self):
+
+        class Widget(db.Model):
+            __tablename__ = 'widget'
+            id = db.Column('id', db.Integer, primary_key=True)
+
+        class ArchivedWidget(db.Model):
+            __tablename__ = 'widgets'
+            id = db.Column('id', db.Integer, primary_key=True)
+
+        class ArchiveConfig(APIConfig):
+            def _get_resource_name(self):
+                return 'archived_widget'
+
+        api_manager = APIManager(app=Flask(__name__), db=db)
+        api_manager.register_api(Widget)
+        # the table name of archived widgets is the plural of widget
+        self.assertRaises(ValueError, api_manager.register_api,
+                          ArchivedWidget, cfg_class=ArchiveConfig)
+        self.assertTrue(api_manager.get_model('widgets') is Widget)
+        self.assertTrue('archived_widget' not in api_manager.configs)
+
+    def test_unknown_resource(self):
+        api_manager = APIManager(app=Flask(__name__), db=db)
+        self.assertRaises(UnableToProcess, api_manager.get_cfg, 'unknowns')
+        self.assertTrue(api_manager.get_post_process('unknowns') is None)